@@ -1,13 +1,24 @@
-from fastapi import APIRouter, Query
-from app.services.db_service import get_predictions, get_logs
+import json
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query
+from app.services.db_service import get_prediction, get_predictions, get_logs
 
 router = APIRouter()
 
+def _ts(value: datetime | None) -> str | None:
+    # Stored timestamps are naive "YYYY-MM-DD HH:MM:SS.ffffff" strings
+    return str(value.replace(tzinfo=None)) if value else None
+
+def _next_cursor(rows, limit: int):
+    return rows[-1]["id"] if len(rows) == limit else None
+
 @router.get("/predictions")
 def get_prediction_history(
     limit: int = Query(default=10, ge=1, le=100),
     user_id: str = Query(default=None),
-    purpose: str = Query(default=None)
+    purpose: str = Query(default=None),
+    before_id: int = Query(default=None),
+    after_ts: datetime = Query(default=None)
 ):
     """
     Get prediction history from SQLite database
@@ -16,31 +27,62 @@ def get_prediction_history(
     - limit: Number of records to return (1-100, default 10)
     - user_id: Filter by user ID (optional)
     - purpose: Filter by purpose (optional)
+    - before_id: Cursor - return records older than this id (use `next_cursor`)
+    - after_ts: Only return records newer than this timestamp (optional)
     """
-    predictions = get_predictions(limit=limit, user_id=user_id, purpose=purpose)
+    predictions = get_predictions(
+        limit=limit, user_id=user_id, purpose=purpose, before_id=before_id, after_ts=_ts(after_ts)
+    )
 
     return {
         "count": len(predictions),
+        "next_cursor": _next_cursor(predictions, limit),
         "predictions": [
             {
                 "id": p["id"],
-                "prompt": p["prompt"][:100] + "..." if len(p["prompt"]) > 100 else p["prompt"],
-                "response": p["response"][:100] + "..." if len(p["response"]) > 100 else p["response"],
+                "prompt": p["prompt_preview"],
+                "response": p["response_preview"],
                 "timestamp": p["timestamp"],
                 "user_id": p["user_id"],
                 "purpose": p["purpose"],
                 "provider": p["provider"],
                 "prompt_id": p["prompt_id"],
-                "latency_ms": p["latency_ms"]
+                "prompt_version": p["prompt_version"],
+                "latency_ms": p["latency_ms"],
+                "ttft_ms": p["ttft_ms"],
+                "timings": json.loads(p["timings"]) if p["timings"] else None,
             }
             for p in predictions
         ]
     }
 
+@router.get("/predictions/{prediction_id}")
+def get_prediction_detail(prediction_id: int):
+    """One prediction with the full prompt and response (loaded from blob storage)"""
+    p = get_prediction(prediction_id)
+    if p is None:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+    return {
+        "id": p["id"],
+        "prompt": p["prompt"],
+        "response": p["response"],
+        "timestamp": p["timestamp"],
+        "user_id": p["user_id"],
+        "purpose": p["purpose"],
+        "provider": p["provider"],
+        "prompt_id": p["prompt_id"],
+        "prompt_version": p["prompt_version"],
+        "latency_ms": p["latency_ms"],
+        "ttft_ms": p["ttft_ms"],
+        "timings": json.loads(p["timings"]) if p["timings"] else None,
+    }
+
 @router.get("/logs")
 def get_log_history(
     limit: int = Query(default=100, ge=1, le=500),
-    level: str = Query(default=None)
+    level: str = Query(default=None),
+    before_id: int = Query(default=None),
+    after_ts: datetime = Query(default=None)
 ):
     """
     Get application logs from SQLite database
@@ -48,11 +90,14 @@ def get_log_history(
     Query parameters:
     - limit: Number of records to return (1-500, default 100)
     - level: Filter by log level (INFO, WARNING, ERROR)
+    - before_id: Cursor - return records older than this id (use `next_cursor`)
+    - after_ts: Only return records newer than this timestamp (optional)
     """
-    logs = get_logs(limit=limit, level=level)
+    logs = get_logs(limit=limit, level=level, before_id=before_id, after_ts=_ts(after_ts))
 
     return {
         "count": len(logs),
+        "next_cursor": _next_cursor(logs, limit),
         "logs": [
             {
                 "id": log["id"],
@@ -1,41 +1,191 @@
-from fastapi import APIRouter, Header, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+import json
 import logging
-from app.models.schemas import PredictRequest, PredictResponse
-from app.services.processor import process_document
+import time
+from app.models.schemas import (
+    PredictRequest, PredictResponse,
+    BatchItem, BatchItemResult, BatchPredictRequest, BatchPredictResponse,
+)
+from app.services.processor import process_document_async, process_batch_async, stream_document_async
+from app.core.config import settings
 from app.core.dependencies import store
+from app.instrumentation.metrics import STORE_LOOKUP_SECONDS
+from app.instrumentation.tracing import span, start_trace
 
 logger = logging.getLogger(__name__)
 predictrouter = APIRouter()
 
+
+async def _get_active(user_id: str, purpose: str):
+    with span("store"), STORE_LOOKUP_SECONDS.time(op="get_active"):
+        return await store.get_active_async(user_id=user_id, purpose=purpose)
+
+
 @predictrouter.post("/", response_model=PredictResponse)
-def predict(
+async def predict(
         req: PredictRequest,
+        response: Response,
         x_user_id: str = Header(default="user_anon"),
     ):
+    # Stage timings for this request: Server-Timing header, optional body field, predictions.timings
+    trace = start_trace()
     logger.info(f"Predict request for user={x_user_id}, purpose={req.purpose}, provider={req.provider}")
-    active_prompt = store.get_active(user_id=x_user_id, purpose=req.purpose)
+    active_prompt = await _get_active(x_user_id, req.purpose)
     if not active_prompt:
         logger.warning(f"No active prompt for user={x_user_id}, purpose={req.purpose}")
         raise HTTPException(status_code=400, detail=f"No active prompt for purpose '{req.purpose}'")
 
-    stored_prompt = store.get(active_prompt.id)
-    if not stored_prompt or stored_prompt.version != active_prompt.version:
-        raise HTTPException(status_code=400, detail="Active prompt version mismatch")
-    
-    output_text, model_info, latency = process_document(
-        store=store,
+    # The resolved prompt is passed down, so this is the request's only store lookup
+    output_text, model_info, latency = await process_document_async(
+        prompt=active_prompt,
         user_id=x_user_id,
         purpose=req.purpose,
         document_text=req.document_text,
         provider=req.provider,
+        use_cache=req.use_cache,
         params=req.params,
     )
 
     logger.info(f"Prediction completed: prompt_id={active_prompt.id}, latency={latency}ms")
+    response.headers["Server-Timing"] = trace.server_timing()
     return PredictResponse(
         output_text=output_text,
         model_info=model_info,
         prompt_id=active_prompt.id,
         prompt_version=active_prompt.version,
         latency_ms=latency,
+        timings=trace.timings() if req.include_timings else None,
+    )
+
+
+async def _run_batch(
+        user_id: str,
+        purpose: str,
+        items: list[BatchItem | str],
+        provider: str,
+        params: dict | None,
+        max_concurrency: int | None,
+        use_cache: bool = True,
+    ) -> BatchPredictResponse:
+    """Resolve the active prompt once and fan the valid items out to the provider.
+
+    `items` holds parsed BatchItems, or an error message for lines that failed validation.
+    """
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {settings.BATCH_MAX_ITEMS} documents")
+    active_prompt = await _get_active(user_id, purpose)
+    if not active_prompt:
+        logger.warning(f"No active prompt for user={user_id}, purpose={purpose}")
+        raise HTTPException(status_code=400, detail=f"No active prompt for purpose '{purpose}'")
+
+    start = time.perf_counter()
+    valid = [(i, item) for i, item in enumerate(items) if isinstance(item, BatchItem)]
+    outcomes = await process_batch_async(
+        prompt=active_prompt,
+        documents=[item.document_text for _, item in valid],
+        user_id=user_id,
+        purpose=purpose,
+        provider=provider,
+        max_concurrency=max_concurrency,
+        use_cache=use_cache,
+        params=params,
+    )
+
+    results = [BatchItemResult(index=i, error=item) for i, item in enumerate(items) if not isinstance(item, BatchItem)]
+    for (i, item), outcome in zip(valid, outcomes):
+        if isinstance(outcome, Exception):
+            results.append(BatchItemResult(index=i, id=item.id, error=str(outcome)))
+        else:
+            output_text, _, latency = outcome
+            results.append(BatchItemResult(index=i, id=item.id, output_text=output_text, latency_ms=latency))
+    results.sort(key=lambda r: r.index)
+
+    failed = sum(1 for r in results if r.error is not None)
+    logger.info(f"Batch completed: prompt_id={active_prompt.id}, items={len(results)}, failed={failed}")
+    return BatchPredictResponse(
+        prompt_id=active_prompt.id,
+        prompt_version=active_prompt.version,
+        succeeded=len(results) - failed,
+        failed=failed,
+        latency_ms=int((time.perf_counter() - start) * 1000),
+        results=results,
     )
+
+
+@predictrouter.post("/batch", response_model=BatchPredictResponse)
+async def predict_batch(
+        req: BatchPredictRequest,
+        x_user_id: str = Header(default="user_anon"),
+    ):
+    logger.info(f"Batch predict request for user={x_user_id}, purpose={req.purpose}, provider={req.provider}, items={len(req.documents)}")
+    return await _run_batch(x_user_id, req.purpose, list(req.documents), req.provider, req.params, req.max_concurrency, req.use_cache)
+
+
+@predictrouter.post("/batch/jsonl", response_model=BatchPredictResponse)
+async def predict_batch_jsonl(
+        request: Request,
+        purpose: str,
+        provider: str = "mock",
+        max_concurrency: int | None = Query(default=None, ge=1),
+        use_cache: bool = True,
+        x_user_id: str = Header(default="user_anon"),
+    ):
+    """Batch predict from a JSONL body: one {"id": ..., "document_text": ...} object per line"""
+    items: list[BatchItem | str] = []
+    for line in (await request.body()).decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(BatchItem.model_validate(json.loads(line)))
+        except (ValueError, ValidationError) as e:
+            items.append(f"Invalid line: {e}")
+    logger.info(f"Batch JSONL predict request for user={x_user_id}, purpose={purpose}, provider={provider}, items={len(items)}")
+    return await _run_batch(x_user_id, purpose, items, provider, None, max_concurrency, use_cache)
+
+
+@predictrouter.post("/stream")
+async def predict_stream(
+        req: PredictRequest,
+        x_user_id: str = Header(default="user_anon"),
+    ):
+    """Streaming predict: NDJSON "chunk" events followed by a final "done" event"""
+    logger.info(f"Streaming predict request for user={x_user_id}, purpose={req.purpose}, provider={req.provider}")
+    active_prompt = await _get_active(x_user_id, req.purpose)
+    if not active_prompt:
+        logger.warning(f"No active prompt for user={x_user_id}, purpose={req.purpose}")
+        raise HTTPException(status_code=400, detail=f"No active prompt for purpose '{req.purpose}'")
+
+    stream = stream_document_async(
+        prompt=active_prompt,
+        document_text=req.document_text,
+        user_id=x_user_id,
+        purpose=req.purpose,
+        provider=req.provider,
+        use_cache=req.use_cache,
+        params=req.params,
+    )
+    # Pull the first event before the 200 goes out, so setup failures (unknown provider,
+    # open circuit, provider errors before the first token) get a real status code
+    try:
+        first = await stream.__anext__()
+    except Exception as e:
+        await stream.aclose()
+        if isinstance(e, ValueError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
+
+    async def events():
+        yield json.dumps(first) + "\n"
+        try:
+            async for event in stream:
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            # Headers are already sent: end the stream with an error event instead of truncating it
+            logger.error(f"Stream failed for user={x_user_id}, purpose={req.purpose}: {e}")
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
@@ -1,23 +1,37 @@
-from fastapi import APIRouter, Header, HTTPException
+import asyncio
+from typing import Literal
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+import json
 import logging
-from app.models.schemas import PromptCreate, PromptRead, PromptPatch
+from app.core.config import settings
+from pydantic import ValidationError
+from app.models.schemas import (
+    BulkImportError, BulkImportResponse, PromptCreate, PromptImport, PromptRead, PromptPatch,
+    PromptVersionRead, PromptVersionTemplate,
+)
 from app.core.dependencies import store
+from app.services.template_renderer import warm_template
+from app.services.prediction_cache import prediction_cache
+from app.services.prompt_versions import content_hash
 
 logger = logging.getLogger(__name__)
 prompt = APIRouter()
 
 @prompt.post("/", response_model=PromptRead)
-def create_prompt(
+async def create_prompt(
         data: PromptCreate,
         x_user_id: str = Header(default="user_anon")
     ):
     logger.info(f"Creating prompt for user={x_user_id}, purpose={data.purpose}, name={data.name}")
-    prompt = store.create(
+    prompt = await store.create_async(
 
         purpose=data.purpose,
         name=data.name,
         template=data.template,
         user_id=x_user_id)
+    warm_template(prompt.template)
 
     response_model=PromptRead(
         id=prompt.id,
@@ -32,58 +46,220 @@ def create_prompt(
     return response_model
 
 
+PROMPT_FIELDS = tuple(PromptRead.model_fields)
+
+
+def _to_read(prompt, active: dict) -> PromptRead:
+    return PromptRead(
+        id=prompt.id,
+        purpose=prompt.purpose,
+        name=prompt.name,
+        template=prompt.template,
+        version=prompt.version,
+        active=(active.get(prompt.purpose) == prompt.id),
+    )
+
+
+def _parse_fields(fields: str | None) -> list[str] | None:
+    if not fields:
+        return None
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in PROMPT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+
 @prompt.get("/", response_model=list[PromptRead])
 def list_prompts(
+        response: Response,
         purpose: str | None = None,
+        user_id: str | None = None,
+        name_prefix: str | None = None,
+        limit: int | None = Query(default=None, ge=1, le=settings.PROMPT_PAGE_MAX_LIMIT),
+        cursor: str | None = None,
+        fields: str | None = None,
+        format: Literal["json", "ndjson"] = "json",
         x_user_id: str = Header(default="user_anon")
     ):
-    logger.info(f"Listing prompts for user={x_user_id}, purpose={purpose}")
-    prompts = store.list(purpose=purpose)
-    response_model: list[PromptRead] = []
-    for prompt in prompts:
-        response_model.append(
-            PromptRead(
-                id=prompt.id,
-                purpose=prompt.purpose,
-                name=prompt.name,
-                template=prompt.template,
-                version=prompt.version,
-                active=(store.get_active(user_id=x_user_id, purpose=prompt.purpose) == prompt)
-            )
-        )
+    """
+    List prompts.
+
+    With no paging params this returns every prompt (what the UI expects).
+    Pass `limit` (and `cursor` from the previous page's X-Next-Cursor header)
+    for keyset pagination ordered by id, `user_id`/`name_prefix` to filter,
+    `fields=id,name,...` to project columns, or `format=ndjson` to stream
+    every match one JSON object per line.
+    """
+    logger.info(f"Listing prompts for user={x_user_id}, purpose={purpose}, limit={limit}, format={format}")
+    selected = _parse_fields(fields)
+    # One lookup for all of the user's active prompts instead of one per row
+    active = store.get_active_map(user_id=x_user_id)
+    filters = {"purpose": purpose, "user_id": user_id, "name_prefix": name_prefix}
+
+    if format == "ndjson":
+        def lines():
+            # Keyset chunks rather than one open DB cursor: the generator is
+            # resumed on arbitrary threadpool threads, and pooled connections
+            # are per-thread
+            for p in store.iter_prompts(chunk_size=settings.PROMPT_STREAM_CHUNK_SIZE, **filters):
+                yield json.dumps(_to_read(p, active).model_dump(include=selected)) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    headers = {}
+    if limit is None and cursor is None and user_id is None and name_prefix is None:
+        prompts = store.list(purpose=purpose)
+    else:
+        limit = limit or settings.PROMPT_PAGE_MAX_LIMIT
+        prompts = store.list_page(limit, after_id=cursor, **filters)
+        if len(prompts) == limit:
+            headers["X-Next-Cursor"] = prompts[-1].id
+
+    response_model = [_to_read(p, active) for p in prompts]
+    if selected is not None:
+        return JSONResponse([r.model_dump(include=selected) for r in response_model], headers=headers)
+    response.headers.update(headers)
     return response_model
 
 
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'line'}: {err['msg']}" for err in e.errors()
+    )
+
+
+async def _body_lines(request: Request):
+    """Yield the request body line by line as it arrives, so a row limit also bounds memory"""
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+@prompt.post(":bulk", response_model=BulkImportResponse)
+async def bulk_import(
+        request: Request,
+        all_or_nothing: bool = False,
+        x_user_id: str = Header(default="user_anon"),
+    ):
+    """
+    Import prompts from a JSONL body, one PromptImport object per line.
+
+    Valid lines are created (and activated when `"active": true`) in a single
+    store write; invalid lines are reported by line number. With
+    `all_or_nothing=true` nothing is imported if any line is invalid.
+    """
+    rows: list[tuple[str, str, str, bool]] = []
+    errors: list[BulkImportError] = []
+    line_no = 0
+    async for line in _body_lines(request):
+        line_no += 1
+        if not line.strip():
+            continue
+        if len(rows) + len(errors) >= settings.PROMPT_IMPORT_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"Import exceeds {settings.PROMPT_IMPORT_MAX_ROWS} lines")
+        try:
+            item = PromptImport.model_validate_json(line)
+        except ValidationError as e:
+            errors.append(BulkImportError(line=line_no, error=_validation_message(e)))
+            continue
+        rows.append((item.purpose, item.name, item.template, item.active))
+
+    logger.info(f"Bulk import for user={x_user_id}: {len(rows)} valid, {len(errors)} invalid lines")
+    if errors and all_or_nothing:
+        return JSONResponse(
+            BulkImportResponse(imported=0, activated=0, ids=[], errors=errors).model_dump(),
+            status_code=422,
+        )
+
+    prompts = await store.import_prompts_async(x_user_id, rows) if rows else []
+    return BulkImportResponse(
+        imported=len(prompts),
+        # A later active row for the same purpose replaces an earlier one
+        activated=len({row[0] for row in rows if row[3]}),
+        ids=[p.id for p in prompts],
+        errors=errors,
+    )
+
+
+@prompt.get(":export")
+def export_prompts(x_user_id: str = Header(default="user_anon")):
+    """Stream the caller's prompts as JSONL (id order), in the format :bulk accepts"""
+    logger.info(f"Exporting prompts for user={x_user_id}")
+
+    def chunks():
+        # Each yielded chunk is one threadpool hop, so send lines in batches
+        batch: list[str] = []
+        for p, active in store.export_prompts(x_user_id):
+            batch.append(json.dumps({
+                "id": p.id, "purpose": p.purpose, "name": p.name,
+                "template": p.template, "version": p.version, "active": active,
+            }))
+            if len(batch) >= settings.PROMPT_STREAM_CHUNK_SIZE:
+                yield "\n".join(batch) + "\n"
+                batch = []
+        if batch:
+            yield "\n".join(batch) + "\n"
+    return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+
+@prompt.get("/{prompt_id}/versions", response_model=list[PromptVersionRead])
+def list_prompt_versions(prompt_id: str, x_user_id: str = Header(default="user_anon")):
+    """Template history as stored diffs, oldest first (still available to the owner after delete)"""
+    versions = store.list_versions(prompt_id, x_user_id)
+    if not versions:
+        raise HTTPException(status_code=404, detail="Prompt not found")
+    return [PromptVersionRead(**v.model_dump(exclude={"prompt_id", "user_id"})) for v in versions]
+
+
+@prompt.get("/{prompt_id}/versions/{version}", response_model=PromptVersionTemplate)
+def get_prompt_version(prompt_id: str, version: int, x_user_id: str = Header(default="user_anon")):
+    """Full template of one version, rebuilt from the diffs (e.g. for a prediction's prompt_version)"""
+    template = store.get_version_template(prompt_id, version, x_user_id)
+    if template is None:
+        raise HTTPException(status_code=404, detail="Prompt version not found")
+    return PromptVersionTemplate(
+        prompt_id=prompt_id, version=version, content_hash=content_hash(template), template=template,
+    )
+
+
 @prompt.patch("/{prompt_id}", response_model=PromptRead)
-def patch_prompt(
+async def patch_prompt(
         prompt_id: str,
         data: PromptPatch,
         x_user_id: str = Header(default="user_anon")
     ):
     logger.info(f"Patching prompt id={prompt_id} for user={x_user_id}")
-    prompt = store.patch(prompt_id=prompt_id, template=data.template, user_id=x_user_id)
+    prompt = await store.patch_async(prompt_id=prompt_id, template=data.template, user_id=x_user_id)
     if not prompt:
         logger.warning(f"Prompt not found or unauthorized: id={prompt_id}, user={x_user_id}")
         raise HTTPException(status_code=404, detail="Prompt not found")
+    warm_template(prompt.template)
+    # May delete from the persistent cache table
+    await asyncio.to_thread(prediction_cache.invalidate_prompt, prompt_id)
     response_model: PromptRead = PromptRead(
         id=prompt.id,
         purpose=prompt.purpose,
         name=prompt.name,
         template=prompt.template,
         version=prompt.version,
-        active=(store.get_active(user_id=x_user_id, purpose=prompt.purpose) == prompt)
+        active=(await store.get_active_async(user_id=x_user_id, purpose=prompt.purpose) == prompt)
     )
     return response_model
 
 
 @prompt.post("/{prompt_id}/activate")
-def activate_prompt(
+async def activate_prompt(
         prompt_id: str,
         purpose: str,
         x_user_id: str = Header(default="user_anon"),
     ):
     logger.info(f"Activating prompt id={prompt_id} for user={x_user_id}, purpose={purpose}")
-    prompt = store.set_active(
+    prompt = await store.set_active_async(
         user_id=x_user_id,
         purpose=purpose,
         prompt_id=prompt_id,
@@ -96,14 +272,15 @@ def activate_prompt(
 
 
 @prompt.delete("/{prompt_id}")
-def delete_prompt(
+async def delete_prompt(
         prompt_id: str,
         x_user_id: str = Header(default="user_anon"),
     ):
     logger.info(f"Deleting prompt id={prompt_id} for user={x_user_id}")
-    result = store.delete(prompt_id=prompt_id, user_id=x_user_id)
+    result = await store.delete_async(prompt_id=prompt_id, user_id=x_user_id)
     if not result:
         logger.warning(f"Failed to delete prompt: id={prompt_id}, user={x_user_id}")
         raise HTTPException(status_code=404, detail="Prompt not found or unauthorized")
+    await asyncio.to_thread(prediction_cache.invalidate_prompt, prompt_id)
     logger.info(f"Successfully deleted prompt id={prompt_id}")
     return {"status": "ok"}
@@ -4,9 +4,109 @@ class Settings(BaseSettings):
     GOOGLE_API_KEY: str | None = None
     OPENAI_API_KEY: str | None = None
     FILE_SNAPSHOT: bool = True
+    FILE_JOURNAL: bool = False  # append mutations to a JSONL journal instead of rewriting data.json
+    FILE_JOURNAL_FSYNC_EVERY: int = 32  # records between fsyncs
+    FILE_JOURNAL_FSYNC_INTERVAL: float = 1.0  # max seconds between fsyncs (checked on write)
+    FILE_JOURNAL_COMPACT_EVERY: int = 1000  # records before compacting into a snapshot
     USE_DATABASE: bool = True  # Use SQLite instead of in-memory/file
     DATABASE_PATH: str = "var/database.db"
+    WORKERS: int = 1  # API worker processes (uvicorn --workers); >1 requires USE_DATABASE
     LOG_LEVEL: str = "INFO"
+
+    # SQLite connection pool
+    DB_BUSY_TIMEOUT_MS: int = 5000
+    DB_MMAP_SIZE: int = 256 * 1024 * 1024
+    DB_CACHED_STATEMENTS: int = 256  # prepared statements kept per connection
+    DB_ASYNC_STORE: bool = True  # prompt writes on one writer thread, async reads on reader threads
+    DB_READER_THREADS: int = 4
+
+    # Prediction text storage
+    PREDICTION_BLOB_STORAGE: bool = True  # store prompt/response texts once in `blobs`, referenced by hash
+    BLOB_COMPRESSION: str = "zlib"  # zlib | none
+    BLOB_COMPRESSION_LEVEL: int = 6
+    BLOB_COMPRESS_MIN_BYTES: int = 256  # shorter texts are stored raw
+
+    # Batched database log handler
+    LOG_DB_QUEUE_SIZE: int = 10000
+    LOG_DB_BATCH_SIZE: int = 200
+    LOG_DB_FLUSH_INTERVAL: float = 0.5  # seconds
+    LOG_DB_DROP_POLICY: str = "drop_new"  # drop_new | drop_old | block
+
+    # Write-behind prediction logging
+    PREDICTION_QUEUE_SIZE: int = 10000
+    PREDICTION_BATCH_SIZE: int = 100
+    PREDICTION_FLUSH_INTERVAL: float = 0.2  # seconds
+
+    # Compiled Jinja2 template cache
+    TEMPLATE_CACHE_SIZE: int = 256
+
+    # Shared LLM client instances
+    LLM_CLIENT_CACHE_SIZE: int = 32
+    LLM_CLIENT_CLOSE_GRACE: float = 60.0  # seconds an evicted client stays open for in-flight calls
+    # Per-request client config is normalised so callers cannot build unbounded client variants
+    LLM_MODELS: dict[str, list[str]] = {
+        "openai": ["gpt-5-nano", "gpt-5-mini", "gpt-4o-mini"],
+        "google": ["gemini-2.5-flash", "gemini-2.5-flash-lite", "gemini-2.5-pro"],
+    }
+    LLM_MAX_TOKENS_LIMIT: int = 8192
+    LLM_MAX_TOKENS_STEP: int = 256  # requested max_tokens is rounded up to a multiple of this
+
+    # Batch prediction
+    BATCH_MAX_ITEMS: int = 5000
+    BATCH_MAX_CONCURRENCY: int = 8
+
+    # Provider limits (shared by every call to a provider)
+    PROVIDER_RPM: dict[str, float] = {}  # provider -> requests per minute, e.g. {"openai": 500}
+    PROVIDER_TPM: dict[str, float] = {}  # provider -> estimated tokens per minute
+    PROVIDER_INITIAL_CONCURRENCY: int = 16  # adaptive (AIMD) in-flight limit starts here
+    PROVIDER_MIN_CONCURRENCY: int = 1
+    PROVIDER_MAX_CONCURRENCY: int = 64
+    RETRY_BACKOFF_CAP: float = 20.0  # seconds; also caps honoured Retry-After
+    BREAKER_FAILURE_THRESHOLD: int = 5  # consecutive failures before failing fast
+    BREAKER_RESET_SECONDS: float = 30.0  # open time before a probe request
+
+    # Per-purpose routing: hedged requests and failover chains
+    # e.g. {"summarize": {"fallbacks": [{"provider": "google", "model": "gemini-2.5-flash"}], "hedge": true, "hedge_percentile": 95}}
+    ROUTING_POLICIES: dict[str, dict] = {}
+    ROUTING_LATENCY_WINDOW: int = 200  # recent latencies kept per target for the hedge percentile
+    ROUTING_HEDGE_MIN_MS: float = 50  # never hedge earlier than this
+    ROUTING_HEDGE_DEFAULT_MS: float = 2000  # hedge deadline until a target has enough samples
+
+    # MockLLM simulation (capacity planning and retry/limiter testing without a provider)
+    MOCK_LATENCY_DIST: str = "fixed"  # fixed | normal | lognormal | replay
+    MOCK_LATENCY_MS: float = 0  # mean per-call latency; replay falls back to it with no history
+    MOCK_LATENCY_STDDEV_MS: float = 0  # normal / lognormal only
+    MOCK_REPLAY_PROVIDER: str = ""  # replay only latencies recorded for this provider ("" = any real one)
+    MOCK_REPLAY_LIMIT: int = 10000  # replay from the most recent N predictions
+    MOCK_ERROR_RATE: float = 0.0  # fraction of attempts failing with a 500
+    MOCK_RATE_LIMIT_RATE: float = 0.0  # fraction of attempts rejected with a 429
+    MOCK_RETRY_AFTER: float = 1.0  # seconds, sent with simulated 429s
+    MOCK_RETRIES: int = 0  # guard retries for mock calls
+    MOCK_BACKOFF: float = 0.8
+    MOCK_OUTPUT_TOKENS: int = 0  # completion length in tokens; 0 = echo the prompt
+    MOCK_STREAM_CHUNK_CHARS: int = 16
+    MOCK_STREAM_CHUNK_DELAY_MS: float = 0  # pause between streamed chunks
+    MOCK_SEED: int | None = None  # fixed seed for reproducible runs
+
+    # Instrumentation
+    TIMELINE_ENABLED: bool = False  # record start/end events of timed calls (debugging only)
+    TIMELINE_SIZE: int = 1000  # ring buffer length when enabled
+
+    # Prediction result cache
+    PREDICTION_CACHE_ENABLED: bool = True
+    PREDICTION_CACHE_SIZE: int = 1024
+    PREDICTION_CACHE_TTL: float = 3600  # seconds
+    PREDICTION_CACHE_PERSISTENT: bool = False  # also keep entries in SQLite
+
+    # Active-prompt cache in front of the database store
+    PROMPT_CACHE_ENABLED: bool = True
+    PROMPT_CACHE_TTL: float = 0  # seconds; 0 = until invalidated
+    PROMPT_CACHE_SIZE: int = 4096  # max cached prompts, and max cached (user, purpose) active entries
+    PROMPT_CACHE_POLL_INTERVAL: float = 0.5  # seconds between checks for writes by other workers; 0 = every read
+    PROMPT_PAGE_MAX_LIMIT: int = 1000  # upper bound for ?limit= on GET /v1/prompts
+    PROMPT_STREAM_CHUNK_SIZE: int = 500  # rows fetched per store call when streaming NDJSON
+    PROMPT_IMPORT_MAX_ROWS: int = 200_000  # lines accepted by POST /v1/prompts:bulk
+
     model_config = SettingsConfigDict(env_file=".env")
 
 settings = Settings()
\ No newline at end of file
@@ -1,12 +1,34 @@
 """Shared dependencies for the application."""
 
-from app.services.prompt_store import DatabaseStore, FileSnapshotStore, InMemoryStore
+from app.services.prompt_store import AsyncDatabaseStore, CachedPromptStore, DatabaseStore, FileSnapshotStore, InMemoryStore
 from app.core.config import settings
 
+# In-memory and file stores live inside one process: with several workers each
+# would see different prompts, and file workers would overwrite each other's data.json
+if settings.WORKERS > 1 and not settings.USE_DATABASE:
+    raise RuntimeError("WORKERS > 1 requires USE_DATABASE=true (the only store shared across processes)")
+
 # Singleton store instance - shared across all routers
 if settings.USE_DATABASE:
-    store = DatabaseStore(settings.DATABASE_PATH)
+    if settings.DB_ASYNC_STORE:
+        store = AsyncDatabaseStore(settings.DATABASE_PATH, readers=settings.DB_READER_THREADS)
+    else:
+        store = DatabaseStore(settings.DATABASE_PATH)
+    # In-memory stores are already dict lookups; only the database benefits from a cache
+    if settings.PROMPT_CACHE_ENABLED:
+        store = CachedPromptStore(
+            store,
+            ttl=settings.PROMPT_CACHE_TTL,
+            poll_interval=settings.PROMPT_CACHE_POLL_INTERVAL,
+            max_entries=settings.PROMPT_CACHE_SIZE,
+        )
 elif settings.FILE_SNAPSHOT:
-    store = FileSnapshotStore("var/data.json")
+    store = FileSnapshotStore(
+        "var/data.json",
+        journal=settings.FILE_JOURNAL,
+        fsync_every=settings.FILE_JOURNAL_FSYNC_EVERY,
+        fsync_interval=settings.FILE_JOURNAL_FSYNC_INTERVAL,
+        compact_every=settings.FILE_JOURNAL_COMPACT_EVERY,
+    )
 else:
     store = InMemoryStore()
@@ -8,4 +8,14 @@ logger = logging.getLogger(__name__)
 def http_error_handler(request: Request, exc: Exception):
     logger.error(f"Unhandled exception: {exc}")
     logger.error(traceback.format_exc())
-    return JSONResponse(status_code=500, content={"detail": str(exc)})
\ No newline at end of file
+    return JSONResponse(status_code=500, content={"detail": str(exc)})
+
+def circuit_open_handler(request: Request, exc: Exception):
+    # Provider is failing fast: tell the client when to come back instead of a 500
+    retry_after = getattr(exc, "retry_after", 0)
+    logger.warning(f"Rejected {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, int(retry_after + 0.5)))},
+    )
@@ -1,21 +1,56 @@
 import logging
 import os
-from app.services.db_service import log_to_db
+from datetime import datetime
+from app.core.config import settings
+from app.services.batch_writer import BatchWriter
+from app.services.db_service import log_many_to_db
 
 class DatabaseHandler(logging.Handler):
-    """Custom logging handler to write logs to SQLite database"""
+    """Queue-backed logging handler that writes logs to SQLite in batches.
+
+    `emit` only formats the record and puts it on a bounded queue; a background
+    writer flushes the queue with `executemany`, so logging never waits on the
+    database. When the buffer is full records are dropped per LOG_DB_DROP_POLICY
+    and counted in `stats()["dropped"]`.
+    """
+    def __init__(self, level=logging.NOTSET) -> None:
+        super().__init__(level)
+        self.writer = BatchWriter(
+            name="log-db-writer",
+            write_batch=log_many_to_db,
+            max_queue=settings.LOG_DB_QUEUE_SIZE,
+            batch_size=settings.LOG_DB_BATCH_SIZE,
+            flush_interval=settings.LOG_DB_FLUSH_INTERVAL,
+            drop_policy=settings.LOG_DB_DROP_POLICY,
+        )
+
     def emit(self, record):
         try:
-            log_to_db(
-                level=record.levelname,
-                logger_name=record.name,
-                message=self.format(record)
-            )
+            self.writer.submit((
+                datetime.fromtimestamp(record.created),
+                record.levelname,
+                record.name,
+                self.format(record),
+            ))
         except Exception:
             # Don't let logging errors crash the app
             pass
 
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.stop()
+        super().close()
+
+    def stats(self) -> dict:
+        return self.writer.stats()
+
+_db_handler: DatabaseHandler | None = None
+
 def setup_logging():
+    global _db_handler
+
     # Ensure logs directory exists
     os.makedirs("logs", exist_ok=True)
 
@@ -24,12 +59,22 @@ def setup_logging():
     fmt = "%(asctime)s %(levelname)s %(name)s %(message)s"
     file_handler.setFormatter(logging.Formatter(fmt))
 
-    # Create database handler (new!)
+    # Create database handler (batched, written off the request thread)
     db_handler = DatabaseHandler()
     db_handler.setFormatter(logging.Formatter(fmt))
+    _db_handler = db_handler
 
     # Configure root logger with both handlers
     root = logging.getLogger()
     root.setLevel(logging.INFO)
     root.addHandler(file_handler)  # Still write to file
-    root.addHandler(db_handler)     # Also write to database
\ No newline at end of file
+    root.addHandler(db_handler)     # Also write to database
+
+def shutdown_logging():
+    """Flush buffered database log records (called on app shutdown)"""
+    if _db_handler is not None:
+        logging.getLogger().removeHandler(_db_handler)
+        _db_handler.close()
+
+def log_handler_stats() -> dict:
+    return _db_handler.stats() if _db_handler is not None else {}
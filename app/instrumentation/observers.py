@@ -1,23 +1,35 @@
 import time
 import asyncio
 import logging
+from collections import deque
+
+from app.core.config import settings
+from .metrics import LLM_REQUEST_SECONDS
 
 logger = logging.getLogger(__name__)
 
 initial_timestamp = time.monotonic()
-timeline_events = []
+# Ring buffer of recent start/end events; only filled when TIMELINE_ENABLED
+timeline_events: deque = deque(maxlen=settings.TIMELINE_SIZE)
 
 def log_event(task, event):
     """Log an event with timestamp to visualize when operations start and end"""
     timestamp = time.monotonic() - initial_timestamp
-    timeline_events.append({
-        "task": task,
-        "event": event,
-        "timestamp": timestamp,
-    })
-    logger.info(f"{timestamp:.4f}s - {task} - {event}")
+    if settings.TIMELINE_ENABLED:
+        timeline_events.append({
+            "task": task,
+            "event": event,
+            "timestamp": timestamp,
+        })
+        logger.info(f"{timestamp:.4f}s - {task} - {event}")
     return timestamp
 
+def _observe_llm(args, duration: float) -> None:
+    """Record an LLM call's latency when the decorated function is a client method"""
+    client = args[0] if args else None
+    if hasattr(client, "metric_labels"):
+        LLM_REQUEST_SECONDS.observe(duration, **client.metric_labels())
+
 def timed_sync(func):
     """Decorator to time async functions with logging."""
     async def wrapper(*args, **kwargs):
@@ -25,13 +37,14 @@ def timed_sync(func):
         log_event(task_name, "START")
 
         start_time = time.time()
-        result = await func(*args, **kwargs)  # result is (response_text, id)
+        result = await func(*args, **kwargs)
         end_time = time.time()
         duration = end_time - start_time
 
         log_event(task_name, "END")
-        logger.info(f"Function {func.__name__} took {duration:.2f} seconds.")
-        return (result[0], result[1], duration)
+        _observe_llm(args, duration)
+        logger.debug(f"Function {func.__name__} took {duration:.2f} seconds.")
+        return (result, duration)  # Same shape as @timed
     return wrapper
 
 def timed(func):
@@ -46,6 +59,7 @@ def timed(func):
         duration = end_time - start_time
 
         log_event(task_name, "END")
-        logger.info(f"Function {func.__name__} took {duration:.2f} seconds.")
+        _observe_llm(args, duration)
+        logger.debug(f"Function {func.__name__} took {duration:.2f} seconds.")
         return (result, duration)  # Return tuple with result and duration
     return wrapper
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""
+Request-scoped stage timings.
+
+A route starts a `Trace`, which lives in a contextvar for the rest of the
+request, and code anywhere below it wraps stages in `span("name")`. Spans
+outside a trace are no-ops, so library code can be instrumented
+unconditionally. No collector is involved: the route reads the timings
+back to build a Server-Timing header and to store them with the prediction.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class Trace:
+    """Stage name -> accumulated milliseconds for one request"""
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.spans: dict[str, float] = {}
+
+    def add(self, name: str, duration_ms: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + duration_ms
+
+    def timings(self) -> dict[str, float]:
+        timings = {name: round(ms, 3) for name, ms in self.spans.items()}
+        timings["total"] = round((time.perf_counter() - self.start) * 1000, 3)
+        return timings
+
+    def server_timing(self) -> str:
+        """Value for the Server-Timing response header"""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.timings().items())
+
+
+_current: ContextVar[Trace | None] = ContextVar("trace", default=None)
+
+
+def start_trace() -> Trace:
+    trace = Trace()
+    _current.set(trace)
+    return trace
+
+
+def current_trace() -> Trace | None:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block into the current trace, if there is one"""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, (time.perf_counter() - start) * 1000)
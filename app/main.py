@@ -1,18 +1,41 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 
 from app.models.schemas import PromptCreate, PromptRead, PromptPatch, PredictRequest, PredictResponse
-from app.services.prompt_store import FileSnapshotStore, InMemoryStore
+from app.services.prompt_store import CachedPromptStore, FileSnapshotStore, InMemoryStore
 from app.services.processor import process_document
 from app.services.db_service import init_db
-from app.core.errors import http_error_handler
-from app.core.logging import setup_logging
+from app.services.db_pool import close_all_pools, pool_stats
+from app.services.prediction_recorder import recorder
+from app.services.template_renderer import template_cache
+from app.services.llm_client import registry
+from app.services.limits import CircuitOpenError, provider_stats
+from app.services.routing import router
+from app.services.prediction_cache import prediction_cache
+from app.core.dependencies import store
+from app.core.errors import circuit_open_handler, http_error_handler
+from app.core.logging import setup_logging, shutdown_logging, log_handler_stats
 from app.core.config import settings
+from app.instrumentation.metrics import metrics
 from app.api import routes_predict
 from app.api import routes_prompts
 from app.api import routes_history
 
-app = FastAPI(title="Prompted Doc Processor", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Shutdown: flush buffered writes, then release pooled resources
+    await registry.aclose()
+    store.close()
+    recorder.stop()
+    shutdown_logging()
+    close_all_pools()
+
+app = FastAPI(title="Prompted Doc Processor", version="0.1.0", lifespan=lifespan)
 app.add_exception_handler(Exception, http_error_handler)
+app.add_exception_handler(CircuitOpenError, circuit_open_handler)
 setup_logging()
 init_db()  # Initialize database tables on startup
 app.include_router(routes_prompts.prompt, prefix="/v1/prompts")
@@ -24,16 +47,17 @@ def health():
     return {"status": "ok"}
 
 @app.get("/history")
-def get_history(limit: int = 10, level: str = ""):
+def get_history(limit: int = 10, level: str = "", before_id: int | None = None):
     """
     Get application logs from database
 
     Query params:
     - limit: Number of logs to return (default 10)
     - level: Filter by log level (INFO, WARNING, ERROR, DEBUG)
+    - before_id: Cursor - return logs older than this id
     """
     from app.services.db_service import get_logs
-    history = get_logs(limit=limit, level=level)
+    history = get_logs(limit=limit, level=level, before_id=before_id)
     return {"history": history}
 
 @app.get("/config")
@@ -49,3 +73,25 @@ def get_config():
     }
     return config_dump
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text exposition of the instrumentation metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+def get_stats():
+    """Runtime statistics used for capacity sizing"""
+    backend = getattr(store, "backend", store)
+    return {
+        "db_pool": pool_stats(),
+        "log_writer": log_handler_stats(),
+        "prediction_writer": recorder.stats(),
+        "template_cache": template_cache.stats(),
+        "llm_clients": registry.stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "prompt_cache": store.stats() if isinstance(store, CachedPromptStore) else None,
+        "prompt_store": backend.stats() if hasattr(backend, "stats") else None,
+        "providers": provider_stats(),
+        "routing": router.stats(),
+    }
+
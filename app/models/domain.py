@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from datetime import datetime
 from typing import Optional
 
 from pydantic import BaseModel
@@ -21,3 +22,14 @@ class Prompt(BaseModel):
 
     def render(self, **kwargs: str):
         return self.template.format(**kwargs)
+
+
+class PromptVersion(BaseModel):
+    """One entry of a prompt's append-only template history"""
+
+    prompt_id: str
+    version: int
+    user_id: str = ""  # owner, kept here because history outlives the prompt ("" = unknown)
+    content_hash: str  # sha256 of the full template at this version
+    diff: str  # unified diff from the previous version ("" for version 1)
+    created_at: datetime
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from datetime import datetime
 from typing import Optional
 
 class PromptCreate(BaseModel):
@@ -15,6 +16,35 @@ class PromptRead(BaseModel):
     version: int
     active: bool
 
+class PromptVersionRead(BaseModel):
+    version: int
+    content_hash: str
+    diff: str  # unified diff against the previous version
+    created_at: datetime
+
+class PromptVersionTemplate(BaseModel):
+    prompt_id: str
+    version: int
+    content_hash: str
+    template: str
+
+class PromptImport(BaseModel):
+    """One JSONL line of POST /v1/prompts:bulk (export lines are accepted as-is; id/version are ignored)"""
+    purpose: str = Field(..., min_length=1)
+    name: str
+    template: str
+    active: bool = False
+
+class BulkImportError(BaseModel):
+    line: int
+    error: str
+
+class BulkImportResponse(BaseModel):
+    imported: int
+    activated: int
+    ids: list[str]  # created prompt ids, in input order of the accepted lines
+    errors: list[BulkImportError]
+
 class PromptPatch(BaseModel):
     name: Optional[str] = None
     template: str
@@ -24,6 +54,8 @@ class PredictRequest(BaseModel):
     document_text: str
     params: Optional[dict] = None
     provider: str = "mock"
+    use_cache: bool = True  # set False to bypass the prediction result cache
+    include_timings: bool = False  # add per-stage timings (ms) to the response body
 
 class PredictResponse(BaseModel):
     output_text: str
@@ -31,3 +63,31 @@ class PredictResponse(BaseModel):
     prompt_id: str
     prompt_version: int
     latency_ms: int
+    timings: Optional[dict[str, float]] = None
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    document_text: str
+
+class BatchPredictRequest(BaseModel):
+    purpose: str
+    documents: list[BatchItem]
+    params: Optional[dict] = None
+    provider: str = "mock"
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+    use_cache: bool = True
+
+class BatchItemResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    output_text: Optional[str] = None
+    latency_ms: Optional[int] = None
+    error: Optional[str] = None
+
+class BatchPredictResponse(BaseModel):
+    prompt_id: str
+    prompt_version: int
+    succeeded: int
+    failed: int
+    latency_ms: int
+    results: list[BatchItemResult]
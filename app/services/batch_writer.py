@@ -0,0 +1,234 @@
+"""
+Background batch writer.
+
+Producers hand items to `submit()`, which only touches an in-process queue.
+A daemon thread drains the queue and passes items to a write function in
+batches bounded by size or by time, so database work never runs on the
+producer's thread.
+"""
+import asyncio
+import itertools
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable
+
+from app.instrumentation.metrics import DB_WRITE_ROWS, DB_WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+DROP_NEW = "drop_new"    # reject the incoming item when the buffer is full
+DROP_OLD = "drop_old"    # evict the oldest buffered item to make room
+BLOCK = "block"          # wait up to block_timeout for room, then drop (unless submit(block=False))
+DROP_POLICIES = (DROP_NEW, DROP_OLD, BLOCK)
+
+
+class BatchWriter:
+    """Bounded queue + background thread that flushes items in batches"""
+
+    def __init__(
+            self,
+            name: str,
+            write_batch: Callable[[list[Any]], None],
+            max_queue: int = 10000,
+            batch_size: int = 100,
+            flush_interval: float = 0.5,
+            drop_policy: str = DROP_NEW,
+            block_timeout: float = 1.0,
+        ) -> None:
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.name = name
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # Queue entries are (seq, item). `_outstanding` holds the seqs queued but not yet
+        # written, failed or evicted, so flush() can wait for exactly the items before it.
+        self._seq = itertools.count()
+        self._last_seq = -1
+        self._outstanding: set[int] = set()
+        self._done = threading.Condition()
+
+        # Metrics
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.flush_ms_total = 0.0
+        self.last_flush_ms = 0.0
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, item: Any, block: bool = True) -> bool:
+        """Queue an item for writing. Returns False if it was dropped.
+
+        `block=False` turns the BLOCK policy into drop-new for this call, for
+        callers (like an event loop) that must never wait.
+        """
+        self.start()
+        entry = (self._track(), item)
+        try:
+            if self.drop_policy == BLOCK and block:
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+        except queue.Full:
+            if self.drop_policy != DROP_OLD:
+                self._finished([entry])
+                self.dropped += 1
+                return False
+            try:
+                evicted = self._queue.get_nowait()
+                # The evicted item will never be written; keep join() accounting straight
+                self._queue.task_done()
+                self._finished([evicted])
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            try:
+                self._queue.put_nowait(entry)
+            except queue.Full:
+                self._finished([entry])
+                self.dropped += 1
+                return False
+        self.submitted += 1
+        return True
+
+    def _track(self) -> int:
+        """Number the next item; registered before the put so a fast writer cannot finish it first"""
+        with self._done:
+            seq = next(self._seq)
+            self._last_seq = seq
+            self._outstanding.add(seq)
+        return seq
+
+    def _finished(self, entries: list[tuple[int, Any]]) -> None:
+        with self._done:
+            for seq, _ in entries:
+                self._outstanding.discard(seq)
+            self._done.notify_all()
+
+    async def submit_async(self, item: Any) -> bool:
+        """`submit` for the event loop: under BLOCK, waiting for room happens in a worker thread"""
+        if self.drop_policy != BLOCK:
+            return self.submit(item)
+        self.start()
+        entry = (self._track(), item)
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self._finished([entry])
+            return await asyncio.to_thread(self.submit, item)
+        self.submitted += 1
+        return True
+
+    def _drain(self, first: Any) -> list[Any]:
+        """Collect a batch starting with `first`, bounded by size and flush interval"""
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, entries: list[tuple[int, Any]]) -> None:
+        batch = [item for _, item in entries]
+        start = time.perf_counter()
+        with self._write_lock:
+            try:
+                self.write_batch(batch)
+                self.written += len(batch)
+                DB_WRITE_ROWS.inc(len(batch), writer=self.name, result="ok")
+            except Exception:
+                # Never let a failed flush kill the writer thread
+                self.failed += len(batch)
+                DB_WRITE_ROWS.inc(len(batch), writer=self.name, result="failed")
+            finally:
+                self.last_flush_ms = (time.perf_counter() - start) * 1000
+                DB_WRITE_SECONDS.observe(self.last_flush_ms / 1000, writer=self.name)
+                self.flush_ms_total += self.last_flush_ms
+                self.batches += 1
+                for _ in batch:
+                    self._queue.task_done()
+                self._finished(entries)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._write(self._drain(first))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Write out everything currently queued on the calling thread.
+
+        Also waits (up to `timeout` seconds) for a batch the writer thread is
+        already holding. Returns True once every item submitted before the call
+        is written (or failed), False on timeout. Items submitted during the
+        flush are not waited for.
+        """
+        with self._done:
+            target = self._last_seq
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                break
+            self._write(batch)
+        # Bounded: never hang shutdown on a stuck write
+        with self._done:
+            done = self._done.wait_for(
+                lambda: not self._outstanding or min(self._outstanding) > target, timeout
+            )
+            pending = sum(1 for seq in self._outstanding if seq <= target)
+        if not done:
+            logger.warning(f"{self.name}: flush timed out with {pending} earlier items still in flight")
+        return done
+
+    def stop(self, timeout: float = 5.0) -> bool:
+        """Stop the writer thread and flush whatever is left in the buffer; False if that timed out"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        return self.flush(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "avg_flush_ms": round(self.flush_ms_total / self.batches, 3) if self.batches else 0.0,
+        }
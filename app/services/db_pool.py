@@ -0,0 +1,152 @@
+"""
+Shared SQLite connection pool.
+
+Each thread gets one long-lived connection per database file instead of
+opening a new one for every query. Connections are opened in WAL mode with
+tuned pragmas, and the sqlite3 statement cache (`cached_statements`) keeps
+prepared statements around so repeated queries skip the SQL compile step.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from app.core.config import settings
+
+
+class ConnectionPool:
+    """Per-thread pool of long-lived SQLite connections for one database file"""
+
+    def __init__(
+            self,
+            db_path: str,
+            busy_timeout_ms: int = 5000,
+            mmap_size: int = 0,
+            cached_statements: int = 256,
+        ) -> None:
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # thread ident -> connection, so connections can be closed from any thread
+        self._connections: dict[int, sqlite3.Connection] = {}
+
+        # Metrics
+        self.checkouts = 0
+        self.connections_opened = 0
+        self.connections_closed = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        return conn
+
+    def _prune_dead_threads(self) -> None:
+        """Close connections owned by threads that no longer exist (lock held)"""
+        alive = {t.ident for t in threading.enumerate()}
+        for ident in [i for i in self._connections if i not in alive]:
+            self._connections.pop(ident).close()
+            self.connections_closed += 1
+
+    def acquire(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use"""
+        start = time.perf_counter()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with self._lock:
+                self._prune_dead_threads()
+                ident = threading.get_ident()
+                stale = self._connections.pop(ident, None)
+                if stale is not None:
+                    stale.close()
+                    self.connections_closed += 1
+                conn = self._connect()
+                self._connections[ident] = conn
+                self.connections_opened += 1
+            self._local.conn = conn
+        wait_ms = (time.perf_counter() - start) * 1000
+        self.checkouts += 1
+        self.wait_ms_total += wait_ms
+        if wait_ms > self.wait_ms_max:
+            self.wait_ms_max = wait_ms
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding the thread's connection; rolls back on error"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+    def close_all(self) -> None:
+        """Close every open connection (used on shutdown)"""
+        with self._lock:
+            for conn in self._connections.values():
+                conn.close()
+                self.connections_closed += 1
+            self._connections.clear()
+            self._local = threading.local()
+
+    def stats(self) -> dict:
+        return {
+            "db_path": self.db_path,
+            "open_connections": len(self._connections),
+            "connections_opened": self.connections_opened,
+            "connections_closed": self.connections_closed,
+            "checkouts": self.checkouts,
+            "wait_ms_total": round(self.wait_ms_total, 3),
+            "wait_ms_avg": round(self.wait_ms_total / self.checkouts, 4) if self.checkouts else 0.0,
+            "wait_ms_max": round(self.wait_ms_max, 3),
+        }
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Return the shared pool for a database file, creating it on first use"""
+    pool = _pools.get(db_path)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            pool = ConnectionPool(
+                db_path,
+                busy_timeout_ms=settings.DB_BUSY_TIMEOUT_MS,
+                mmap_size=settings.DB_MMAP_SIZE,
+                cached_statements=settings.DB_CACHED_STATEMENTS,
+            )
+            _pools[db_path] = pool
+        return pool
+
+
+def pool_stats() -> list[dict]:
+    return [pool.stats() for pool in _pools.values()]
+
+
+def close_all_pools() -> None:
+    for pool in list(_pools.values()):
+        pool.close_all()
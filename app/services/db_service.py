@@ -1,21 +1,46 @@
-import sqlite3
-import os
 from datetime import datetime
 from contextlib import contextmanager
+import hashlib
+import sqlite3
+import zlib
+
+from app.core.config import settings
+from .db_pool import get_pool
+from .prompt_versions import rebuild
+from .template_renderer import render_template
 
 # Database path in var/ directory
 DB_PATH = "var/database.db"
 
 @contextmanager
 def get_db_connection():
-    """Context manager for database connections"""
-    os.makedirs("var", exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    try:
+    """Context manager for pooled database connections"""
+    with get_pool(DB_PATH).connection() as conn:
         yield conn
-    finally:
-        conn.close()
+
+def _add_column_if_missing(cursor, table: str, column: str, decl: str):
+    """Additive schema migration: ALTER TABLE only when the column is absent"""
+    columns = {row["name"] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+def _keyset_filter(cursor, table: str, query: str, params: list, before_id: int | None, after_ts: str | None):
+    """Append keyset-pagination conditions for ORDER BY timestamp DESC, id DESC"""
+    if before_id is not None:
+        cursor.execute(f"SELECT timestamp FROM {table} WHERE id = ?", (before_id,))
+        row = cursor.fetchone()
+        if row is not None:
+            query += " AND (timestamp, id) < (?, ?)"
+            params.extend([row["timestamp"], before_id])
+        else:
+            # Cursor row is gone (deleted or never existed): ids still order the history,
+            # so page on them instead of silently restarting from the newest row
+            query += " AND id < ?"
+            params.append(before_id)
+    if after_ts:
+        query += " AND timestamp > ?"
+        params.append(after_ts)
+    return query
 
 def init_db():
     """Initialize all database tables"""
@@ -62,7 +87,17 @@ def init_db():
             )
         ''')
 
-        # 4. Logs table - application logs
+        # 4. Blobs table - content-addressed prompt/response text, stored once
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                encoding TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+        ''')
+
+        # 5. Logs table - application logs
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -73,6 +108,27 @@ def init_db():
             )
         ''')
 
+        # Migrations - columns added after the initial schema
+        _add_column_if_missing(cursor, "predictions", "ttft_ms", "REAL")  # streaming time-to-first-token
+        _add_column_if_missing(cursor, "predictions", "timings", "TEXT")  # JSON stage timings (ms)
+        _add_column_if_missing(cursor, "predictions", "prompt_version", "INTEGER")  # see prompt_versions
+        # Blob references; prompt/response are left empty on rows that use them
+        _add_column_if_missing(cursor, "predictions", "prompt_hash", "TEXT")
+        _add_column_if_missing(cursor, "predictions", "response_hash", "TEXT")
+        _add_column_if_missing(cursor, "predictions", "prompt_preview", "TEXT")
+        _add_column_if_missing(cursor, "predictions", "response_preview", "TEXT")
+        # Set instead of a prompt blob when the prompt is rebuilt from the document and prompt_versions
+        _add_column_if_missing(cursor, "predictions", "document_hash", "TEXT")
+
+        # Indexes for history queries: every filter combination ends in timestamp
+        # so ORDER BY timestamp DESC, id DESC walks the index with no sort step
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_predictions_user_purpose_ts ON predictions(user_id, purpose, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_predictions_user_ts ON predictions(user_id, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_predictions_purpose_ts ON predictions(purpose, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_predictions_ts ON predictions(timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_level_ts ON logs(level, timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs(timestamp)")
+
         conn.commit()
 
 # ============= PREDICTIONS LOGGING =============
@@ -86,21 +142,93 @@ def log_prediction(
     prompt_id: str = "",
     latency_ms: float = 0.0
 ):
-    """Log a prediction request/response"""
+    """Log a prediction request/response (a one-row `log_predictions`, so texts go to blobs too)"""
+    log_predictions([(prompt, response, datetime.now(), user_id, purpose, provider, prompt_id, latency_ms, None, None, None)])
+
+def log_predictions(rows: list[tuple]):
+    """Write a batch of prediction rows in one transaction.
+
+    Rows are (prompt, response, timestamp, user_id, purpose, provider, prompt_id, latency_ms, ttft_ms, timings,
+    prompt_version[, document]). With PREDICTION_BLOB_STORAGE the prompt and response texts go to the blobs
+    table (once per distinct text) and the row keeps their hashes and short previews. When the row
+    carries the document and its prompt version is in prompt_versions, only the document is stored:
+    the prompt is re-rendered on read instead of keeping the template text once per document.
+    """
     with get_db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO predictions (prompt, response, timestamp, user_id, purpose, provider, prompt_id, latency_ms)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (prompt, response, datetime.now(), user_id, purpose, provider, prompt_id, latency_ms))
+        if not settings.PREDICTION_BLOB_STORAGE:
+            cursor.executemany('''
+                INSERT INTO predictions (prompt, response, timestamp, user_id, purpose, provider, prompt_id, latency_ms, ttft_ms, timings, prompt_version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [row[:11] for row in rows])
+            conn.commit()
+            return
+
+        blobs: dict[str, str] = {}
+        templates: dict[tuple, str | None] = {}
+        refs = []
+        for prompt, response, *rest in rows:
+            document = rest[9] if len(rest) > 9 else None
+            rest = rest[:9]
+            prompt_id, prompt_version = rest[4], rest[8]
+            prompt_hash, response_hash, document_hash = blob_hash(prompt), blob_hash(response), None
+            if document is not None and prompt_id and prompt_version is not None:
+                template = _version_template(cursor, prompt_id, prompt_version, templates)
+                # Only drop the prompt text when it provably comes back on read
+                if template is not None and render_template(template, document) == prompt:
+                    document_hash = blob_hash(document)
+                    blobs[document_hash] = document
+            if document_hash is None:
+                blobs[prompt_hash] = prompt
+            blobs[response_hash] = response
+            refs.append((prompt_hash, response_hash, document_hash, preview(prompt), preview(response), *rest))
+        put_blobs(cursor, blobs)
+        cursor.executemany('''
+            INSERT INTO predictions (prompt, response, prompt_hash, response_hash, document_hash, prompt_preview, response_preview,
+                                     timestamp, user_id, purpose, provider, prompt_id, latency_ms, ttft_ms, timings, prompt_version)
+            VALUES ('', '', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', refs)
         conn.commit()
 
-def get_predictions(limit: int = 10, user_id: str = "", purpose: str = ""):
-    """Get prediction history with optional filtering"""
+def _version_template(cursor, prompt_id: str, version: int, cache: dict) -> str | None:
+    """Template of a prompt version rebuilt from prompt_versions, or None if it is not there"""
+    key = (prompt_id, version)
+    if key not in cache:
+        try:
+            cursor.execute(
+                "SELECT version, diff FROM prompt_versions WHERE prompt_id = ? AND version <= ? ORDER BY version", key
+            )
+            history = cursor.fetchall()
+        except sqlite3.OperationalError:
+            # No history table: the prompt store keeps its history outside this database
+            history = []
+        cache[key] = rebuild([r["diff"] for r in history]) if history and history[-1]["version"] == version else None
+    return cache[key]
+
+# Previews are computed in SQL for rows written before blob storage
+PREDICTION_COLUMNS = '''
+    id, timestamp, user_id, purpose, provider, prompt_id, prompt_version, latency_ms, ttft_ms, timings,
+    COALESCE(prompt_preview, CASE WHEN length(prompt) > 100 THEN substr(prompt, 1, 100) || '...' ELSE prompt END) AS prompt_preview,
+    COALESCE(response_preview, CASE WHEN length(response) > 100 THEN substr(response, 1, 100) || '...' ELSE response END) AS response_preview
+'''
+
+def get_predictions(
+    limit: int = 10,
+    user_id: str = "",
+    purpose: str = "",
+    before_id: int | None = None,
+    after_ts: str | None = None,
+):
+    """Get prediction history with optional filtering.
+
+    Pages with a keyset cursor: pass the last row's id as `before_id` to get the
+    next (older) page, or `after_ts` to get only rows newer than a timestamp.
+    Returns previews of the prompt and response, never the full texts.
+    """
     with get_db_connection() as conn:
         cursor = conn.cursor()
 
-        query = "SELECT * FROM predictions WHERE 1=1"
+        query = f"SELECT {PREDICTION_COLUMNS} FROM predictions WHERE 1=1"
         params = []
 
         if user_id:
@@ -111,12 +239,101 @@ def get_predictions(limit: int = 10, user_id: str = "", purpose: str = ""):
             query += " AND purpose = ?"
             params.append(purpose)
 
-        query += " ORDER BY timestamp DESC LIMIT ?"
+        query = _keyset_filter(cursor, "predictions", query, params, before_id, after_ts)
+        query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
         params.append(limit)
 
         cursor.execute(query, params)
         return cursor.fetchall()
 
+def get_prediction(prediction_id: int) -> dict | None:
+    """One prediction with its full prompt and response texts"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""SELECT {PREDICTION_COLUMNS}, prompt, response, prompt_hash, response_hash, document_hash
+                FROM predictions WHERE id = ?""",
+            (prediction_id,),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        prediction = dict(row)
+        del prediction["document_hash"]
+        texts = get_blobs(cursor, [h for h in (row["prompt_hash"], row["response_hash"], row["document_hash"]) if h])
+        # A missing blob reads as empty text rather than failing the whole lookup
+        if row["document_hash"]:
+            template = _version_template(cursor, row["prompt_id"], row["prompt_version"], {})
+            document = texts.get(row["document_hash"])
+            prediction["prompt"] = render_template(template, document) if template is not None and document is not None else ""
+        elif row["prompt_hash"]:
+            prediction["prompt"] = texts.get(row["prompt_hash"], "")
+        if row["response_hash"]:
+            prediction["response"] = texts.get(row["response_hash"], "")
+        return prediction
+
+def get_latency_samples(provider: str = "", limit: int = 10000) -> list[float]:
+    """Recent recorded LLM latencies (ms), for replaying in the mock provider"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        query = "SELECT latency_ms FROM predictions WHERE latency_ms > 0"
+        params: list = []
+        if provider:
+            query += " AND provider = ?"
+            params.append(provider)
+        else:
+            query += " AND provider != 'mock'"
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        cursor.execute(query, params)
+        return [row[0] for row in cursor.fetchall()]
+
+# ============= BLOBS =============
+
+def blob_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def preview(text: str, length: int = 100) -> str:
+    return text[:length] + "..." if len(text) > length else text
+
+def _encode_blob(text: str) -> tuple[str, bytes]:
+    raw = text.encode("utf-8")
+    if settings.BLOB_COMPRESSION == "zlib" and len(raw) >= settings.BLOB_COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(raw, settings.BLOB_COMPRESSION_LEVEL)
+        if len(compressed) < len(raw):
+            return "zlib", compressed
+    return "raw", raw
+
+def _decode_blob(encoding: str, data: bytes) -> str:
+    if encoding == "zlib":
+        data = zlib.decompress(data)
+    return data.decode("utf-8")
+
+def put_blobs(cursor, blobs: dict[str, str]) -> None:
+    """Store texts keyed by blob_hash; texts already stored are skipped without re-encoding"""
+    hashes = list(blobs)
+    existing: set[str] = set()
+    # Stay under SQLite's bound-parameter limit
+    for i in range(0, len(hashes), 500):
+        chunk = hashes[i:i + 500]
+        cursor.execute(f"SELECT hash FROM blobs WHERE hash IN ({','.join('?' * len(chunk))})", chunk)
+        existing.update(row[0] for row in cursor.fetchall())
+    new_rows = []
+    for h, text in blobs.items():
+        if h not in existing:
+            encoding, data = _encode_blob(text)
+            new_rows.append((h, encoding, len(text.encode("utf-8")), data))
+    cursor.executemany("INSERT OR IGNORE INTO blobs (hash, encoding, size, data) VALUES (?, ?, ?, ?)", new_rows)
+
+def get_blobs(cursor, hashes: list[str]) -> dict[str, str]:
+    texts: dict[str, str] = {}
+    for i in range(0, len(hashes), 500):
+        chunk = hashes[i:i + 500]
+        cursor.execute(f"SELECT hash, encoding, data FROM blobs WHERE hash IN ({','.join('?' * len(chunk))})", chunk)
+        for row in cursor.fetchall():
+            texts[row["hash"]] = _decode_blob(row["encoding"], row["data"])
+    return texts
+
 # ============= APPLICATION LOGS =============
 
 def log_to_db(level: str, logger_name: str, message: str):
@@ -129,24 +346,31 @@ def log_to_db(level: str, logger_name: str, message: str):
         ''', (datetime.now(), level, logger_name, message))
         conn.commit()
 
-def get_logs(limit: int = 100, level: str = ""):
-    """Get application logs with optional level filtering"""
+def log_many_to_db(rows: list[tuple]):
+    """Write a batch of (timestamp, level, logger_name, message) rows in one transaction"""
     with get_db_connection() as conn:
         cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO logs (timestamp, level, logger_name, message)
+            VALUES (?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+
+def get_logs(limit: int = 100, level: str = "", before_id: int | None = None, after_ts: str | None = None):
+    """Get application logs with optional level filtering and keyset paging"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+
+        query = "SELECT * FROM logs WHERE 1=1"
+        params = []
 
         if level:
-            cursor.execute('''
-                SELECT * FROM logs
-                WHERE level = ?
-                ORDER BY timestamp DESC
-                LIMIT ?
-            ''', (level, limit))
-        else:
-            cursor.execute('''
-                SELECT * FROM logs
-                ORDER BY timestamp DESC
-                LIMIT ?
-            ''', (limit,))
+            query += " AND level = ?"
+            params.append(level)
 
-        return cursor.fetchall()
+        query = _keyset_filter(cursor, "logs", query, params, before_id, after_ts)
+        query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+        params.append(limit)
 
+        cursor.execute(query, params)
+        return cursor.fetchall()
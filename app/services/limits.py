@@ -0,0 +1,478 @@
+"""
+Per-provider call limits shared by every request in the process.
+
+Every LLM call goes through the provider's `ProviderGuard`, which combines:
+- a circuit breaker that fails fast while the provider keeps erroring,
+- request and token buckets for RPM/TPM quotas,
+- an AIMD concurrency limit: +1 slot per window of successes, halved on
+  overload (429/503/timeouts),
+- retries with full-jitter exponential backoff that honour Retry-After.
+
+The same guard serves the async and the sync (threadpool) call paths.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+from app.core.config import settings
+from app.instrumentation.metrics import LLM_ERRORS, LLM_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Status codes that mean "slow down" rather than "this request is wrong"
+OVERLOAD_STATUS = {429, 503, 529}
+RETRYABLE_STATUS = OVERLOAD_STATUS | {408, 409, 500, 502, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the provider while its breaker is open"""
+
+    def __init__(self, provider: str, retry_after: float) -> None:
+        super().__init__(f"Provider {provider} is unavailable (circuit open), retry in {retry_after:.1f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Token bucket: `rate` tokens per second with bursts up to `burst`.
+
+    Callers reserve tokens up front and sleep off any deficit, so the bucket
+    is thread-safe and works for both async and sync callers.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None) -> None:
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Take `tokens` and return how long the caller must wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            self.throttled += 1
+            return -self._tokens / self.rate
+
+    def refund(self, tokens: float = 1.0) -> None:
+        """Give back a reservation that was never used"""
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + tokens)
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        wait = self.reserve(tokens)
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.refund(tokens)
+                raise
+
+    def acquire_sync(self, tokens: float = 1.0) -> None:
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+
+
+def _set_if_pending(fut: asyncio.Future) -> None:
+    if not fut.done():
+        fut.set_result(None)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit shared by async tasks and worker threads"""
+
+    def __init__(
+            self,
+            initial: int = 4,
+            min_limit: int = 1,
+            max_limit: int = 64,
+            decrease_ratio: float = 0.5,
+        ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_ratio = decrease_ratio
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        # (loop, future) for async waiters, (None, threading.Event) for threads
+        self._waiters: deque = deque()
+
+        # Metrics
+        self.peak_in_flight = 0
+        self.queued = 0
+        self.increases = 0
+        self.decreases = 0
+
+    def _try_enter(self) -> bool:
+        """Take a slot if one is free (lock held)"""
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return True
+        return False
+
+    def _wake(self, count: int = 1) -> None:
+        """Wake up to `count` waiters; they re-check for a free slot themselves"""
+        with self._lock:
+            while count > 0 and self._waiters:
+                loop, waiter = self._waiters.popleft()
+                if loop is None:
+                    waiter.set()
+                elif waiter.done():
+                    continue
+                else:
+                    loop.call_soon_threadsafe(_set_if_pending, waiter)
+                count -= 1
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._try_enter():
+                    return
+                fut = loop.create_future()
+                self._waiters.append((loop, fut))
+                self.queued += 1
+            try:
+                await fut
+            except asyncio.CancelledError:
+                # We may have consumed a wakeup meant for a free slot; pass it on
+                self._wake()
+                raise
+
+    def acquire_sync(self) -> None:
+        while True:
+            with self._lock:
+                if self._try_enter():
+                    return
+                event = threading.Event()
+                self._waiters.append((None, event))
+                self.queued += 1
+            event.wait()
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._wake()
+
+    def on_success(self) -> None:
+        with self._lock:
+            before = int(self.limit)
+            # Additive increase: roughly +1 slot per `limit` successful calls
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            grown = int(self.limit) - before
+            if grown:
+                self.increases += 1
+        if grown:
+            self._wake(grown)
+
+    def on_overload(self) -> None:
+        with self._lock:
+            self.limit = max(self.min_limit, self.limit * self.decrease_ratio)
+            self.decreases += 1
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; one probe after `reset_timeout`"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.opens = 0
+        self.rejected = 0
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.retry_after() <= 0:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                # Let exactly one request through to test the provider
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """The probe ended without a verdict (e.g. cancelled): let the next call probe instead"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opens += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+def status_code(exc: BaseException) -> int | None:
+    """HTTP status from an SDK error (openai: status_code, google-genai: code)"""
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def retry_after_seconds(exc: BaseException) -> float | None:
+    """Server-requested delay from a `retry_after` attribute or a Retry-After header"""
+    value = getattr(exc, "retry_after", None)
+    if value is None:
+        response = getattr(exc, "response", None)
+        headers = getattr(response, "headers", None)
+        if headers is not None:
+            value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_overload(exc: BaseException) -> bool:
+    return status_code(exc) in OVERLOAD_STATUS or isinstance(exc, TimeoutError)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    status = status_code(exc)
+    # No status means a network/SDK error: worth retrying
+    return status is None or status in RETRYABLE_STATUS
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: float | None = None) -> float:
+    """Full-jitter exponential backoff; a server Retry-After wins when present"""
+    if retry_after is not None:
+        return min(cap, retry_after) + random.uniform(0, base)
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def estimate_tokens(prompt: str, max_tokens: int = 0) -> int:
+    """Rough token count for TPM budgeting (~4 chars per token plus the output budget)"""
+    return len(prompt) // 4 + max_tokens
+
+
+class ProviderGuard:
+    """Breaker + quotas + adaptive concurrency + retries for one provider"""
+
+    def __init__(
+            self,
+            provider: str,
+            rpm: float | None = None,
+            tpm: float | None = None,
+            limiter: AdaptiveLimiter | None = None,
+            breaker: CircuitBreaker | None = None,
+            backoff_cap: float = 20.0,
+        ) -> None:
+        self.provider = provider
+        # Bursts of a full minute's quota: one request's token estimate (prompt + max_tokens)
+        # often exceeds a second's worth, and an idle provider should not make it wait
+        self.requests = RateLimiter(rpm / 60, burst=rpm) if rpm else None
+        self.tokens = RateLimiter(tpm / 60, burst=tpm) if tpm else None
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.backoff_cap = backoff_cap
+
+        # Metrics
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+
+    def _check_breaker(self) -> None:
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.provider, self.breaker.retry_after())
+
+    async def _acquire_async(self, tokens: int) -> None:
+        """Take the quotas and a concurrency slot; quota already taken is refunded if cancelled"""
+        taken: list[tuple[RateLimiter, float]] = []
+        try:
+            if self.requests is not None:
+                await self.requests.acquire()
+                taken.append((self.requests, 1.0))
+            if self.tokens is not None and tokens:
+                await self.tokens.acquire(tokens)
+                taken.append((self.tokens, tokens))
+            await self.limiter.acquire()
+        except BaseException:
+            for bucket, amount in taken:
+                bucket.refund(amount)
+            raise
+
+    def _acquire_sync(self, tokens: int) -> None:
+        if self.requests is not None:
+            self.requests.acquire_sync()
+        if self.tokens is not None and tokens:
+            self.tokens.acquire_sync(tokens)
+        self.limiter.acquire_sync()
+
+    def _on_failure(self, exc: BaseException, attempt: int, retries: int, backoff: float) -> float | None:
+        """Record a failed attempt; returns the delay before retrying, or None to give up"""
+        self.failures += 1
+        LLM_ERRORS.inc(provider=self.provider, status=str(status_code(exc) or type(exc).__name__))
+        if is_overload(exc):
+            self.limiter.on_overload()
+        if not is_retryable(exc):
+            # The provider answered, so the breaker sees a healthy call (this also frees a half-open probe)
+            self.breaker.record_success()
+            return None
+        self.breaker.record_failure()
+        if attempt >= retries:
+            return None
+        self.retries += 1
+        LLM_RETRIES.inc(provider=self.provider)
+        delay = backoff_delay(attempt, backoff, self.backoff_cap, retry_after_seconds(exc))
+        logger.warning(f"{self.provider} attempt {attempt + 1} failed: {exc}. Retrying in {delay:.2f}s")
+        return delay
+
+    def _on_success(self) -> None:
+        self.breaker.record_success()
+        self.limiter.on_success()
+
+    async def call_async(self, fn, retries: int = 3, backoff: float = 0.8, tokens: int = 0):
+        """Await `fn()` under the provider's limits, retrying transient failures"""
+        for attempt in range(retries + 1):
+            self._check_breaker()
+            try:
+                await self._acquire_async(tokens)
+            except BaseException:
+                # Cancelled while queued (e.g. a losing hedge): never leave the breaker waiting on this probe
+                self.breaker.release_probe()
+                raise
+            self.calls += 1
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._on_failure(e, attempt, retries, backoff)
+                if delay is None:
+                    raise
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+            else:
+                self._on_success()
+                return result
+            finally:
+                self.limiter.release()
+            await asyncio.sleep(delay)
+        raise RuntimeError("Failed to get a response after multiple attempts.")
+
+    def call_sync(self, fn, retries: int = 3, backoff: float = 0.8, tokens: int = 0):
+        """Blocking twin of `call_async` for the sync client path"""
+        for attempt in range(retries + 1):
+            self._check_breaker()
+            try:
+                self._acquire_sync(tokens)
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+            self.calls += 1
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._on_failure(e, attempt, retries, backoff)
+                if delay is None:
+                    raise
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+            else:
+                self._on_success()
+                return result
+            finally:
+                self.limiter.release()
+            time.sleep(delay)
+        raise RuntimeError("Failed to get a response after multiple attempts.")
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.limiter.in_flight,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "peak_in_flight": self.limiter.peak_in_flight,
+            "queued": self.limiter.queued,
+            "limit_increases": self.limiter.increases,
+            "limit_decreases": self.limiter.decreases,
+            "calls": self.calls,
+            "failures": self.failures,
+            "retries": self.retries,
+            "throttled_rpm": self.requests.throttled if self.requests else 0,
+            "throttled_tpm": self.tokens.throttled if self.tokens else 0,
+            "breaker_state": self.breaker.state,
+            "breaker_opens": self.breaker.opens,
+            "breaker_rejected": self.breaker.rejected,
+        }
+
+
+_guards: dict[str, ProviderGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def get_guard(provider: str) -> ProviderGuard:
+    """Return the shared guard for a provider, creating it from settings on first use"""
+    guard = _guards.get(provider)
+    if guard is not None:
+        return guard
+    with _guards_lock:
+        guard = _guards.get(provider)
+        if guard is None:
+            guard = ProviderGuard(
+                provider,
+                rpm=settings.PROVIDER_RPM.get(provider),
+                tpm=settings.PROVIDER_TPM.get(provider),
+                limiter=AdaptiveLimiter(
+                    initial=settings.PROVIDER_INITIAL_CONCURRENCY,
+                    min_limit=settings.PROVIDER_MIN_CONCURRENCY,
+                    max_limit=settings.PROVIDER_MAX_CONCURRENCY,
+                ),
+                breaker=CircuitBreaker(
+                    failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+                    reset_timeout=settings.BREAKER_RESET_SECONDS,
+                ),
+                backoff_cap=settings.RETRY_BACKOFF_CAP,
+            )
+            _guards[provider] = guard
+        return guard
+
+
+def provider_stats() -> dict:
+    return {provider: guard.stats() for provider, guard in _guards.items()}
@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from dataclasses import dataclass
 import time
 import asyncio
+import threading
 from google import genai
 from google.genai.types import GenerateContentConfig
 from openai import OpenAI, AsyncOpenAI
@@ -12,23 +14,98 @@ import app
 from ..models.provider import Provider
 from ..instrumentation import timed, timed_sync
 from ..core.config import settings
+from .limits import estimate_tokens, get_guard
+from .simulation import MockSimulation
 
 
 class LLMClient(ABC):
     @abstractmethod
     def generate(self, prompt: str, **params) -> dict: ...
 
+    @abstractmethod
+    async def generate_async(self, prompt: str, id: str = "", **params) -> dict: ...
+
+    async def generate_stream_async(self, prompt: str, **params):
+        """Yield the completion as text chunks. Default: a single chunk from generate_async."""
+        output_dict, _ = await self.generate_async(prompt=prompt, **params)
+        yield output_dict["text"]
+
+    def metric_labels(self) -> dict:
+        """Labels for this client's latency histogram"""
+        return {"provider": self.provider.value, "model": self.model}
+
+    def close(self) -> None:
+        """Release SDK clients and their connection pools"""
+
+    async def aclose(self) -> None:
+        self.close()
+
 class MockLLM(LLMClient):
-    def __init__(self, model_info: dict) -> None:
-        self.model_info = model_info
+    """Offline provider. Latency, failures and output size come from a MockSimulation
+    (the MOCK_* settings by default), so it can stand in for a slow or flaky provider.
+    """
+    def __init__(self, model_info: dict | None = None, simulation: MockSimulation | None = None) -> None:
+        self.model_info = model_info or {}
         self.version = "1.0-mock"
-        self.latency: int = 0
+        self.simulation = simulation or MockSimulation.from_settings()
+
+    def metric_labels(self) -> dict:
+        return {"provider": "mock", "model": self.version}
+
+    def _complete(self, prompt: str, latency_ms: float) -> dict:
+        text = self.simulation.completion(prompt)
+        usage = {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(text)}
+        return {
+            "text": text, "provider": "mock", "model_version": self.version,
+            "model_info": {**self.model_info, "usage": usage}, "latency": round(latency_ms, 3),
+        }
+
+    def _tokens(self, prompt: str) -> int:
+        return estimate_tokens(prompt, self.simulation.output_tokens)
 
     @timed
     def generate(self, prompt: str, **params):
-        self.latency = 100
-        return {"text": f"[MOCK OUTPUT]\n{prompt[:200]} ...", "provider": "mock", "model_version": self.version, "model_info": self.model_info, "latency": self.latency}
-    
+        sim = self.simulation
+
+        def attempt():
+            sim.check_rate_limit()
+            latency_ms = sim.latency.sample_ms()
+            time.sleep(latency_ms / 1000)
+            sim.check_error()
+            return self._complete(prompt, latency_ms)
+
+        return get_guard("mock").call_sync(attempt, retries=sim.retries, backoff=sim.backoff, tokens=self._tokens(prompt))
+
+    @timed_sync
+    async def generate_async(self, prompt: str, id: str = "", **params):
+        sim = self.simulation
+
+        async def attempt():
+            sim.check_rate_limit()
+            latency_ms = sim.latency.sample_ms()
+            await asyncio.sleep(latency_ms / 1000)
+            sim.check_error()
+            return self._complete(prompt, latency_ms)
+
+        return await get_guard("mock").call_async(attempt, retries=sim.retries, backoff=sim.backoff, tokens=self._tokens(prompt))
+
+    async def generate_stream_async(self, prompt: str, **params):
+        """Fake stream: the sampled latency is the time to first chunk, then paced chunks"""
+        sim = self.simulation
+
+        async def open_stream():
+            sim.check_rate_limit()
+            await asyncio.sleep(sim.latency.sample_ms() / 1000)
+            sim.check_error()
+
+        await get_guard("mock").call_async(open_stream, retries=sim.retries, backoff=sim.backoff, tokens=self._tokens(prompt))
+        text = sim.completion(prompt)
+        size = max(1, sim.stream_chunk_chars)
+        for i in range(0, len(text), size):
+            if i:
+                await asyncio.sleep(sim.stream_chunk_delay_ms / 1000)
+            yield text[i:i + size]
+
 
 @dataclass
 class GoogleAIClient(LLMClient):
@@ -42,6 +119,8 @@ class GoogleAIClient(LLMClient):
 
     def __post_init__(self):
         self.client = None
+        self._lock = threading.Lock()
+        self.guard = get_guard(self.provider.value)
         self.config = GenerateContentConfig(
             temperature=self.temperature,
             max_output_tokens=self.max_tokens,
@@ -49,61 +128,91 @@ class GoogleAIClient(LLMClient):
 
     def _ensure_client(self):
         if self.client is None:
-            api_key = settings.GOOGLE_API_KEY
-            if not api_key:
-                raise ValueError("GOOGLE_API_KEY environment variable is not set")
-            self.client = genai.Client(api_key=api_key)
-            
+            with self._lock:
+                if self.client is not None:
+                    return
+                api_key = settings.GOOGLE_API_KEY
+                if not api_key:
+                    raise ValueError("GOOGLE_API_KEY environment variable is not set")
+                self.client = genai.Client(api_key=api_key)
+
+    def _full_prompt(self, prompt: str) -> str:
+        # Clients are shared across requests, so never mutate self.context here
+        context_str = self.context if isinstance(self.context, str) else ""
+        return f"{context_str}\n{prompt}" if context_str else prompt
+
+    def close(self) -> None:
+        if self.client is not None and hasattr(self.client, "close"):
+            self.client.close()
+        self.client = None
+
+    async def aclose(self) -> None:
+        if self.client is not None and hasattr(self.client.aio, "aclose"):
+            await self.client.aio.aclose()
+        self.close()
+
     @timed_sync
-    async def generate_async(self, prompt: str, id: str = ""):
-        """Call the chat completion API with basic retries and timing.
-        Returns the model's answer as plain text.
+    async def generate_async(self, prompt: str, id: str = "", **params):
+        """Call the chat completion API under the provider guard (limits, retries, breaker).
+        Returns the same dict as `generate`.
         """
         self._ensure_client()
-        context_str = self.context if isinstance(self.context, str) else ""
-        full_prompt = f"{context_str}\n{prompt}" if context_str else prompt
-
-        for attempt in range(self.retries + 1):
-            try:
-                response = await self.client.aio.models.generate_content(#type: ignore
-                    model="gemini-2.5-flash",
-                    contents=full_prompt,
-                    config=self.config,
-                )
-                print(f"finitoh async {id}")
-                return (response.text, id)
-            except Exception as e:
-                if attempt == self.retries:
-                    raise
-                sleep_time = self.backoff * (2 ** attempt)
-                print(f"Attempt {attempt + 1} failed: {e}. Retrying in {sleep_time:.2f} seconds...")
-                await asyncio.sleep(sleep_time)
-        raise RuntimeError("Failed to get a response after multiple attempts.")
+        full_prompt = self._full_prompt(prompt)
+
+        async def attempt():
+            response = await self.client.aio.models.generate_content(#type: ignore
+                model=self.model,
+                contents=full_prompt,
+                config=self.config,
+            )
+            return {"text" : response.text, "model_info": {"model": self.model}, "latency": 0}
+
+        return await self.guard.call_async(
+            attempt, retries=self.retries, backoff=self.backoff,
+            tokens=estimate_tokens(full_prompt, self.max_tokens),
+        )
     
             
+    async def generate_stream_async(self, prompt: str, **params):
+        """Stream the completion as text chunks; the guard covers opening the stream only."""
+        self._ensure_client()
+        full_prompt = self._full_prompt(prompt)
+
+        async def open_stream():
+            return await self.client.aio.models.generate_content_stream(#type: ignore
+                model=self.model,
+                contents=full_prompt,
+                config=self.config,
+            )
+
+        stream = await self.guard.call_async(
+            open_stream, retries=self.retries, backoff=self.backoff,
+            tokens=estimate_tokens(full_prompt, self.max_tokens),
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
     @timed
     def generate(self, prompt: str, **params):
-        """Call the chat completion API with basic retries and timing.
+        """Call the chat completion API under the provider guard (limits, retries, breaker).
         Returns the model's answer as plain text.
         """
         self._ensure_client()
-        self.context = self.context + prompt
-        full_prompt = f"{self.context}\n{prompt}" if self.context else prompt
-        for attempt in range(self.retries + 1):
-            try:
-                response = self.client.models.generate_content(#type: ignore
-                    model="gemini-2.5-flash",
-                    contents=full_prompt,
-                    config=self.config,
-                )
-                return {"text" : response.text, "model_info": {"model": self.model}, "latency": 0}
-            except Exception as e:
-                if attempt == self.retries:
-                    raise
-                sleep_time = self.backoff * (2 ** attempt)
-                print(f"Attempt {attempt + 1} failed: {e}. Retrying in {sleep_time:.2f} seconds...")
-                time.sleep(sleep_time)
-        raise RuntimeError("Failed to get a response after multiple attempts.")
+        full_prompt = self._full_prompt(prompt)
+
+        def attempt():
+            response = self.client.models.generate_content(#type: ignore
+                model=self.model,
+                contents=full_prompt,
+                config=self.config,
+            )
+            return {"text" : response.text, "model_info": {"model": self.model}, "latency": 0}
+
+        return self.guard.call_sync(
+            attempt, retries=self.retries, backoff=self.backoff,
+            tokens=estimate_tokens(full_prompt, self.max_tokens),
+        )
     
 
 @dataclass
@@ -119,74 +228,222 @@ class OpenAIClient(LLMClient):
     def __post_init__(self):
         self.client = None
         self.async_client = None
+        self._lock = threading.Lock()
+        self.guard = get_guard(self.provider.value)
 
     def _ensure_client(self):
         if self.client is None:
-            api_key = settings.OPENAI_API_KEY
-            if not api_key:
-                raise ValueError("OPENAI_API_KEY environment variable is not set")
-            self.client = OpenAI(api_key=api_key)
+            with self._lock:
+                if self.client is not None:
+                    return
+                api_key = settings.OPENAI_API_KEY
+                if not api_key:
+                    raise ValueError("OPENAI_API_KEY environment variable is not set")
+                # Retries are handled by the provider guard, not the SDK
+                self.client = OpenAI(api_key=api_key, max_retries=0)
 
     def _ensure_async_client(self):
         if self.async_client is None:
-            api_key = settings.OPENAI_API_KEY
-            if not api_key:
-                raise ValueError("OPENAI_API_KEY environment variable is not set")
-            self.async_client = AsyncOpenAI(api_key=api_key)
+            with self._lock:
+                if self.async_client is not None:
+                    return
+                api_key = settings.OPENAI_API_KEY
+                if not api_key:
+                    raise ValueError("OPENAI_API_KEY environment variable is not set")
+                self.async_client = AsyncOpenAI(api_key=api_key, max_retries=0)
+
+    def _full_prompt(self, prompt: str) -> str:
+        context_str = self.context if isinstance(self.context, str) else ""
+        return f"{context_str}\n{prompt}" if context_str else prompt
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+
+    async def aclose(self) -> None:
+        if self.async_client is not None:
+            await self.async_client.close()
+        self.async_client = None
+        self.close()
 
     @timed_sync
-    async def generate_async(self, prompt: str, id: str = ""):
-        """Call the chat completion API with basic retries and timing.
-        Returns the model's answer as plain text.
+    async def generate_async(self, prompt: str, id: str = "", **params):
+        """Call the chat completion API under the provider guard (limits, retries, breaker).
+        Returns the same dict as `generate`.
         """
         self._ensure_async_client()
-        context_str = self.context if isinstance(self.context, str) else ""
-        full_prompt = f"{context_str}\n{prompt}" if context_str else prompt
-        for attempt in range(self.retries + 1):
-            try:
-                response = await self.async_client.chat.completions.create(#type: ignore
-                model="gpt-5-nano",
-                messages=[
-                    {"role": "user", "content": full_prompt}
-                ],
-                )
-                print(f"finitoh async {id}")
-                return (response.choices[0].message.content, id)
-
-            except Exception as e:
-                if attempt == self.retries:
-                    raise
-                sleep_time = self.backoff * (2 ** attempt)
-                print(f"Attempt {attempt + 1} failed: {e}. Retrying in {sleep_time:.2f} seconds...")
-                await asyncio.sleep(sleep_time)
-        raise RuntimeError("Failed to get a response after multiple attempts.")
+        full_prompt = self._full_prompt(prompt)
+
+        async def attempt():
+            response = await self.async_client.chat.completions.create(#type: ignore
+            model=self.model,
+            messages=[
+                {"role": "user", "content": full_prompt}
+            ],
+            )
+            return {"text" : response.choices[0].message.content, "model_info": {"model": self.model}, "latency": 0}#type: ignore
+
+        return await self.guard.call_async(
+            attempt, retries=self.retries, backoff=self.backoff,
+            tokens=estimate_tokens(full_prompt, self.max_tokens),
+        )
         
+    async def generate_stream_async(self, prompt: str, **params):
+        """Stream the chat completion as text deltas; the guard covers opening the stream only."""
+        self._ensure_async_client()
+        full_prompt = self._full_prompt(prompt)
+
+        async def open_stream():
+            return await self.async_client.chat.completions.create(#type: ignore
+            model=self.model,
+            messages=[
+                {"role": "user", "content": full_prompt}
+            ],
+            stream=True,
+            )
+
+        stream = await self.guard.call_async(
+            open_stream, retries=self.retries, backoff=self.backoff,
+            tokens=estimate_tokens(full_prompt, self.max_tokens),
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
     @timed
     def generate(self, prompt: str, **params):
-        """Call the chat completion API with basic retries and timing.
+        """Call the chat completion API under the provider guard (limits, retries, breaker).
         Returns the model's answer as plain text.
         """
         self._ensure_client()
-        context_str = self.context if isinstance(self.context, str) else ""
-        full_prompt = f"{context_str}\n{prompt}" if context_str else prompt
-
-        for attempt in range(self.retries + 1):
-            try:
-                response = self.client.chat.completions.create(#type: ignore
-                model="gpt-5-nano",
-                messages=[
-                    {"role": "user", "content": full_prompt}
-                ],
-                )
-                return {"text" : response.choices[0].message.content, "model_info": {"model": self.model}, "latency": 0}#type: ignore
-
-            except Exception as e:
-                if attempt == self.retries:
-                    raise
-                sleep_time = self.backoff * (2 ** attempt)
-                print(f"Attempt {attempt + 1} failed: {e}. Retrying in {sleep_time:.2f} seconds...")
-                time.sleep(sleep_time)
-        raise RuntimeError("Failed to get a response after multiple attempts.")
+        full_prompt = self._full_prompt(prompt)
+
+        def attempt():
+            response = self.client.chat.completions.create(#type: ignore
+            model=self.model,
+            messages=[
+                {"role": "user", "content": full_prompt}
+            ],
+            )
+            return {"text" : response.choices[0].message.content, "model_info": {"model": self.model}, "latency": 0}#type: ignore
+
+        return self.guard.call_sync(
+            attempt, retries=self.retries, backoff=self.backoff,
+            tokens=estimate_tokens(full_prompt, self.max_tokens),
+        )
     
 
-PROVIDERS = {"mock": MockLLM, "openai": OpenAIClient, "google": GoogleAIClient}
\ No newline at end of file
+PROVIDERS = {"mock": MockLLM, "openai": OpenAIClient, "google": GoogleAIClient}
+
+def client_config(provider: str, request_params: dict) -> dict:
+    """Whitelist and normalise per-request client config.
+
+    Each distinct config is a separate cached client, so values are snapped to a
+    small set: known models only, temperature to 0.1 in [0, 2], max_tokens rounded
+    up to LLM_MAX_TOKENS_STEP and capped at LLM_MAX_TOKENS_LIMIT.
+    """
+    config: dict = {}
+    model = request_params.get("model")
+    if model is not None:
+        if model not in settings.LLM_MODELS.get(provider, ()):
+            raise ValueError(f"Unsupported model for {provider}: {model}")
+        config["model"] = model
+    temperature = request_params.get("temperature")
+    if isinstance(temperature, (int, float)) and not isinstance(temperature, bool):
+        config["temperature"] = round(min(2.0, max(0.0, float(temperature))), 1)
+    max_tokens = request_params.get("max_tokens")
+    if isinstance(max_tokens, int) and not isinstance(max_tokens, bool):
+        step = settings.LLM_MAX_TOKENS_STEP
+        config["max_tokens"] = min(settings.LLM_MAX_TOKENS_LIMIT, max(step, -(-max_tokens // step) * step))
+    return config
+
+
+class ProviderRegistry:
+    """Long-lived, lazily built LLM clients keyed by (provider, config).
+
+    Reusing a client keeps its SDK HTTP connection pool (and TLS sessions)
+    alive across requests instead of handshaking on every prediction.
+    """
+    def __init__(self, providers: dict, max_clients: int = 32, close_grace: float = 60.0) -> None:
+        self.providers = providers
+        self.max_clients = max_clients
+        self.close_grace = close_grace
+        self._clients: OrderedDict[tuple, LLMClient] = OrderedDict()
+        self._lock = threading.Lock()
+        self._retiring: set = set()
+        self.created = 0
+        self.reused = 0
+        self.evicted = 0
+
+    def _build(self, provider: str, config: dict) -> LLMClient:
+        if provider == "mock":
+            return self.providers[provider](dict(config))
+        return self.providers[provider](**config)
+
+    def get(self, provider: str, **config) -> LLMClient:
+        if provider not in self.providers:
+            raise ValueError(f"Unsupported provider: {provider}")
+        key = (provider, tuple(sorted(config.items())))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self.reused += 1
+                return client
+            client = self._build(provider, config)
+            self._clients[key] = client
+            self.created += 1
+            evicted = []
+            while len(self._clients) > self.max_clients:
+                evicted.append(self._clients.popitem(last=False)[1])
+        for old in evicted:
+            self._retire(old)
+        return client
+
+    def _retire(self, client: LLMClient) -> None:
+        """Close an evicted client once calls that already hold it have had `close_grace` to finish"""
+        self.evicted += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            timer = threading.Timer(self.close_grace, client.close)
+            timer.daemon = True
+            timer.start()
+            return
+
+        async def close_later():
+            await asyncio.sleep(self.close_grace)
+            await client.aclose()
+
+        task = loop.create_task(close_later())
+        # Keep a reference until done, or the task may be collected before it runs
+        self._retiring.add(task)
+        task.add_done_callback(self._retiring.discard)
+
+    def close(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    async def aclose(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            await client.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "clients": [f"{provider}{dict(config)}" for provider, config in self._clients],
+            "created": self.created,
+            "reused": self.reused,
+            "evicted": self.evicted,
+        }
+
+
+registry = ProviderRegistry(
+    PROVIDERS, max_clients=settings.LLM_CLIENT_CACHE_SIZE, close_grace=settings.LLM_CLIENT_CLOSE_GRACE,
+)
\ No newline at end of file
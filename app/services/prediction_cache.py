@@ -0,0 +1,172 @@
+"""
+Cache of prediction results for identical requests.
+
+Keys hash everything that determines the model output: prompt id and
+version, the rendered prompt, provider, model and request params. Entries
+live in an in-memory LRU and, optionally, in a SQLite table so they survive
+restarts and are shared between workers.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+
+from app.core.config import settings
+from .db_pool import get_pool
+
+
+class PredictionCache:
+    """Two-tier (memory LRU + optional SQLite) cache with TTL"""
+
+    def __init__(
+            self,
+            max_entries: int = 1024,
+            ttl_seconds: float = 3600,
+            persistent: bool = False,
+            db_path: str = "var/database.db",
+        ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self.db_path = db_path
+        # key -> (expires_at, prompt_id, value)
+        self._entries: OrderedDict[str, tuple[float, str, dict]] = OrderedDict()
+        self._keys_by_prompt: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+        self._table_ready = False
+        self.hits = 0
+        self.misses = 0
+        self.persistent_hits = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(
+            prompt_id: str,
+            prompt_version: int,
+            rendered_prompt: str,
+            provider: str,
+            model: str | None,
+            params: dict | None,
+        ) -> str:
+        payload = json.dumps(
+            [prompt_id, prompt_version, rendered_prompt, provider, model, params or {}],
+            sort_keys=True,
+            default=str,
+        )
+        return sha256(payload.encode("utf-8")).hexdigest()
+
+    # ---- SQLite tier ----
+
+    def _conn(self):
+        conn = get_pool(self.db_path).acquire()
+        if not self._table_ready:
+            with conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS prediction_cache (
+                        key TEXT PRIMARY KEY,
+                        prompt_id TEXT NOT NULL,
+                        value TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                ''')
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_prediction_cache_prompt ON prediction_cache(prompt_id)")
+            self._table_ready = True
+        return conn
+
+    def _db_get(self, key: str) -> tuple[float, str, dict] | None:
+        row = self._conn().execute(
+            "SELECT prompt_id, value, expires_at FROM prediction_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or row["expires_at"] < time.time():
+            return None
+        return row["expires_at"], row["prompt_id"], json.loads(row["value"])
+
+    def _db_put(self, key: str, prompt_id: str, value: dict, expires_at: float) -> None:
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO prediction_cache (key, prompt_id, value, expires_at) VALUES (?, ?, ?, ?)",
+                (key, prompt_id, json.dumps(value, default=str), expires_at),
+            )
+
+    # ---- Memory tier ----
+
+    def _mem_put(self, key: str, entry: tuple[float, str, dict]) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._keys_by_prompt.setdefault(entry[1], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, (_, old_prompt_id, _) = self._entries.popitem(last=False)
+                self._keys_by_prompt.get(old_prompt_id, set()).discard(old_key)
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                del self._entries[key]
+                self._keys_by_prompt.get(entry[1], set()).discard(key)
+        if self.persistent:
+            entry = self._db_get(key)
+            if entry is not None:
+                self._mem_put(key, entry)
+                self.hits += 1
+                self.persistent_hits += 1
+                return entry[2]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, prompt_id: str, value: dict) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        self._mem_put(key, (expires_at, prompt_id, value))
+        if self.persistent:
+            self._db_put(key, prompt_id, value, expires_at)
+
+    async def get_async(self, key: str) -> dict | None:
+        if self.persistent:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    async def put_async(self, key: str, prompt_id: str, value: dict) -> None:
+        if self.persistent:
+            await asyncio.to_thread(self.put, key, prompt_id, value)
+        else:
+            self.put(key, prompt_id, value)
+
+    def invalidate_prompt(self, prompt_id: str) -> None:
+        """Drop every cached result produced by a prompt (e.g. after a version bump)"""
+        with self._lock:
+            for key in self._keys_by_prompt.pop(prompt_id, set()):
+                self._entries.pop(key, None)
+            self.invalidations += 1
+        if self.persistent:
+            with self._conn() as conn:
+                conn.execute("DELETE FROM prediction_cache WHERE prompt_id = ?", (prompt_id,))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "persistent": self.persistent,
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+prediction_cache = PredictionCache(
+    max_entries=settings.PREDICTION_CACHE_SIZE,
+    ttl_seconds=settings.PREDICTION_CACHE_TTL,
+    persistent=settings.PREDICTION_CACHE_PERSISTENT,
+    db_path=settings.DATABASE_PATH,
+)
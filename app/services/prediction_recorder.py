@@ -0,0 +1,126 @@
+"""
+Write-behind recorder for prediction logs.
+
+`record()` stamps the row and hands it to a BatchWriter, so the request
+returns as soon as the model output is ready. Rows are persisted in batched
+transactions by a background thread and flushed on application shutdown.
+"""
+import asyncio
+import atexit
+import json
+from datetime import datetime
+
+from app.core.config import settings
+from .batch_writer import BLOCK, BatchWriter
+from .db_service import log_predictions
+
+
+def _may_block() -> bool:
+    """False on an event loop thread, where waiting for queue room would stall every request.
+
+    Async callers should use `record_async`, which waits off the loop instead of dropping.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return True
+    return False
+
+
+class PredictionRecorder:
+    """Queues prediction rows and inserts them in batches"""
+
+    def __init__(self) -> None:
+        self.writer = BatchWriter(
+            name="prediction-writer",
+            write_batch=self._write,
+            max_queue=settings.PREDICTION_QUEUE_SIZE,
+            batch_size=settings.PREDICTION_BATCH_SIZE,
+            flush_interval=settings.PREDICTION_FLUSH_INTERVAL,
+            # Prefer backpressure over silently losing prediction history;
+            # the async methods wait for room in a worker thread, not on the loop
+            drop_policy=BLOCK,
+        )
+
+    @staticmethod
+    def _row(
+            prompt: str,
+            response: str,
+            user_id: str,
+            purpose: str,
+            provider: str,
+            prompt_id: str = "",
+            latency_ms: float = 0.0,
+            ttft_ms: float | None = None,
+            timings: dict | None = None,
+            prompt_version: int | None = None,
+            document: str | None = None,
+            timestamp: datetime | None = None,
+        ) -> tuple:
+        return (prompt, response, timestamp or datetime.now(), user_id, purpose, provider, prompt_id, latency_ms,
+                ttft_ms, json.dumps(timings) if timings else None, prompt_version, document)
+
+    def _rows(self, records: list[dict]) -> list[tuple]:
+        now = datetime.now()
+        return [self._row(**r, timestamp=now) for r in records]
+
+    def record(
+            self,
+            prompt: str,
+            response: str,
+            user_id: str,
+            purpose: str,
+            provider: str,
+            prompt_id: str = "",
+            latency_ms: float = 0.0,
+            ttft_ms: float | None = None,
+            timings: dict | None = None,
+            prompt_version: int | None = None,
+            document: str | None = None,
+        ) -> bool:
+        """Queue a prediction for persistence. Returns False if it was dropped.
+
+        Passing the source `document` lets the prompt be stored as a reference to
+        its version's template plus the document (see `log_predictions`).
+        """
+        row = self._row(
+            prompt, response, user_id, purpose, provider, prompt_id, latency_ms, ttft_ms, timings, prompt_version, document,
+        )
+        return self.writer.submit(row, block=_may_block())
+
+    async def record_async(self, **kwargs) -> bool:
+        """`record` for the event loop: waits for queue room without blocking the loop"""
+        return await self.writer.submit_async(self._row(**kwargs))
+
+    def record_many(self, records: list[dict]) -> bool:
+        """Queue several predictions (kwargs of `record`) to be inserted together"""
+        rows = self._rows(records)
+        return self.writer.submit(rows, block=_may_block()) if rows else True
+
+    async def record_many_async(self, records: list[dict]) -> bool:
+        rows = self._rows(records)
+        return await self.writer.submit_async(rows) if rows else True
+
+    @staticmethod
+    def _write(items: list) -> None:
+        # Items are single rows or lists of rows from record_many
+        rows = []
+        for item in items:
+            if isinstance(item, list):
+                rows.extend(item)
+            else:
+                rows.append(item)
+        log_predictions(rows)
+
+    def flush(self) -> bool:
+        return self.writer.flush()
+
+    def stop(self) -> bool:
+        return self.writer.stop()
+
+    def stats(self) -> dict:
+        return self.writer.stats()
+
+
+recorder = PredictionRecorder()
+atexit.register(recorder.stop)
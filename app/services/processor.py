@@ -1,54 +1,280 @@
+import asyncio
 import logging
-from .llm_client import PROVIDERS
+import time
+from app.core.config import settings
+from app.instrumentation.tracing import current_trace, span
+from ..models.domain import Prompt
+from .llm_client import PROVIDERS, client_config, registry
 from .prompt_store import PromptStore
-from .db_service import log_prediction
+from .prediction_cache import PredictionCache, prediction_cache
+from .prediction_recorder import recorder
+from .routing import RoutingPolicy, Target, get_policy, router
 from .template_renderer import render_template
 from .llm_client import *
 
 logger = logging.getLogger(__name__)
 
+def _get_client(provider: str, params: dict) -> LLMClient:
+    if provider not in PROVIDERS:
+        logger.error(f"Unsupported provider: {provider}")
+        raise ValueError(f"Unsupported provider: {provider}")
+    return registry.get(provider, **client_config(provider, params.get("params") or {}))
+
+def _targets(provider: str, llm_client: LLMClient, params: dict, policy: RoutingPolicy) -> list[Target]:
+    """The request's own client first, then the policy's fallbacks in order"""
+    targets = [Target(f"{provider}:{getattr(llm_client, 'model', provider)}", provider, llm_client)]
+    for spec in policy.fallbacks:
+        client = _get_client(spec["provider"], {"params": spec})
+        targets.append(Target(f"{spec['provider']}:{getattr(client, 'model', spec['provider'])}", spec["provider"], client))
+    return targets
+
+async def _generate_async(llm_client: LLMClient, provider: str, purpose: str, params: dict, filled_prompt: str):
+    """Call the LLM, through the purpose's routing policy if it has one.
+
+    Returns ((output_dict, duration), provider that answered).
+    """
+    policy = get_policy(purpose)
+    if policy is None:
+        return await llm_client.generate_async(prompt=filled_prompt, **params), provider
+    output_dict, duration, target = await router.generate(
+        _targets(provider, llm_client, params, policy), policy, filled_prompt, **params
+    )
+    return (output_dict, duration), target.provider
+
+def _cache_key(prompt: Prompt, filled_prompt: str, provider: str, llm_client: LLMClient, params: dict, use_cache: bool) -> str | None:
+    """Cache key for this prediction, or None when caching is off or bypassed"""
+    if not (use_cache and settings.PREDICTION_CACHE_ENABLED):
+        return None
+    return PredictionCache.make_key(
+        prompt.id, prompt.version, filled_prompt, provider,
+        getattr(llm_client, "model", None), params.get("params"),
+    )
+
+def _with_cache_state(output_dict: dict, state: str) -> dict:
+    # Copy so cached entries and shared client model_info are never mutated
+    output_dict = dict(output_dict)
+    output_dict["model_info"] = {**(output_dict.get("model_info") or {}), "cache": state}
+    return output_dict
+
+def _cached_result(cached: dict) -> tuple[dict, float]:
+    return _with_cache_state(cached, "hit"), 0.0
+
+def _cache_entry(output_dict: dict) -> dict:
+    return {"text": output_dict["text"], "model_info": output_dict.get("model_info") or {}}
+
+def _fresh_result(result, key: str | None, prompt: Prompt) -> tuple[dict, float]:
+    output_dict, duration = result
+    if key is not None:
+        prediction_cache.put(key, prompt.id, _cache_entry(output_dict))
+    return _with_cache_state(output_dict, "miss" if key is not None else "bypass"), duration
+
+async def _fresh_result_async(result, key: str | None, prompt: Prompt) -> tuple[dict, float]:
+    """`_fresh_result` for the event loop: a persistent cache write runs in a thread"""
+    output_dict, duration = result
+    if key is not None:
+        await prediction_cache.put_async(key, prompt.id, _cache_entry(output_dict))
+    return _with_cache_state(output_dict, "miss" if key is not None else "bypass"), duration
+
+def _prediction_record(result, filled_prompt: str, document_text: str, prompt, user_id: str, purpose: str, provider: str, ttft_ms: float | None = None) -> dict:
+    output_dict, duration = result
+    logger.info(f"LLM generation completed in {duration}s")
+
+    output_dict["latency"] = int(duration * 1000)
+    # Stages so far; the enqueue only shows up in the live trace
+    trace = current_trace()
+    timings = trace.timings() if trace is not None else None
+    return {
+        "prompt": filled_prompt,
+        "response": output_dict["text"],
+        "user_id": user_id,
+        "purpose": purpose,
+        "provider": provider,
+        "prompt_id": prompt.id,
+        "latency_ms": output_dict["latency"],
+        "ttft_ms": ttft_ms,
+        "timings": timings,
+        "prompt_version": prompt.version,
+        "document": document_text,
+    }
+
+def _finish(result, filled_prompt: str, document_text: str, prompt, user_id: str, purpose: str, provider: str, ttft_ms: float | None = None):
+    record = _prediction_record(result, filled_prompt, document_text, prompt, user_id, purpose, provider, ttft_ms)
+    # Queue prediction log; persisted in the background
+    with span("record"):
+        recorder.record(**record)
+    output_dict = result[0]
+    return output_dict["text"], output_dict["model_info"], output_dict["latency"]
+
+async def _finish_async(result, filled_prompt: str, document_text: str, prompt, user_id: str, purpose: str, provider: str, ttft_ms: float | None = None):
+    """`_finish` for the event loop: a full queue is waited out in a thread, not dropped"""
+    record = _prediction_record(result, filled_prompt, document_text, prompt, user_id, purpose, provider, ttft_ms)
+    with span("record"):
+        await recorder.record_async(**record)
+    output_dict = result[0]
+    return output_dict["text"], output_dict["model_info"], output_dict["latency"]
+
 def process_document(
         store: PromptStore,
         user_id: str,
         purpose: str,
         document_text: str,
         provider: str = "mock",
+        use_cache: bool = True,
         **params,
     ):
-    if provider not in PROVIDERS:
-        logger.error(f"Unsupported provider: {provider}")
-        raise ValueError(f"Unsupported provider: {provider}")
+    llm_client = _get_client(provider, params)
     logger.info(f"Processing document with provider={provider}, user_id={user_id}, purpose={purpose}")
-    if provider == "mock":
-        llm_client = PROVIDERS[provider]({})
-    else:
-        llm_client = PROVIDERS[provider]()
-    prompt = store.get_active(user_id=user_id, purpose=purpose)
+    with span("store"):
+        prompt = store.get_active(user_id=user_id, purpose=purpose)
     if not prompt:
         logger.error(f"No active prompt for user_id={user_id}, purpose={purpose}")
         raise ValueError(f"No active prompt for purpose '{purpose}'")
 
     # Render template with Jinja2 (supports backward compatibility)
-    filled_prompt = render_template(prompt.template, document_text)
+    with span("render"):
+        filled_prompt = render_template(prompt.template, document_text)
+    logger.debug(f"Rendered prompt template for prompt_id={prompt.id}")
+    key = _cache_key(prompt, filled_prompt, provider, llm_client, params, use_cache)
+    with span("cache"):
+        cached = prediction_cache.get(key) if key is not None else None
+    if cached is not None:
+        result = _cached_result(cached)
+    else:
+        with span("llm"):
+            result = _fresh_result(llm_client.generate(prompt=filled_prompt, **params), key, prompt)
+    return _finish(result, filled_prompt, document_text, prompt, user_id, purpose, provider)
+
+async def process_document_async(
+        prompt: Prompt,
+        user_id: str,
+        purpose: str,
+        document_text: str,
+        provider: str = "mock",
+        use_cache: bool = True,
+        **params,
+    ):
+    """Async variant of `process_document` built on `generate_async`.
+
+    Takes the prompt already resolved by the caller, so a request does a single
+    active-prompt lookup. The LLM call awaits on the event loop instead of
+    holding a threadpool worker.
+    """
+    llm_client = _get_client(provider, params)
+    logger.info(f"Processing document with provider={provider}, user_id={user_id}, purpose={purpose}")
+    with span("render"):
+        filled_prompt = render_template(prompt.template, document_text)
     logger.debug(f"Rendered prompt template for prompt_id={prompt.id}")
-    result = llm_client.generate(
-        prompt=filled_prompt,
+    key = _cache_key(prompt, filled_prompt, provider, llm_client, params, use_cache)
+    with span("cache"):
+        cached = await prediction_cache.get_async(key) if key is not None else None
+    answered_by = provider
+    if cached is not None:
+        result = _cached_result(cached)
+    else:
+        with span("llm"):
+            generated, answered_by = await _generate_async(llm_client, provider, purpose, params, filled_prompt)
+            result = await _fresh_result_async(generated, key, prompt)
+    return await _finish_async(result, filled_prompt, document_text, prompt, user_id, purpose, answered_by)
+
+async def process_batch_async(
+        prompt: Prompt,
+        documents: list[str],
+        user_id: str,
+        purpose: str,
+        provider: str = "mock",
+        max_concurrency: int | None = None,
+        use_cache: bool = True,
         **params,
-    )
+    ) -> list:
+    """Apply one resolved prompt to many documents with bounded concurrency.
 
-    output_dict, duration = result
-    logger.info(f"LLM generation completed in {duration}s")
+    Returns one entry per document, in order: either the
+    (output_text, model_info, latency) tuple or the exception it raised.
+    All successful predictions are logged with a single bulk insert.
+    """
+    llm_client = _get_client(provider, params)
+    semaphore = asyncio.Semaphore(max_concurrency or settings.BATCH_MAX_CONCURRENCY)
+    records: list[dict] = []
+    logger.info(f"Processing batch of {len(documents)} documents with provider={provider}, user_id={user_id}, purpose={purpose}")
 
-    output_dict["latency"] = int(duration * 1000)
-    # Log prediction to database
-    log_prediction(
-        prompt=filled_prompt,
-        response=output_dict["text"],
-        user_id=user_id,
-        purpose=purpose,
-        provider=provider,
-        prompt_id=prompt.id,
-        latency_ms=output_dict["latency"]
-    )
+    async def run_one(document_text: str):
+        filled_prompt = render_template(prompt.template, document_text)
+        key = _cache_key(prompt, filled_prompt, provider, llm_client, params, use_cache)
+        cached = await prediction_cache.get_async(key) if key is not None else None
+        answered_by = provider
+        if cached is not None:
+            output_dict, duration = _cached_result(cached)
+        else:
+            # Provider RPM/TPM quotas and backoff are applied inside the client
+            async with semaphore:
+                result, answered_by = await _generate_async(llm_client, provider, purpose, params, filled_prompt)
+            output_dict, duration = await _fresh_result_async(result, key, prompt)
+        latency = int(duration * 1000)
+        records.append({
+            "prompt": filled_prompt,
+            "response": output_dict["text"],
+            "user_id": user_id,
+            "purpose": purpose,
+            "provider": answered_by,
+            "prompt_id": prompt.id,
+            "prompt_version": prompt.version,
+            "latency_ms": latency,
+            "document": document_text,
+        })
+        return output_dict["text"], output_dict["model_info"], latency
+
+    results = await asyncio.gather(*(run_one(d) for d in documents), return_exceptions=True)
+    await recorder.record_many_async(records)
+    return results
+
+async def stream_document_async(
+        prompt: Prompt,
+        document_text: str,
+        user_id: str,
+        purpose: str,
+        provider: str = "mock",
+        use_cache: bool = True,
+        **params,
+    ):
+    """Stream a prediction for an already-resolved prompt as events.
+
+    Yields {"type": "chunk", "text": ...} for each piece of output, then one
+    {"type": "done", ...} event with model info, total latency and
+    time-to-first-token. The assembled text is logged once the stream ends.
+    """
+    llm_client = _get_client(provider, params)
+    logger.info(f"Streaming document with provider={provider}, user_id={user_id}, purpose={purpose}")
+    filled_prompt = render_template(prompt.template, document_text)
+    key = _cache_key(prompt, filled_prompt, provider, llm_client, params, use_cache)
+    cached = await prediction_cache.get_async(key) if key is not None else None
+
+    start = time.perf_counter()
+    ttft_ms: float | None = None
+    if cached is not None:
+        result = _cached_result(cached)
+        ttft_ms = 0.0
+        yield {"type": "chunk", "text": result[0]["text"]}
+    else:
+        chunks: list[str] = []
+        async for piece in llm_client.generate_stream_async(prompt=filled_prompt, **params):
+            if ttft_ms is None:
+                ttft_ms = round((time.perf_counter() - start) * 1000, 3)
+            chunks.append(piece)
+            yield {"type": "chunk", "text": piece}
+        if hasattr(llm_client, "model"):
+            model_info = {"model": llm_client.model}
+        else:
+            model_info = dict(getattr(llm_client, "model_info", None) or {})
+        output = {"text": "".join(chunks), "model_info": model_info}
+        result = await _fresh_result_async((output, time.perf_counter() - start), key, prompt)
 
-    return output_dict["text"], output_dict["model_info"], output_dict["latency"]
\ No newline at end of file
+    output_text, model_info, latency = await _finish_async(result, filled_prompt, document_text, prompt, user_id, purpose, provider, ttft_ms=ttft_ms)
+    logger.info(f"Stream completed: prompt_id={prompt.id}, ttft={ttft_ms}ms, latency={latency}ms")
+    yield {
+        "type": "done",
+        "prompt_id": prompt.id,
+        "prompt_version": prompt.version,
+        "model_info": model_info,
+        "latency_ms": latency,
+        "ttft_ms": ttft_ms,
+    }
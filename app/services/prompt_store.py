@@ -1,9 +1,21 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
 from uuid import uuid4
 from typing import TypeAlias
+import asyncio
 import json, os
-from typing import Optional
-from ..models.domain import Prompt
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterator, Optional
+from datetime import datetime, timezone
+from ..models.domain import Prompt, PromptVersion
+from .prompt_versions import content_hash, make_diff, rebuild
+from .db_pool import get_pool
 
 
 UserId: TypeAlias = str
@@ -68,16 +80,198 @@ class PromptStore(ABC):
         ) -> bool:
         ...
 
+    @abstractmethod
+    def get_active_map(
+            self,
+            user_id: UserId,
+        ) -> dict[Purpose, PromptId]:
+        """All of a user's active prompts in one call, as purpose -> prompt id"""
+        ...
+
+    def list_page(
+            self,
+            limit: int,
+            after_id: PromptId | None = None,
+            purpose: Purpose | None = None,
+            user_id: UserId | None = None,
+            name_prefix: str | None = None,
+        ) -> list[Prompt]:
+        """Up to `limit` prompts ordered by id, starting after `after_id` (keyset cursor).
+
+        The default filters a full list(); stores override it to avoid that.
+        """
+        prompts = sorted(self.list(purpose), key=lambda p: p.id)
+        return [
+            p for p in prompts
+            if (after_id is None or p.id > after_id)
+            and (user_id is None or p.user_id == user_id)
+            and (name_prefix is None or p.name.startswith(name_prefix))
+        ][:limit]
+
+    def iter_prompts(self, chunk_size: int = 500, **filters) -> Iterator[Prompt]:
+        """Yield every matching prompt, fetching `chunk_size` at a time"""
+        after_id = None
+        while True:
+            page = self.list_page(chunk_size, after_id=after_id, **filters)
+            yield from page
+            if len(page) < chunk_size:
+                return
+            after_id = page[-1].id
+
+    def import_prompts(self, user_id: UserId, rows: list[tuple[Purpose, str, str, bool]]) -> list[Prompt]:
+        """Create (purpose, name, template, activate) rows owned by `user_id`.
+
+        Stores override this to apply the whole batch in one write; a later
+        active row for the same purpose wins, as with sequential activations.
+        """
+        prompts = []
+        for purpose, name, template, activate in rows:
+            prompt = self.create(purpose, name, template, user_id)
+            if activate:
+                self.set_active(user_id, purpose, prompt.id)
+            prompts.append(prompt)
+        return prompts
+
+    def list_versions(self, prompt_id: PromptId, user_id: UserId) -> list[PromptVersion]:
+        """Template history of a prompt owned by `user_id`, oldest first; kept after the prompt is deleted"""
+        return []
+
+    def get_version_template(self, prompt_id: PromptId, version: int, user_id: UserId) -> str | None:
+        """Rebuild the template a prompt had at `version` from its stored diffs"""
+        history = [v for v in self.list_versions(prompt_id, user_id) if v.version <= version]
+        if not history or history[-1].version != version:
+            return None
+        return rebuild([v.diff for v in history])
+
+    def export_prompts(self, user_id: UserId) -> Iterator[tuple[Prompt, bool]]:
+        """Yield (prompt, active) for every prompt owned by `user_id`, in id order"""
+        active = self.get_active_map(user_id)
+        for prompt in self.iter_prompts(user_id=user_id):
+            yield prompt, active.get(prompt.purpose) == prompt.id
+
+    def close(self) -> None:
+        """Release files or connections held by the store (called on shutdown)"""
+
+    def change_version(self) -> int | None:
+        """Counter bumped by every write from any process, or None if the store
+        cannot see other processes' writes (caches then rely on their TTL)"""
+        return None
+
+    # Async interface. The defaults run the sync method in a worker thread so a
+    # blocking store never stalls the event loop; stores whose reads are plain
+    # dict lookups override them to skip the thread hop.
+
+    async def create_async(self, purpose: Purpose, name: str, template: str, user_id: UserId) -> Prompt:
+        return await asyncio.to_thread(self.create, purpose, name, template, user_id)
+
+    async def list_async(self, purpose: Purpose | None = None) -> list[Prompt]:
+        return await asyncio.to_thread(self.list, purpose)
+
+    async def get_async(self, prompt_id: PromptId) -> Prompt | None:
+        return await asyncio.to_thread(self.get, prompt_id)
+
+    async def patch_async(self, prompt_id: PromptId, template: str, user_id: UserId) -> Prompt | None:
+        return await asyncio.to_thread(self.patch, prompt_id, template, user_id)
+
+    async def set_active_async(self, user_id: UserId, purpose: Purpose, prompt_id: PromptId) -> Prompt | None:
+        return await asyncio.to_thread(self.set_active, user_id, purpose, prompt_id)
+
+    async def get_active_async(self, user_id: UserId, purpose: Purpose) -> Prompt | None:
+        return await asyncio.to_thread(self.get_active, user_id, purpose)
+
+    async def delete_async(self, prompt_id: PromptId, user_id: UserId) -> bool:
+        return await asyncio.to_thread(self.delete, prompt_id, user_id)
+
+    async def get_active_map_async(self, user_id: UserId) -> dict[Purpose, PromptId]:
+        return await asyncio.to_thread(self.get_active_map, user_id)
+
+    async def change_version_async(self) -> int | None:
+        return await asyncio.to_thread(self.change_version)
+
+    async def import_prompts_async(self, user_id: UserId, rows: list[tuple[Purpose, str, str, bool]]) -> list[Prompt]:
+        return await asyncio.to_thread(self.import_prompts, user_id, rows)
+
 
 class InMemoryStore(PromptStore):
-    """In-memory implementation of PromptStore."""
+    """In-memory implementation of PromptStore.
+
+    `prompts` and `active_prompts` are the source of truth. Three secondary
+    indexes are kept in step with them so no read or delete has to scan:
+    purpose -> prompt ids, prompt id -> active keys pointing at it, and
+    user -> {purpose: prompt id}. All mutations go through `_put`,
+    `_activate` and `_remove` so the indexes cannot drift.
+    """
     def __init__(self) -> None:
         self.prompts: dict[PromptId, Prompt] = {}
         self.active_prompts: dict[tuple[UserId, Purpose], PromptId] = {}
+        # dicts used as insertion-ordered sets so list() keeps creation order
+        self._by_purpose: dict[Purpose, dict[PromptId, None]] = {}
+        self._active_refs: dict[PromptId, set[tuple[UserId, Purpose]]] = {}
+        self._active_by_user: dict[UserId, dict[Purpose, PromptId]] = {}
+        # All ids in sorted order, for keyset pagination in list_page
+        self._sorted_ids: list[PromptId] = []
+        # Append-only template history per prompt
+        self._versions: dict[PromptId, list[PromptVersion]] = {}
+
+    # ---- Index maintenance ----
+
+    def _put(self, prompt: Prompt) -> None:
+        old = self.prompts.get(prompt.id)
+        if old is None:
+            insort(self._sorted_ids, prompt.id)
+        elif old.purpose != prompt.purpose:
+            self._by_purpose[old.purpose].pop(prompt.id, None)
+        self.prompts[prompt.id] = prompt
+        self._by_purpose.setdefault(prompt.purpose, {})[prompt.id] = None
+        if old is not prompt:
+            self._record_version(prompt, old.template if old is not None else "")
+
+    def _record_version(self, prompt: Prompt, old_template: str) -> None:
+        history = self._versions.setdefault(prompt.id, [])
+        if history and history[-1].version >= prompt.version:
+            return  # already recorded (e.g. loaded from a snapshot)
+        history.append(PromptVersion(
+            prompt_id=prompt.id,
+            version=prompt.version,
+            user_id=prompt.user_id,
+            content_hash=content_hash(prompt.template),
+            diff=make_diff(old_template, prompt.template),
+            created_at=datetime.now(timezone.utc).replace(tzinfo=None),
+        ))
+
+    def _activate(self, user_id: UserId, purpose: Purpose, prompt_id: PromptId) -> None:
+        key = (user_id, purpose)
+        previous = self.active_prompts.get(key)
+        if previous is not None:
+            refs = self._active_refs.get(previous)
+            if refs is not None:
+                refs.discard(key)
+                if not refs:
+                    del self._active_refs[previous]
+        self.active_prompts[key] = prompt_id
+        self._active_refs.setdefault(prompt_id, set()).add(key)
+        self._active_by_user.setdefault(user_id, {})[purpose] = prompt_id
+
+    def _remove(self, prompt_id: PromptId) -> None:
+        prompt = self.prompts.pop(prompt_id, None)
+        if prompt is None:
+            return
+        del self._sorted_ids[bisect_left(self._sorted_ids, prompt_id)]
+        ids = self._by_purpose.get(prompt.purpose)
+        if ids is not None:
+            ids.pop(prompt_id, None)
+            if not ids:
+                del self._by_purpose[prompt.purpose]
+        # Remove from active_prompts if it was active
+        for user_id, purpose in self._active_refs.pop(prompt_id, ()):
+            del self.active_prompts[(user_id, purpose)]
+            user_map = self._active_by_user[user_id]
+            del user_map[purpose]
+            if not user_map:
+                del self._active_by_user[user_id]
 
     def create(self, purpose: Purpose, name: str, template: str, user_id: str) -> Prompt:
         prompt_id = str(uuid4())
-        print(prompt_id)
         prompt = Prompt(
             id=prompt_id,
             purpose=purpose,
@@ -85,7 +279,7 @@ class InMemoryStore(PromptStore):
             template=template,
             user_id=user_id
         )
-        self.prompts[prompt_id] = prompt
+        self._put(prompt)
         return prompt
 
     def list(
@@ -94,7 +288,7 @@ class InMemoryStore(PromptStore):
         ) -> list[Prompt]:
         if purpose is None:
             return list(self.prompts.values())
-        return [p for p in self.prompts.values() if p.purpose == purpose]
+        return [self.prompts[pid] for pid in self._by_purpose.get(purpose, ())]
 
     def get(
             self,
@@ -115,7 +309,9 @@ class InMemoryStore(PromptStore):
         if user_id != prompt.user_id:
             return None
 
-        prompt.template = template
+        old_template = prompt.template
+        prompt.update(template)  # bumps version, like DatabaseStore.patch
+        self._record_version(prompt, old_template)
         return prompt
 
     def set_active(
@@ -127,7 +323,7 @@ class InMemoryStore(PromptStore):
         prompt = self.get(prompt_id)
         if prompt is None:
             return None
-        self.active_prompts[(user_id, purpose)] = prompt_id
+        self._activate(user_id, purpose, prompt_id)
         return prompt
 
     def get_active(
@@ -150,34 +346,150 @@ class InMemoryStore(PromptStore):
             return False
         if prompt.user_id != user_id:
             return False
-        # Remove from active_prompts if it was active
-        keys_to_remove = [k for k, v in self.active_prompts.items() if v == prompt_id]
-        for key in keys_to_remove:
-            del self.active_prompts[key]
-        del self.prompts[prompt_id]
+        self._remove(prompt_id)
         return True
 
+    def get_active_map(self, user_id: UserId) -> dict[Purpose, PromptId]:
+        return dict(self._active_by_user.get(user_id, {}))
+
+    def list_versions(self, prompt_id: PromptId, user_id: UserId) -> list[PromptVersion]:
+        return [v for v in self._versions.get(prompt_id, ()) if v.user_id == user_id]
+
+    def list_page(
+            self,
+            limit: int,
+            after_id: PromptId | None = None,
+            purpose: Purpose | None = None,
+            user_id: UserId | None = None,
+            name_prefix: str | None = None,
+        ) -> list[Prompt]:
+        # Runs on the threadpool while deletes run on the event loop, so walk the ids
+        # in small snapshot chunks (never the whole tail) and skip prompts already gone.
+        # Each chunk resumes after the last id seen, so a concurrent delete cannot shift it.
+        page: list[Prompt] = []
+        cursor = after_id
+        step = max(limit, 100)
+        while len(page) < limit:
+            start = bisect_right(self._sorted_ids, cursor) if cursor is not None else 0
+            chunk = self._sorted_ids[start:start + step]
+            if not chunk:
+                break
+            for prompt_id in chunk:
+                prompt = self.prompts.get(prompt_id)
+                if prompt is None:
+                    continue
+                if purpose is not None and prompt.purpose != purpose:
+                    continue
+                if user_id is not None and prompt.user_id != user_id:
+                    continue
+                if name_prefix is not None and not prompt.name.startswith(name_prefix):
+                    continue
+                page.append(prompt)
+                if len(page) >= limit:
+                    break
+            cursor = chunk[-1]
+        return page
+
+    # Reads never block, so serve them directly on the event loop
+    async def list_async(self, purpose: Purpose | None = None) -> list[Prompt]:
+        return self.list(purpose)
+
+    async def get_async(self, prompt_id: PromptId) -> Prompt | None:
+        return self.get(prompt_id)
+
+    async def get_active_async(self, user_id: UserId, purpose: Purpose) -> Prompt | None:
+        return self.get_active(user_id, purpose)
+
+    async def get_active_map_async(self, user_id: UserId) -> dict[Purpose, PromptId]:
+        return self.get_active_map(user_id)
+
 
 class FileSnapshotStore(InMemoryStore):
-    """Wraps InMemoryStore and snapshots to var/data.json on writes."""
-    def __init__(self, filepath: str = "var/data.json") -> None:
+    """Wraps InMemoryStore and snapshots to var/data.json on writes.
+
+    With `journal=True` each mutation is appended to `<filepath>.journal` as
+    one JSON line instead of rewriting the whole snapshot, so write cost does
+    not grow with the number of prompts. The journal is fsynced in batches
+    (every `fsync_every` records or `fsync_interval` seconds, checked on
+    write) and compacted into an atomic snapshot every `compact_every`
+    records. On startup the snapshot is loaded and the journal replayed.
+    """
+    def __init__(
+            self,
+            filepath: str = "var/data.json",
+            journal: bool = False,
+            fsync_every: int = 32,
+            fsync_interval: float = 1.0,
+            compact_every: int = 1000,
+        ) -> None:
         super().__init__()
         self.filepath = filepath
+        self.journal = journal
+        self.journal_path = f"{filepath}.journal"
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        # Re-entrant: writes hold it across the in-memory change and _persist, so the
+        # journal order matches the apply order and a snapshot never sees a half-applied write
+        self._lock = threading.RLock()
+        self._journal_file = None
+        self._journal_records = 0
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
         self._load()
+        if self.journal:
+            os.makedirs(os.path.dirname(self.filepath) or ".", exist_ok=True)
+            if self._replay_journal():
+                # Fold the replayed records into a fresh snapshot so the journal starts empty
+                self._snapshot()
+                open(self.journal_path, "w").close()
+            self._journal_file = open(self.journal_path, "a")
 
     def _load(self) -> None:
         if not os.path.exists(self.filepath):
             return
         with open(self.filepath, "r") as f:
             data = json.load(f)
+        # History first, so _put does not record the loaded templates again
+        for prompt_id, history in data.get("versions", {}).items():
+            self._versions[prompt_id] = [PromptVersion.model_validate(v) for v in history]
         for p_data in data.get("prompts", []):
-            prompt = Prompt.model_validate(p_data)
-            self.prompts[prompt.id] = prompt
+            self._put(Prompt.model_validate(p_data))
+        # Snapshots from before history kept its owner: take it from the live prompt
+        for prompt_id, history in self._versions.items():
+            prompt = self.prompts.get(prompt_id)
+            for v in history:
+                if not v.user_id and prompt is not None:
+                    v.user_id = prompt.user_id
         for key, prompt_id in data.get("active_prompts", {}).items():
             user_id, purpose = key.split("|", 1)
-            self.active_prompts[(user_id, purpose)] = prompt_id
+            self._activate(user_id, purpose, prompt_id)
 
+    def _apply(self, record: dict) -> None:
+        """Apply one journal record to the in-memory state"""
+        op = record["op"]
+        if op == "put":
+            self._put(Prompt.model_validate(record["prompt"]))
+        elif op == "activate":
+            self._activate(record["user_id"], record["purpose"], record["prompt_id"])
+        elif op == "delete":
+            self._remove(record["prompt_id"])
 
+    def _replay_journal(self) -> int:
+        """Replay the journal on top of the snapshot; returns the number of records applied"""
+        if not os.path.exists(self.journal_path):
+            return 0
+        applied = 0
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn final write from a crash; everything before it is intact
+                    break
+                self._apply(record)
+                applied += 1
+        return applied
 
     def _snapshot(self) -> None:
         data = {
@@ -186,10 +498,55 @@ class FileSnapshotStore(InMemoryStore):
                 f"{user_id}|{purpose}": prompt_id
                 for (user_id, purpose), prompt_id in self.active_prompts.items()
             },
+            "versions": {
+                prompt_id: [v.model_dump(mode="json") for v in history]
+                for prompt_id, history in self._versions.items()
+            },
         }
-        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
-        with open(self.filepath, "w") as f:
+        directory = os.path.dirname(self.filepath) or "."
+        os.makedirs(directory, exist_ok=True)
+        # Write-then-rename so a crash never leaves a truncated snapshot
+        tmp_path = f"{self.filepath}.tmp"
+        with open(tmp_path, "w") as f:
             json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.filepath)
+
+    def _compact(self) -> None:
+        """Snapshot current state and truncate the journal (lock held)"""
+        self._snapshot()
+        self._journal_file.close()
+        self._journal_file = open(self.journal_path, "w")
+        os.fsync(self._journal_file.fileno())
+        self._journal_records = 0
+        self._unsynced = 0
+        self._last_fsync = time.monotonic()
+
+    def _persist(self, record: dict) -> None:
+        with self._lock:
+            if not self.journal:
+                self._snapshot()
+                return
+            self._journal_file.write(json.dumps(record) + "\n")
+            self._journal_file.flush()
+            self._journal_records += 1
+            self._unsynced += 1
+            now = time.monotonic()
+            if self._unsynced >= self.fsync_every or now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._journal_file.fileno())
+                self._unsynced = 0
+                self._last_fsync = now
+            if self._journal_records >= self.compact_every:
+                self._compact()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._journal_file is not None:
+                self._journal_file.flush()
+                os.fsync(self._journal_file.fileno())
+                self._journal_file.close()
+                self._journal_file = None
 
     def create(
             self,
@@ -198,19 +555,36 @@ class FileSnapshotStore(InMemoryStore):
             template: str,
             user_id: str
         ) -> Prompt:
-        prompt = super().create(purpose, name, template, user_id)
-        self._snapshot()
+        with self._lock:
+            prompt = super().create(purpose, name, template, user_id)
+            self._persist({"op": "put", "prompt": prompt.model_dump()})
         return prompt
 
+    def import_prompts(self, user_id: UserId, rows: list[tuple[Purpose, str, str, bool]]) -> list[Prompt]:
+        # Apply in memory, then write one snapshot instead of one record per row
+        prompts = []
+        with self._lock:
+            for purpose, name, template, activate in rows:
+                prompt = InMemoryStore.create(self, purpose, name, template, user_id)
+                if activate:
+                    self._activate(user_id, purpose, prompt.id)
+                prompts.append(prompt)
+            if self.journal:
+                self._compact()
+            else:
+                self._snapshot()
+        return prompts
+
     def patch(
             self,
             prompt_id: PromptId,
             template: str,
             user_id: UserId,
         ) -> Prompt | None:
-        prompt = super().patch(prompt_id, template, user_id)
-        if prompt is not None:
-            self._snapshot()
+        with self._lock:
+            prompt = super().patch(prompt_id, template, user_id)
+            if prompt is not None:
+                self._persist({"op": "put", "prompt": prompt.model_dump()})
         return prompt
 
     def set_active(
@@ -219,9 +593,10 @@ class FileSnapshotStore(InMemoryStore):
             purpose: Purpose,
             prompt_id: PromptId,
         ) -> Prompt | None:
-        prompt = super().set_active(user_id, purpose, prompt_id)
-        if prompt is not None:
-            self._snapshot()
+        with self._lock:
+            prompt = super().set_active(user_id, purpose, prompt_id)
+            if prompt is not None:
+                self._persist({"op": "activate", "user_id": user_id, "purpose": purpose, "prompt_id": prompt_id})
         return prompt
 
     def delete(
@@ -229,9 +604,10 @@ class FileSnapshotStore(InMemoryStore):
             prompt_id: PromptId,
             user_id: UserId,
         ) -> bool:
-        result = super().delete(prompt_id, user_id)
-        if result:
-            self._snapshot()
+        with self._lock:
+            result = super().delete(prompt_id, user_id)
+            if result:
+                self._persist({"op": "delete", "prompt_id": prompt_id})
         return result
 
 
@@ -239,16 +615,13 @@ class DatabaseStore(PromptStore):
     """SQLite-backed implementation of PromptStore."""
 
     def __init__(self, db_path: str = "var/database.db") -> None:
-        import sqlite3
         self.db_path = db_path
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._pool = get_pool(db_path)
         self._init_tables()
 
     def _get_conn(self):
-        import sqlite3
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        # Pooled per-thread connection; `with conn:` commits or rolls back but keeps it open
+        return self._pool.acquire()
 
     def _init_tables(self) -> None:
         with self._get_conn() as conn:
@@ -274,8 +647,89 @@ class DatabaseStore(PromptStore):
                     FOREIGN KEY (prompt_id) REFERENCES prompts(id)
                 )
             ''')
+            # list(purpose) filters on purpose; delete() looks up active rows by prompt_id
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_prompts_purpose ON prompts(purpose)")
+            # list_page walks id order within a purpose or owner
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_prompts_purpose_id ON prompts(purpose, id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_prompts_user_id ON prompts(user_id, id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_active_prompts_prompt_id ON active_prompts(prompt_id)")
+
+            # Append-only template history; predictions.prompt_version points into it
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS prompt_versions (
+                    prompt_id TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    user_id TEXT,
+                    content_hash TEXT NOT NULL,
+                    diff TEXT NOT NULL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (prompt_id, version)
+                )
+            ''')
+            columns = {row["name"] for row in cursor.execute("PRAGMA table_info(prompt_versions)")}
+            if "user_id" not in columns:
+                # Owner column added later: backfill it from the prompts that still exist.
+                # The append-only trigger is recreated just below.
+                cursor.execute("ALTER TABLE prompt_versions ADD COLUMN user_id TEXT")
+                cursor.execute("DROP TRIGGER IF EXISTS trg_prompt_versions_no_update")
+                cursor.execute('''
+                    UPDATE prompt_versions
+                    SET user_id = (SELECT user_id FROM prompts p WHERE p.id = prompt_versions.prompt_id)
+                ''')
+            for op in ("UPDATE", "DELETE"):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_prompt_versions_no_{op.lower()}
+                    BEFORE {op} ON prompt_versions
+                    BEGIN
+                        SELECT RAISE(ABORT, 'prompt_versions is append-only');
+                    END
+                ''')
+            # Prompts created before the history table start it at their current version
+            cursor.execute('''
+                SELECT id, version, template, user_id FROM prompts p
+                WHERE NOT EXISTS (SELECT 1 FROM prompt_versions v WHERE v.prompt_id = p.id)
+            ''')
+            cursor.executemany(
+                "INSERT INTO prompt_versions (prompt_id, version, user_id, content_hash, diff) VALUES (?, ?, ?, ?, ?)",
+                [
+                    self._version_row(row["id"], row["version"], row["user_id"], "", row["template"])
+                    for row in cursor.fetchall()
+                ],
+            )
+
+            # Cross-process change counter: bumped by triggers in the writing
+            # transaction, so every worker sharing the file sees every write
+            # (including ones made outside this class) by polling one row.
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS store_changes (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL
+                )
+            ''')
+            cursor.execute("INSERT OR IGNORE INTO store_changes (id, version) VALUES (1, 0)")
+            for table in ("prompts", "active_prompts"):
+                for op in ("INSERT", "UPDATE", "DELETE"):
+                    cursor.execute(f'''
+                        CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_version
+                        AFTER {op} ON {table}
+                        BEGIN
+                            UPDATE store_changes SET version = version + 1 WHERE id = 1;
+                        END
+                    ''')
             conn.commit()
 
+    @staticmethod
+    def _version_row(prompt_id: PromptId, version: int, user_id: UserId, old_template: str, template: str) -> tuple:
+        return (prompt_id, version, user_id, content_hash(template), make_diff(old_template, template))
+
+    def _add_version(
+            self, cursor, prompt_id: PromptId, version: int, user_id: UserId, old_template: str, template: str,
+        ) -> None:
+        cursor.execute(
+            "INSERT INTO prompt_versions (prompt_id, version, user_id, content_hash, diff) VALUES (?, ?, ?, ?, ?)",
+            self._version_row(prompt_id, version, user_id, old_template, template),
+        )
+
     def _row_to_prompt(self, row) -> Prompt:
         return Prompt(
             id=row["id"],
@@ -294,6 +748,7 @@ class DatabaseStore(PromptStore):
                 INSERT INTO prompts (id, purpose, name, template, version, user_id)
                 VALUES (?, ?, ?, ?, 1, ?)
             ''', (prompt_id, purpose, name, template, user_id))
+            self._add_version(cursor, prompt_id, 1, user_id, "", template)
             conn.commit()
         return Prompt(
             id=prompt_id,
@@ -331,6 +786,7 @@ class DatabaseStore(PromptStore):
             cursor.execute('''
                 UPDATE prompts SET template = ?, version = ? WHERE id = ?
             ''', (template, new_version, prompt_id))
+            self._add_version(cursor, prompt_id, new_version, user_id, row["template"], template)
             conn.commit()
             cursor.execute("SELECT * FROM prompts WHERE id = ?", (prompt_id,))
             return self._row_to_prompt(cursor.fetchone())
@@ -369,4 +825,476 @@ class DatabaseStore(PromptStore):
             cursor.execute("DELETE FROM active_prompts WHERE prompt_id = ?", (prompt_id,))
             cursor.execute("DELETE FROM prompts WHERE id = ?", (prompt_id,))
             conn.commit()
-            return True
\ No newline at end of file
+            return True
+
+    def change_version(self) -> int:
+        with self._get_conn() as conn:
+            return conn.execute("SELECT version FROM store_changes WHERE id = 1").fetchone()[0]
+
+    def import_prompts(self, user_id: UserId, rows: list[tuple[Purpose, str, str, bool]]) -> list[Prompt]:
+        prompts = [
+            Prompt(id=str(uuid4()), purpose=purpose, name=name, template=template, version=1, user_id=user_id)
+            for purpose, name, template, _ in rows
+        ]
+        # Later rows win, as if activated one after another
+        active = {p.purpose: p.id for p, row in zip(prompts, rows) if row[3]}
+        with self._get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT INTO prompts (id, purpose, name, template, version, user_id) VALUES (?, ?, ?, ?, 1, ?)",
+                [(p.id, p.purpose, p.name, p.template, user_id) for p in prompts],
+            )
+            cursor.executemany(
+                "INSERT INTO prompt_versions (prompt_id, version, user_id, content_hash, diff) VALUES (?, ?, ?, ?, ?)",
+                [self._version_row(p.id, 1, user_id, "", p.template) for p in prompts],
+            )
+            cursor.executemany(
+                "INSERT OR REPLACE INTO active_prompts (user_id, purpose, prompt_id) VALUES (?, ?, ?)",
+                [(user_id, purpose, prompt_id) for purpose, prompt_id in active.items()],
+            )
+            conn.commit()
+        return prompts
+
+    def list_versions(self, prompt_id: PromptId, user_id: UserId) -> list[PromptVersion]:
+        with self._get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM prompt_versions WHERE prompt_id = ? AND user_id = ? ORDER BY version",
+                (prompt_id, user_id),
+            )
+            return [
+                PromptVersion(
+                    prompt_id=row["prompt_id"],
+                    version=row["version"],
+                    user_id=row["user_id"],
+                    content_hash=row["content_hash"],
+                    diff=row["diff"],
+                    created_at=row["created_at"],
+                )
+                for row in cursor.fetchall()
+            ]
+
+    def export_prompts(self, user_id: UserId) -> Iterator[tuple[Prompt, bool]]:
+        # A private connection: the generator may be resumed on any threadpool
+        # thread, and pooled connections belong to one thread each
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # Same lock wait as pooled connections, so an export does not fail fast behind a writer
+        conn.execute(f"PRAGMA busy_timeout={int(self._pool.busy_timeout_ms)}")
+        try:
+            cursor = conn.execute('''
+                SELECT p.*, ap.prompt_id IS NOT NULL AS active FROM prompts p
+                LEFT JOIN active_prompts ap
+                    ON ap.user_id = p.user_id AND ap.purpose = p.purpose AND ap.prompt_id = p.id
+                WHERE p.user_id = ?
+                ORDER BY p.id
+            ''', (user_id,))
+            while rows := cursor.fetchmany(1000):
+                for row in rows:
+                    yield self._row_to_prompt(row), bool(row["active"])
+        finally:
+            conn.close()
+
+    def get_active_map(self, user_id: UserId) -> dict[Purpose, PromptId]:
+        with self._get_conn() as conn:
+            cursor = conn.cursor()
+            # Served from the (user_id, purpose) primary key
+            cursor.execute("SELECT purpose, prompt_id FROM active_prompts WHERE user_id = ?", (user_id,))
+            return {row["purpose"]: row["prompt_id"] for row in cursor.fetchall()}
+
+    def list_page(
+            self,
+            limit: int,
+            after_id: PromptId | None = None,
+            purpose: Purpose | None = None,
+            user_id: UserId | None = None,
+            name_prefix: str | None = None,
+        ) -> list[Prompt]:
+        query = "SELECT * FROM prompts WHERE 1=1"
+        params: list = []
+        if after_id is not None:
+            query += " AND id > ?"
+            params.append(after_id)
+        if purpose is not None:
+            query += " AND purpose = ?"
+            params.append(purpose)
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        if name_prefix:
+            # Case-sensitive, unlike LIKE, to match InMemoryStore
+            query += " AND substr(name, 1, ?) = ?"
+            params.extend([len(name_prefix), name_prefix])
+        query += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        with self._get_conn() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return [self._row_to_prompt(row) for row in cursor.fetchall()]
+
+class AsyncDatabaseStore(DatabaseStore):
+    """DatabaseStore with dedicated DB threads for the async interface.
+
+    Every write (sync or async) runs on a single writer thread, so concurrent
+    creates and activations queue in-process instead of contending for the
+    SQLite write lock and failing with "database is locked". Async reads run
+    on a pool of reader threads, each with its own pooled WAL connection, so
+    they proceed in parallel with each other and with the writer. Sync reads
+    keep running on the caller's thread.
+    """
+
+    def __init__(self, db_path: str = "var/database.db", readers: int = 4) -> None:
+        super().__init__(db_path)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prompt-db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="prompt-db-reader")
+        self._writer_thread: int | None = None
+        self.readers = readers
+        self.writes = 0
+        self.reads = 0
+
+    def _in_writer(self, fn, *args):
+        self._writer_thread = threading.get_ident()
+        self.writes += 1
+        return fn(self, *args)
+
+    def _write(self, fn, *args):
+        """Run a DatabaseStore write method on the writer thread and wait for it"""
+        if threading.get_ident() == self._writer_thread:
+            return fn(self, *args)
+        return self._writer.submit(self._in_writer, fn, *args).result()
+
+    async def _write_async(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._in_writer, fn, *args)
+
+    async def _read_async(self, fn, *args):
+        self.reads += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, fn, self, *args)
+
+    def close(self) -> None:
+        # Pending writes finish before shutdown returns
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        return {"readers": self.readers, "writes": self.writes, "async_reads": self.reads}
+
+    # ---- Sync writes (serialized) ----
+
+    def create(self, purpose: Purpose, name: str, template: str, user_id: UserId) -> Prompt:
+        return self._write(DatabaseStore.create, purpose, name, template, user_id)
+
+    def patch(self, prompt_id: PromptId, template: str, user_id: UserId) -> Prompt | None:
+        return self._write(DatabaseStore.patch, prompt_id, template, user_id)
+
+    def set_active(self, user_id: UserId, purpose: Purpose, prompt_id: PromptId) -> Prompt | None:
+        return self._write(DatabaseStore.set_active, user_id, purpose, prompt_id)
+
+    def delete(self, prompt_id: PromptId, user_id: UserId) -> bool:
+        return self._write(DatabaseStore.delete, prompt_id, user_id)
+
+    def import_prompts(self, user_id: UserId, rows: list[tuple[Purpose, str, str, bool]]) -> list[Prompt]:
+        return self._write(DatabaseStore.import_prompts, user_id, rows)
+
+    # ---- Async ----
+
+    async def create_async(self, purpose: Purpose, name: str, template: str, user_id: UserId) -> Prompt:
+        return await self._write_async(DatabaseStore.create, purpose, name, template, user_id)
+
+    async def patch_async(self, prompt_id: PromptId, template: str, user_id: UserId) -> Prompt | None:
+        return await self._write_async(DatabaseStore.patch, prompt_id, template, user_id)
+
+    async def set_active_async(self, user_id: UserId, purpose: Purpose, prompt_id: PromptId) -> Prompt | None:
+        return await self._write_async(DatabaseStore.set_active, user_id, purpose, prompt_id)
+
+    async def delete_async(self, prompt_id: PromptId, user_id: UserId) -> bool:
+        return await self._write_async(DatabaseStore.delete, prompt_id, user_id)
+
+    async def import_prompts_async(self, user_id: UserId, rows: list[tuple[Purpose, str, str, bool]]) -> list[Prompt]:
+        return await self._write_async(DatabaseStore.import_prompts, user_id, rows)
+
+    async def list_async(self, purpose: Purpose | None = None) -> list[Prompt]:
+        return await self._read_async(DatabaseStore.list, purpose)
+
+    async def get_async(self, prompt_id: PromptId) -> Prompt | None:
+        return await self._read_async(DatabaseStore.get, prompt_id)
+
+    async def get_active_async(self, user_id: UserId, purpose: Purpose) -> Prompt | None:
+        return await self._read_async(DatabaseStore.get_active, user_id, purpose)
+
+    async def get_active_map_async(self, user_id: UserId) -> dict[Purpose, PromptId]:
+        return await self._read_async(DatabaseStore.get_active_map, user_id)
+
+    async def change_version_async(self) -> int:
+        return await self._read_async(DatabaseStore.change_version)
+
+
+class CachedPromptStore(PromptStore):
+    """Read-through cache in front of any PromptStore.
+
+    Caches prompts by id and active prompts by (user_id, purpose); writes go
+    straight to the backend and invalidate the affected entries. Writes from
+    other processes are picked up by polling the backend's `change_version()`
+    at most every `poll_interval` seconds (0 = before every read) and clearing
+    the cache when it moved. `ttl` (seconds, 0 = never expire) is the fallback
+    for backends without a change counter.
+
+    Both maps are LRUs of at most `max_entries` each, and misses are never
+    cached, so unknown ids or users cannot grow the cache.
+    """
+
+    def __init__(
+            self,
+            backend: PromptStore,
+            ttl: float = 0,
+            poll_interval: float = 0.5,
+            max_entries: int = 4096,
+        ) -> None:
+        self.backend = backend
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.max_entries = max_entries
+        self._version = backend.change_version()
+        self._next_poll = time.monotonic() + poll_interval
+        self._by_id: OrderedDict[PromptId, tuple[float, Prompt]] = OrderedDict()
+        self._active: OrderedDict[tuple[UserId, Purpose], tuple[float, Prompt]] = OrderedDict()
+        # prompt id -> active keys resolving to it, so invalidation does not scan _active
+        self._active_keys: dict[PromptId, set[tuple[UserId, Purpose]]] = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a read that raced a write is not cached
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.remote_changes = 0
+
+    def _poll_due(self) -> bool:
+        if self._version is None or time.monotonic() < self._next_poll:
+            return False
+        self._next_poll = time.monotonic() + self.poll_interval
+        return True
+
+    def _changed(self, version: int | None) -> None:
+        """Clear the cache if the backend changed since the last poll"""
+        if version != self._version:
+            self._version = version
+            self.remote_changes += 1
+            self.clear()
+
+    def sync(self) -> None:
+        if self._poll_due():
+            self._changed(self.backend.change_version())
+
+    async def sync_async(self) -> None:
+        if self._poll_due():
+            self._changed(await self.backend.change_version_async())
+
+    def _expiry(self) -> float:
+        return time.monotonic() + self.ttl if self.ttl else float("inf")
+
+    def _lookup(self, cache: OrderedDict, key):
+        with self._lock:
+            entry = cache.get(key)
+            if entry is not None and entry[0] >= time.monotonic():
+                cache.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            self.misses += 1
+            return False, None
+
+    def _unindex_active(self, key: tuple[UserId, Purpose], prompt: Prompt) -> None:
+        """Drop `key` from the reverse index (lock held)"""
+        keys = self._active_keys.get(prompt.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._active_keys[prompt.id]
+
+    def _put_active(self, key: tuple[UserId, Purpose], prompt: Prompt) -> None:
+        """Insert or replace an active entry, evicting the least recently used (lock held)"""
+        old = self._active.pop(key, None)
+        if old is not None:
+            self._unindex_active(key, old[1])
+        self._active[key] = (self._expiry(), prompt)
+        self._active_keys.setdefault(prompt.id, set()).add(key)
+        if len(self._active) > self.max_entries:
+            evicted, (_, evicted_prompt) = self._active.popitem(last=False)
+            self._unindex_active(evicted, evicted_prompt)
+
+    def _store_active(self, key: tuple[UserId, Purpose], prompt: Prompt | None, generation: int) -> None:
+        if prompt is None:
+            return
+        with self._lock:
+            if generation == self._generation:
+                self._put_active(key, prompt)
+
+    def _activated(self, key: tuple[UserId, Purpose], prompt: Prompt) -> None:
+        with self._lock:
+            self._generation += 1
+            self._put_active(key, prompt)
+
+    def _store_prompt(self, prompt_id: PromptId, prompt: Prompt | None, generation: int) -> None:
+        if prompt is None:
+            return
+        with self._lock:
+            if generation == self._generation:
+                self._by_id[prompt_id] = (self._expiry(), prompt)
+                self._by_id.move_to_end(prompt_id)
+                if len(self._by_id) > self.max_entries:
+                    self._by_id.popitem(last=False)
+
+    def invalidate_prompt(self, prompt_id: PromptId) -> None:
+        """Forget a prompt and every active entry that resolves to it"""
+        with self._lock:
+            self._by_id.pop(prompt_id, None)
+            for key in self._active_keys.pop(prompt_id, ()):
+                self._active.pop(key, None)
+            self._generation += 1
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._by_id.clear()
+            self._active.clear()
+            self._active_keys.clear()
+            self._generation += 1
+            self.invalidations += 1
+
+    def close(self) -> None:
+        self.backend.close()
+
+    def change_version(self) -> int | None:
+        return self.backend.change_version()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "prompts_cached": len(self._by_id),
+            "active_cached": len(self._active),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "poll_interval": self.poll_interval,
+            "version": self._version,
+            "remote_changes": self.remote_changes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+    # ---- Reads (cached) ----
+
+    def get(self, prompt_id: PromptId) -> Prompt | None:
+        self.sync()
+        found, prompt = self._lookup(self._by_id, prompt_id)
+        if not found:
+            generation = self._generation
+            prompt = self.backend.get(prompt_id)
+            self._store_prompt(prompt_id, prompt, generation)
+        return prompt
+
+    def get_active(self, user_id: UserId, purpose: Purpose) -> Prompt | None:
+        self.sync()
+        found, prompt = self._lookup(self._active, (user_id, purpose))
+        if not found:
+            generation = self._generation
+            prompt = self.backend.get_active(user_id, purpose)
+            self._store_active((user_id, purpose), prompt, generation)
+        return prompt
+
+    async def get_async(self, prompt_id: PromptId) -> Prompt | None:
+        await self.sync_async()
+        found, prompt = self._lookup(self._by_id, prompt_id)
+        if not found:
+            generation = self._generation
+            prompt = await self.backend.get_async(prompt_id)
+            self._store_prompt(prompt_id, prompt, generation)
+        return prompt
+
+    async def get_active_async(self, user_id: UserId, purpose: Purpose) -> Prompt | None:
+        await self.sync_async()
+        found, prompt = self._lookup(self._active, (user_id, purpose))
+        if not found:
+            generation = self._generation
+            prompt = await self.backend.get_active_async(user_id, purpose)
+            self._store_active((user_id, purpose), prompt, generation)
+        return prompt
+
+    def list(self, purpose: Purpose | None = None) -> list[Prompt]:
+        return self.backend.list(purpose)
+
+    async def list_async(self, purpose: Purpose | None = None) -> list[Prompt]:
+        return await self.backend.list_async(purpose)
+
+    def list_page(self, limit: int, after_id: PromptId | None = None, **filters) -> list[Prompt]:
+        return self.backend.list_page(limit, after_id=after_id, **filters)
+
+    # One backend query already; not worth a per-user cache entry to invalidate
+    def get_active_map(self, user_id: UserId) -> dict[Purpose, PromptId]:
+        return self.backend.get_active_map(user_id)
+
+    async def get_active_map_async(self, user_id: UserId) -> dict[Purpose, PromptId]:
+        return await self.backend.get_active_map_async(user_id)
+
+    def export_prompts(self, user_id: UserId) -> Iterator[tuple[Prompt, bool]]:
+        return self.backend.export_prompts(user_id)
+
+    def list_versions(self, prompt_id: PromptId, user_id: UserId) -> list[PromptVersion]:
+        return self.backend.list_versions(prompt_id, user_id)
+
+    # ---- Writes (invalidate) ----
+
+    def import_prompts(self, user_id: UserId, rows: list[tuple[Purpose, str, str, bool]]) -> list[Prompt]:
+        prompts = self.backend.import_prompts(user_id, rows)
+        if any(row[3] for row in rows):
+            self.clear()
+        return prompts
+
+    async def import_prompts_async(self, user_id: UserId, rows: list[tuple[Purpose, str, str, bool]]) -> list[Prompt]:
+        prompts = await self.backend.import_prompts_async(user_id, rows)
+        if any(row[3] for row in rows):
+            self.clear()
+        return prompts
+
+    def create(self, purpose: Purpose, name: str, template: str, user_id: UserId) -> Prompt:
+        return self.backend.create(purpose, name, template, user_id)
+
+    async def create_async(self, purpose: Purpose, name: str, template: str, user_id: UserId) -> Prompt:
+        return await self.backend.create_async(purpose, name, template, user_id)
+
+    def patch(self, prompt_id: PromptId, template: str, user_id: UserId) -> Prompt | None:
+        prompt = self.backend.patch(prompt_id, template, user_id)
+        if prompt is not None:
+            self.invalidate_prompt(prompt_id)
+        return prompt
+
+    async def patch_async(self, prompt_id: PromptId, template: str, user_id: UserId) -> Prompt | None:
+        prompt = await self.backend.patch_async(prompt_id, template, user_id)
+        if prompt is not None:
+            self.invalidate_prompt(prompt_id)
+        return prompt
+
+    def set_active(self, user_id: UserId, purpose: Purpose, prompt_id: PromptId) -> Prompt | None:
+        prompt = self.backend.set_active(user_id, purpose, prompt_id)
+        if prompt is not None:
+            self._activated((user_id, purpose), prompt)
+        return prompt
+
+    async def set_active_async(self, user_id: UserId, purpose: Purpose, prompt_id: PromptId) -> Prompt | None:
+        prompt = await self.backend.set_active_async(user_id, purpose, prompt_id)
+        if prompt is not None:
+            self._activated((user_id, purpose), prompt)
+        return prompt
+
+    def delete(self, prompt_id: PromptId, user_id: UserId) -> bool:
+        result = self.backend.delete(prompt_id, user_id)
+        if result:
+            self.invalidate_prompt(prompt_id)
+        return result
+
+    async def delete_async(self, prompt_id: PromptId, user_id: UserId) -> bool:
+        result = await self.backend.delete_async(prompt_id, user_id)
+        if result:
+            self.invalidate_prompt(prompt_id)
+        return result
@@ -0,0 +1,54 @@
+"""
+Template history as line diffs.
+
+Each prompt version is stored as a zero-context unified diff against the
+previous version (version 1 diffs against the empty template), plus a
+sha256 of the full template. Diffs keep history small for the usual small
+edits, are readable as-is, and replaying them from "" rebuilds any version.
+"""
+import difflib
+import hashlib
+import re
+
+_HUNK = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@")
+
+
+def content_hash(template: str) -> str:
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()
+
+
+def make_diff(old: str, new: str) -> str:
+    # split("\n") rather than splitlines() so a trailing newline survives the round trip
+    return "\n".join(difflib.unified_diff(old.split("\n"), new.split("\n"), n=0, lineterm=""))
+
+
+def apply_diff(old: str, diff: str) -> str:
+    """Apply a diff produced by `make_diff` to `old`"""
+    if not diff:
+        return old
+    source = old.split("\n")
+    result: list[str] = []
+    pos = 0
+    # The first two lines are the ---/+++ headers
+    for line in diff.split("\n")[2:]:
+        match = _HUNK.match(line)
+        if match:
+            start, count = int(match.group(1)), match.group(2)
+            # A pure insertion (count 0) is anchored after line `start`
+            start = start if count == "0" else start - 1
+            result.extend(source[pos:start])
+            pos = start
+        elif line.startswith("-"):
+            pos += 1
+        elif line.startswith("+"):
+            result.append(line[1:])
+    result.extend(source[pos:])
+    return "\n".join(result)
+
+
+def rebuild(diffs: list[str]) -> str:
+    """Template after applying a version chain, oldest first"""
+    template = ""
+    for diff in diffs:
+        template = apply_diff(template, diff)
+    return template
@@ -0,0 +1,182 @@
+"""
+Per-purpose routing: hedged requests and provider failover.
+
+A policy lists fallback targets after the request's own provider. With
+hedging on, if the primary has not answered within a deadline taken from
+its recent latency percentile, the first fallback is started in parallel;
+whichever answers first wins and the other call is cancelled. Targets that
+fail are replaced by the next one in the chain until it is exhausted.
+
+Configured through settings.ROUTING_POLICIES, e.g.
+    {"summarize": {"fallbacks": [{"provider": "google", "model": "gemini-2.5-flash"}],
+                   "hedge": true, "hedge_percentile": 95}}
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from app.core.config import settings
+from .llm_client import LLMClient
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for one target"""
+
+    def __init__(self, window: int = 200) -> None:
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms: float) -> None:
+        with self._lock:
+            self._samples.append(latency_ms)
+
+    def percentile(self, pct: float) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * pct / 100))
+        return samples[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+@dataclass
+class Target:
+    """One provider/model a request can be sent to"""
+    name: str
+    provider: str
+    client: LLMClient
+
+
+@dataclass
+class RoutingPolicy:
+    fallbacks: list[dict] = field(default_factory=list)
+    hedge: bool = False
+    hedge_percentile: float = 95
+    hedge_min_ms: float | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RoutingPolicy":
+        return cls(
+            fallbacks=list(data.get("fallbacks", [])),
+            hedge=bool(data.get("hedge", False)),
+            hedge_percentile=float(data.get("hedge_percentile", 95)),
+            hedge_min_ms=data.get("hedge_min_ms"),
+        )
+
+
+def get_policy(purpose: str) -> RoutingPolicy | None:
+    data = settings.ROUTING_POLICIES.get(purpose)
+    return RoutingPolicy.from_dict(data) if data else None
+
+
+class Router:
+    """Runs routed generations and keeps the latency history that sets hedge deadlines"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20) -> None:
+        self.window = window
+        self.min_samples = min_samples
+        self._trackers: dict[str, LatencyTracker] = {}
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.routed = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.exhausted = 0
+
+    def tracker(self, name: str) -> LatencyTracker:
+        tracker = self._trackers.get(name)
+        if tracker is None:
+            with self._lock:
+                tracker = self._trackers.setdefault(name, LatencyTracker(self.window))
+        return tracker
+
+    def hedge_delay(self, target: Target, policy: RoutingPolicy) -> float:
+        """Seconds to wait on the primary before hedging"""
+        floor_ms = policy.hedge_min_ms if policy.hedge_min_ms is not None else settings.ROUTING_HEDGE_MIN_MS
+        tracker = self.tracker(target.name)
+        if len(tracker) < self.min_samples:
+            # Not enough history for a percentile yet
+            return max(floor_ms, settings.ROUTING_HEDGE_DEFAULT_MS) / 1000
+        return max(floor_ms, tracker.percentile(policy.hedge_percentile)) / 1000
+
+    async def _call(self, target: Target, prompt: str, params: dict):
+        output_dict, duration = await target.client.generate_async(prompt=prompt, **params)
+        self.tracker(target.name).record(duration * 1000)
+        return output_dict
+
+    async def generate(self, targets: list[Target], policy: RoutingPolicy, prompt: str, **params):
+        """Return (output_dict, duration, winning Target); model_info["route"] says which path won"""
+        self.routed += 1
+        start = time.perf_counter()
+        primary, fallbacks = targets[0], deque(targets[1:])
+        tasks: dict[asyncio.Task, tuple[Target, str]] = {
+            asyncio.create_task(self._call(primary, prompt, params)): (primary, "primary"),
+        }
+        hedged = False
+        last_error: BaseException | None = None
+
+        try:
+            if policy.hedge and fallbacks:
+                done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(primary, policy))
+                if not done:
+                    hedged = True
+                    self.hedges += 1
+                    target = fallbacks.popleft()
+                    logger.info(f"Hedging {primary.name} with {target.name}")
+                    tasks[asyncio.create_task(self._call(target, prompt, params))] = (target, "hedge")
+
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    target, path = tasks.pop(task)
+                    if task.exception() is None:
+                        if path == "hedge":
+                            self.hedge_wins += 1
+                        output_dict = dict(task.result())
+                        output_dict["model_info"] = {
+                            **(output_dict.get("model_info") or {}),
+                            "route": {"target": target.name, "path": path, "hedged": hedged},
+                        }
+                        return output_dict, time.perf_counter() - start, target
+                    last_error = task.exception()
+                    logger.warning(f"Routed call to {target.name} failed: {last_error}")
+                if not tasks and fallbacks:
+                    # Everything in flight failed: fail over to the next target
+                    self.failovers += 1
+                    target = fallbacks.popleft()
+                    tasks[asyncio.create_task(self._call(target, prompt, params))] = (target, "fallback")
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                # Wait for the losers to unwind so their cleanup runs before we return
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.exhausted += 1
+        raise last_error if last_error is not None else RuntimeError("No routing targets")
+
+    def stats(self) -> dict:
+        return {
+            "routed": self.routed,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "exhausted": self.exhausted,
+            "latency_ms": {
+                name: {"samples": len(t), "p50": t.percentile(50), "p95": t.percentile(95), "p99": t.percentile(99)}
+                for name, t in self._trackers.items()
+            },
+        }
+
+
+router = Router(window=settings.ROUTING_LATENCY_WINDOW)
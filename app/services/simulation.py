@@ -0,0 +1,138 @@
+"""
+Latency and failure simulation for MockLLM.
+
+Lets the service be load-tested offline: each mock call samples a latency
+(fixed, normal, lognormal, or replayed from recorded `predictions.latency_ms`)
+and may fail with a 500 or a 429 carrying `retry_after`. The errors look like
+SDK errors to the provider guard, so retries, backoff, the AIMD limiter and
+the circuit breaker behave as they would against a real provider.
+
+Configured through the MOCK_* settings.
+"""
+import logging
+import math
+import random
+import threading
+from dataclasses import dataclass, field
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_DISTRIBUTIONS = ("fixed", "normal", "lognormal", "replay")
+
+
+class SimulatedProviderError(Exception):
+    """Injected failure; `status_code`/`retry_after` are read by the provider guard"""
+
+    def __init__(self, status_code: int, message: str, retry_after: float | None = None) -> None:
+        super().__init__(f"[MOCK {status_code}] {message}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LatencyModel:
+    """Samples one simulated call latency in milliseconds"""
+
+    def __init__(
+        self,
+        dist: str = "fixed",
+        mean_ms: float = 0.0,
+        stddev_ms: float = 0.0,
+        samples: list[float] | None = None,
+        replay_provider: str = "",
+        replay_limit: int = 10000,
+        rng: random.Random | None = None,
+    ) -> None:
+        if dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {dist}")
+        self.dist = dist
+        self.mean_ms = mean_ms
+        self.stddev_ms = stddev_ms
+        self.replay_provider = replay_provider
+        self.replay_limit = replay_limit
+        self.rng = rng or random.Random()
+        self._samples = samples
+        self._lock = threading.Lock()
+
+        if dist == "lognormal" and mean_ms > 0:
+            # Parameterised so the samples have the requested mean and stddev
+            sigma2 = math.log(1 + stddev_ms ** 2 / mean_ms ** 2)
+            self._mu = math.log(mean_ms) - sigma2 / 2
+            self._sigma = math.sqrt(sigma2)
+
+    def _replay_samples(self) -> list[float]:
+        # Loaded on first use so building a client never touches the database
+        if self._samples is None:
+            with self._lock:
+                if self._samples is None:
+                    from . import db_service
+                    self._samples = db_service.get_latency_samples(self.replay_provider, self.replay_limit)
+                    if not self._samples:
+                        logger.warning(f"No recorded latencies to replay, using a fixed {self.mean_ms} ms")
+        return self._samples
+
+    def sample_ms(self) -> float:
+        if self.dist == "replay":
+            samples = self._replay_samples()
+            return self.rng.choice(samples) if samples else self.mean_ms
+        if self.mean_ms <= 0:
+            return 0.0
+        if self.dist == "normal":
+            return max(0.0, self.rng.gauss(self.mean_ms, self.stddev_ms))
+        if self.dist == "lognormal":
+            return self.rng.lognormvariate(self._mu, self._sigma)
+        return self.mean_ms
+
+
+@dataclass
+class MockSimulation:
+    """Everything a MockLLM needs to behave like a slow, flaky provider"""
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    error_rate: float = 0.0  # fraction of attempts failing with a 500
+    rate_limit_rate: float = 0.0  # fraction of attempts rejected with a 429
+    retry_after: float = 1.0  # seconds, sent with simulated 429s
+    retries: int = 0  # guard retries per call
+    backoff: float = 0.8
+    output_tokens: int = 0  # 0 = echo the prompt
+    stream_chunk_chars: int = 16
+    stream_chunk_delay_ms: float = 0.0
+    rng: random.Random = field(default_factory=random.Random)
+
+    @classmethod
+    def from_settings(cls) -> "MockSimulation":
+        rng = random.Random(settings.MOCK_SEED)
+        return cls(
+            latency=LatencyModel(
+                dist=settings.MOCK_LATENCY_DIST,
+                mean_ms=settings.MOCK_LATENCY_MS,
+                stddev_ms=settings.MOCK_LATENCY_STDDEV_MS,
+                replay_provider=settings.MOCK_REPLAY_PROVIDER,
+                replay_limit=settings.MOCK_REPLAY_LIMIT,
+                rng=rng,
+            ),
+            error_rate=settings.MOCK_ERROR_RATE,
+            rate_limit_rate=settings.MOCK_RATE_LIMIT_RATE,
+            retry_after=settings.MOCK_RETRY_AFTER,
+            retries=settings.MOCK_RETRIES,
+            backoff=settings.MOCK_BACKOFF,
+            output_tokens=settings.MOCK_OUTPUT_TOKENS,
+            stream_chunk_chars=settings.MOCK_STREAM_CHUNK_CHARS,
+            stream_chunk_delay_ms=settings.MOCK_STREAM_CHUNK_DELAY_MS,
+            rng=rng,
+        )
+
+    def check_rate_limit(self) -> None:
+        """Reject the attempt up front, like a provider answering 429 immediately"""
+        if self.rate_limit_rate and self.rng.random() < self.rate_limit_rate:
+            raise SimulatedProviderError(429, "Rate limit exceeded", retry_after=self.retry_after)
+
+    def check_error(self) -> None:
+        """Fail the attempt after its latency, like a provider-side 500"""
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise SimulatedProviderError(500, "Internal error")
+
+    def completion(self, prompt: str) -> str:
+        if self.output_tokens:
+            return "[MOCK OUTPUT]\n" + " ".join("token" for _ in range(self.output_tokens))
+        return f"[MOCK OUTPUT]\n{prompt[:200]} ..."
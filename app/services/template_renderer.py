@@ -5,12 +5,79 @@ Supports both:
 - Legacy syntax: {document}
 - Jinja2 syntax: {{ document }}
 """
-from jinja2 import Template, TemplateSyntaxError
+from collections import OrderedDict
+from hashlib import sha256
 import logging
+import threading
+
+from jinja2 import Environment, Template, TemplateSyntaxError
+
+from app.core.config import settings
+from app.instrumentation.metrics import TEMPLATE_RENDER_SECONDS
 
 logger = logging.getLogger(__name__)
 
 
+class TemplateCache:
+    """Bounded LRU cache of compiled Jinja2 templates keyed by content hash"""
+
+    def __init__(self, env: Environment, max_size: int = 256) -> None:
+        self.env = env
+        self.max_size = max_size
+        self._templates: OrderedDict[str, Template] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, template_string: str) -> Template:
+        key = sha256(template_string.encode("utf-8")).hexdigest()
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                self.hits += 1
+                return template
+            self.misses += 1
+        # Compile outside the lock; a concurrent duplicate compile is harmless
+        template = self.env.from_string(template_string)
+        with self._lock:
+            self._templates[key] = template
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.max_size:
+                self._templates.popitem(last=False)
+        return template
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._templates),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# Shared environment; same defaults as a bare jinja2.Template
+_env = Environment()
+template_cache = TemplateCache(_env, max_size=settings.TEMPLATE_CACHE_SIZE)
+
+
+def uses_jinja2(template_string: str) -> bool:
+    return "{{" in template_string or "{%" in template_string
+
+
+def warm_template(template_string: str) -> None:
+    """Compile a template ahead of time so the next render is a cache hit"""
+    if not uses_jinja2(template_string):
+        return
+    try:
+        template_cache.get(template_string)
+    except TemplateSyntaxError as e:
+        logger.warning(f"Could not precompile Jinja2 template: {e}")
+
+
+@TEMPLATE_RENDER_SECONDS.time()
 def render_template(template_string: str, document_text: str, **extra_vars) -> str:
     """
     Render a template with document text.
@@ -41,13 +108,11 @@ def render_template(template_string: str, document_text: str, **extra_vars) -> s
         "HELLO"
     """
     # Detect if template uses Jinja2 syntax
-    uses_jinja2 = "{{" in template_string or "{%" in template_string
-
-    if uses_jinja2:
-        # Use Jinja2 rendering
+    if uses_jinja2(template_string):
+        # Use Jinja2 rendering with the compiled-template cache
         try:
             logger.debug("Rendering template with Jinja2")
-            template = Template(template_string)
+            template = template_cache.get(template_string)
             return template.render(document=document_text, **extra_vars)
         except TemplateSyntaxError as e:
             logger.error(f"Jinja2 template syntax error: {e}")
@@ -0,0 +1,314 @@
+"""
+Benchmark the API hot paths in-process against app.main:app.
+
+Requests go through httpx's ASGI transport (no network, no uvicorn), with
+MockLLM answering predictions after a simulated latency (the MOCK_* settings,
+driven by --latency-*, --error-rate and --rate-limit-rate). Each scenario
+reports throughput and p50/p95/p99, and the run is written as JSON under
+benchmarks/results/ so two commits can be compared with --compare.
+
+    PYTHONPATH=. python benchmarks/bench_api.py --quick
+    PYTHONPATH=. python benchmarks/bench_api.py --stores database --compare benchmarks/results/<old>.json
+
+Everything runs against a throwaway directory; var/ is never touched.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+WORKDIR = tempfile.mkdtemp(prefix="bench-")
+# Must be set before the app (and its settings) are imported
+os.environ["DATABASE_PATH"] = os.path.join(WORKDIR, "database.db")
+
+from app.services import db_service  # noqa: E402
+
+db_service.DB_PATH = os.environ["DATABASE_PATH"]
+
+import httpx  # noqa: E402
+
+import app.main as app_main  # noqa: E402
+from app.api import routes_predict, routes_prompts  # noqa: E402
+from app.core import dependencies  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.services.llm_client import registry  # noqa: E402
+from app.services.prediction_recorder import recorder  # noqa: E402
+from app.services.prompt_store import DatabaseStore, FileSnapshotStore, InMemoryStore, PromptStore  # noqa: E402
+
+STORE_KINDS = ("memory", "file", "database")
+BENCH_USER = "bench_user"
+
+
+# ============= MOCK LATENCY =============
+
+def configure_mock(args) -> None:
+    """Point the mock provider's simulation settings at the requested profile"""
+    settings.MOCK_LATENCY_DIST = args.latency_dist
+    settings.MOCK_LATENCY_MS = args.latency_ms
+    settings.MOCK_LATENCY_STDDEV_MS = args.latency_stddev_ms
+    settings.MOCK_ERROR_RATE = args.error_rate
+    settings.MOCK_RATE_LIMIT_RATE = args.rate_limit_rate
+    # Clients read the settings when built
+    registry.close()
+
+
+# ============= STORES =============
+
+def use_store(store: PromptStore) -> None:
+    """Point every module that imported the shared store at `store`"""
+    for module in (dependencies, routes_prompts, routes_predict, app_main):
+        module.store = store
+
+
+def build_store(kind: str, prompt_count: int) -> PromptStore:
+    directory = tempfile.mkdtemp(dir=WORKDIR)
+    purposes = ("summarize", "classify", "extract_entities")
+    if kind == "database":
+        store = DatabaseStore(os.path.join(directory, "prompts.db"))
+        # Bulk insert: one create() per row would dominate setup time
+        with store._get_conn() as conn:
+            conn.executemany(
+                "INSERT INTO prompts (id, purpose, name, template, version, user_id) VALUES (?, ?, ?, ?, 1, ?)",
+                [
+                    (str(uuid4()), purposes[i % 3], f"prompt-{i}", "Summarize: {document}", f"user_{i % 100}")
+                    for i in range(prompt_count)
+                ],
+            )
+            conn.commit()
+        return store
+
+    store = FileSnapshotStore(os.path.join(directory, "data.json")) if kind == "file" else InMemoryStore()
+    for i in range(prompt_count):
+        # Seed through InMemoryStore so the file store snapshots once, not per prompt
+        InMemoryStore.create(store, purposes[i % 3], f"prompt-{i}", "Summarize: {document}", f"user_{i % 100}")
+    if kind == "file":
+        store._snapshot()
+    return store
+
+
+def seed_history(rows: int) -> int:
+    """Fill the predictions table up to `rows` rows; returns rows inserted"""
+    db_service.init_db()
+    with db_service.get_db_connection() as conn:
+        existing = conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+    start = datetime(2026, 1, 1)
+    chunk = 10_000
+    for offset in range(existing, rows, chunk):
+        db_service.log_predictions([
+            (
+                f"prompt {i}", f"response {i}", start + timedelta(seconds=i), f"user_{i % 100}",
+                ("summarize", "classify")[i % 2], "mock", "", 1.0, None, None, None,
+            )
+            for i in range(offset, min(rows, offset + chunk))
+        ])
+    return max(0, rows - existing)
+
+
+# ============= RUNNER =============
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_scenario(client: httpx.AsyncClient, name: str, make_request, requests: int, concurrency: int, **meta) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await make_request(client, i)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    result = {
+        "scenario": name,
+        **meta,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 2),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+    print(
+        f"{name:<18} {str(meta.get('store', '-')):<9} {str(meta.get('size', '-')):>8}  "
+        f"{result['throughput_rps']:>9.1f} rps  p50 {result['p50_ms']:>8.2f}  "
+        f"p95 {result['p95_ms']:>8.2f}  p99 {result['p99_ms']:>8.2f} ms  errors {errors}"
+    )
+    return result
+
+
+async def bench_store(client: httpx.AsyncClient, kind: str, args) -> list[dict]:
+    results = []
+    for size in args.prompt_counts:
+        store = build_store(kind, size)
+        use_store(store)
+        prompt = store.create("summarize", "bench", "Summarize: {document}", BENCH_USER)
+        store.set_active(BENCH_USER, "summarize", prompt.id)
+        headers = {"X-User-Id": BENCH_USER}
+        # Large listings are slow by design; cap how many full pages we pull
+        list_requests = max(5, min(args.requests, args.requests * 1000 // max(size, 1)))
+
+        if size == args.prompt_counts[0]:
+            async def predict(client, i):
+                return await client.post(
+                    "/v1/predict/",
+                    json={"purpose": "summarize", "document_text": f"benchmark document {i}", "use_cache": False},
+                    headers=headers,
+                )
+            results.append(await run_scenario(
+                client, "predict", predict, args.requests, args.concurrency, store=kind, size=size,
+            ))
+
+        async def list_page(client, i):
+            return await client.get("/v1/prompts/", params={"limit": 100, "fields": "id,name,purpose"}, headers=headers)
+        results.append(await run_scenario(
+            client, "prompts_page", list_page, args.requests, args.concurrency, store=kind, size=size,
+        ))
+
+        if size <= args.full_list_max:
+            async def list_full(client, i):
+                return await client.get("/v1/prompts/", headers=headers)
+            results.append(await run_scenario(
+                client, "prompts_full", list_full, list_requests, args.concurrency, store=kind, size=size,
+            ))
+        store.close()
+    return results
+
+
+async def bench_history(client: httpx.AsyncClient, args) -> list[dict]:
+    results = []
+    for size in args.history_rows:
+        started = time.perf_counter()
+        inserted = seed_history(size)
+        print(f"seeded {inserted} prediction rows in {time.perf_counter() - started:.1f}s")
+
+        async def latest(client, i):
+            return await client.get("/v1/predictions", params={"limit": 50})
+
+        async def by_user(client, i):
+            return await client.get("/v1/predictions", params={"limit": 50, "user_id": f"user_{i % 100}", "purpose": "summarize"})
+
+        async def deep_page(client, i):
+            # Keyset cursor deep into the table: should cost the same as page one
+            return await client.get("/v1/predictions", params={"limit": 50, "before_id": max(1, size // 2 - i)})
+
+        for name, make_request in (("history_latest", latest), ("history_by_user", by_user), ("history_deep_page", deep_page)):
+            results.append(await run_scenario(client, name, make_request, args.requests, args.concurrency, size=size))
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: list[dict], baseline_path: str) -> None:
+    """Print p95/throughput change per scenario against an earlier results file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    def key(r):
+        return (r["scenario"], r.get("store"), r.get("size"))
+
+    old = {key(r): r for r in baseline["results"]}
+    print(f"\nvs {baseline_path} (commit {baseline.get('commit')}):")
+    for r in current:
+        before = old.get(key(r))
+        if before is None:
+            continue
+        p95 = (r["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        rps = (r["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"] * 100 if before["throughput_rps"] else 0.0
+        print(f"{r['scenario']:<18} {str(r.get('store', '-')):<9} {str(r.get('size', '-')):>8}  p95 {p95:+7.1f}%  rps {rps:+7.1f}%")
+
+
+async def main(args) -> dict:
+    configure_mock(args)
+    # Unhandled errors (e.g. simulated provider failures) count as 500s instead of aborting the run
+    transport = httpx.ASGITransport(app=app_main.app, raise_app_exceptions=False)
+    results: list[dict] = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for kind in args.stores:
+            results.extend(await bench_store(client, kind, args))
+        if args.history_rows:
+            results.extend(await bench_history(client, args))
+    recorder.stop()
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": results,
+    }
+
+
+def parse_args(argv=None):
+    def ints(value: str) -> list[int]:
+        return [int(v) for v in value.split(",") if v]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stores", type=lambda v: v.split(","), default=list(STORE_KINDS), help="comma-separated: memory,file,database")
+    parser.add_argument("--prompt-counts", type=ints, default=[10, 1_000, 100_000])
+    parser.add_argument("--history-rows", type=ints, default=[10_000, 1_000_000], help="predictions table sizes (0 to skip)")
+    parser.add_argument("--full-list-max", type=int, default=100_000, help="largest store to benchmark the unpaged listing on")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-dist", choices=("fixed", "normal", "lognormal", "replay"), default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mean mock LLM latency")
+    parser.add_argument("--latency-stddev-ms", type=float, default=25.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock calls failing with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of mock calls answered with a 429")
+    parser.add_argument("--log-level", default="WARNING", help="app log level during the run")
+    parser.add_argument("--quick", action="store_true", help="small sizes for a smoke run")
+    parser.add_argument("--out", default=None, help="results file (default benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", default=None, help="earlier results file to diff against")
+    args = parser.parse_args(argv)
+    if args.quick:
+        # Only shrink what was not set explicitly
+        for name, value in (("prompt_counts", [10, 1_000]), ("history_rows", [10_000]), ("requests", 50)):
+            if getattr(args, name) == parser.get_default(name):
+                setattr(args, name, value)
+    args.history_rows = [n for n in args.history_rows if n > 0]
+    unknown = set(args.stores) - set(STORE_KINDS)
+    if unknown:
+        parser.error(f"unknown stores: {', '.join(sorted(unknown))}")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.getLogger().setLevel(args.log_level)
+    report = asyncio.run(main(args))
+
+    out = args.out or os.path.join(
+        os.path.dirname(__file__), "results",
+        f"{datetime.now():%Y%m%d-%H%M%S}-{report['commit'] or 'nogit'}.json",
+    )
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nwrote {out}")
+    if args.compare:
+        compare(report["results"], args.compare)
@@ -1,7 +1,40 @@
+from uuid import uuid4
+
 import pytest
 from fastapi.testclient import TestClient
-from app.main import app
+
+from app.core.config import settings
+from app.services import db_service
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database(tmp_path_factory):
+    """Point every database user at a throwaway file instead of var/database.db.
+
+    The app is imported only after this runs: the store singletons read the path at import.
+    Not restored afterwards, because the background writers still flush at interpreter exit.
+    """
+    path = str(tmp_path_factory.mktemp("db") / "database.db")
+    settings.DATABASE_PATH = path
+    db_service.DB_PATH = path
+    db_service.init_db()
+    return path
+
 
 @pytest.fixture(scope="session")
-def client():
+def client(database):
+    from app.main import app
     return TestClient(app)
+
+
+@pytest.fixture
+def active_prompt(client):
+    """A fresh user with an active summarize prompt; returns (headers, created prompt)."""
+    headers = {"X-User-Id": f"user_{uuid4().hex}"}
+    created = client.post(
+        "/v1/prompts/",
+        json={"purpose": "summarize", "name": "base", "template": "Summarize: {{ document }}"},
+        headers=headers,
+    ).json()
+    client.post(f"/v1/prompts/{created['id']}/activate", params={"purpose": "summarize"}, headers=headers)
+    return headers, created
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+from app.services.batch_writer import BatchWriter
+from app.services.prediction_recorder import PredictionRecorder
+
+
+def test_batch_writer_flushes_in_batches():
+    batches = []
+    writer = BatchWriter("test-writer", batches.append, batch_size=3)
+    for i in range(7):
+        assert writer.submit(i)
+    writer.stop()
+    assert sorted(x for b in batches for x in b) == list(range(7))
+    assert all(len(b) <= 3 for b in batches)
+    assert writer.stats()["written"] == 7
+
+
+def test_batch_writer_drops_when_full():
+    writer = BatchWriter("test-writer", lambda batch: None, max_queue=2, drop_policy="drop_new")
+    writer.start = lambda: None  # keep the buffer from draining
+    results = [writer.submit(i) for i in range(4)]
+    assert results == [True, True, False, False]
+    assert writer.stats()["dropped"] == 2
+
+
+def test_batch_writer_drop_old_keeps_newest():
+    batches = []
+    writer = BatchWriter("test-writer", batches.append, max_queue=2, drop_policy="drop_old")
+    writer.start = lambda: None
+    assert all(writer.submit(i) for i in range(4))
+    # Evicted items count as done, so only the two buffered ones are outstanding
+    assert writer._queue.unfinished_tasks == 2
+    writer.flush()
+    assert batches == [[2, 3]]
+    assert writer.stats()["dropped"] == 2
+
+
+def test_flush_waits_for_batch_held_by_writer_thread():
+    written = []
+
+    def slow_write(batch):
+        time.sleep(0.05)
+        written.extend(batch)
+
+    writer = BatchWriter("test-writer", slow_write, batch_size=100, flush_interval=0.05, drop_policy="drop_old")
+    for i in range(10):
+        writer.submit(i)
+    time.sleep(0.01)  # let the writer thread take the batch
+    writer.flush()
+    assert sorted(written) == list(range(10))
+    writer.stop()
+
+
+def test_flush_is_bounded_when_an_item_never_completes():
+    writer = BatchWriter("test-writer", lambda batch: None)
+    writer.start = lambda: None
+    writer.submit(1)
+    writer._queue.get_nowait()  # taken but never marked done
+    started = time.monotonic()
+    assert writer.flush(timeout=0.1) is False
+    assert time.monotonic() - started < 1.0
+
+
+def test_flush_does_not_wait_for_items_submitted_after_the_call():
+    writer = BatchWriter("test-writer", lambda batch: None)
+    writer.start = lambda: None
+
+    def write_while_traffic_continues(batch):
+        if batch == [0]:
+            writer.submit(1)
+            writer._queue.get_nowait()  # a later item held elsewhere, not yet written
+
+    writer.write_batch = write_while_traffic_continues
+    writer.submit(0)
+    started = time.monotonic()
+    assert writer.flush(timeout=2.0) is True
+    assert time.monotonic() - started < 1.0
+
+
+def test_recorder_waits_for_room_without_blocking_the_event_loop():
+    recorder = PredictionRecorder()
+    recorder.writer = BatchWriter("test-writer", lambda batch: None, max_queue=1, drop_policy="block", block_timeout=1.0)
+    recorder.writer.start = lambda: None
+
+    async def record_twice():
+        ticks = 0
+
+        async def make_room():
+            nonlocal ticks
+            for _ in range(5):
+                await asyncio.sleep(0.01)
+                ticks += 1
+            recorder.writer._queue.get_nowait()
+            recorder.writer._queue.task_done()
+
+        drain = asyncio.create_task(make_room())
+        row = {"prompt": "p", "response": "r", "user_id": "u", "purpose": "summarize", "provider": "mock"}
+        results = [await recorder.record_async(**row) for _ in range(2)]
+        await drain
+        return results, ticks
+
+    results, ticks = asyncio.run(record_twice())
+    assert results == [True, True]
+    assert ticks == 5  # the loop kept running while the second record waited
+    assert recorder.stats()["dropped"] == 0
\ No newline at end of file
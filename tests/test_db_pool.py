@@ -0,0 +1,21 @@
+import threading
+
+from app.services.db_pool import ConnectionPool
+
+
+def test_pool_reuses_connection_per_thread(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    assert pool.acquire() is pool.acquire()
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(pool.acquire()))
+    t.start()
+    t.join()
+    assert other[0] is not pool.acquire()
+
+    stats = pool.stats()
+    assert stats["checkouts"] == 4
+    assert stats["connections_opened"] == 2
+    assert pool.acquire().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    pool.close_all()
+    assert pool.stats()["open_connections"] == 0
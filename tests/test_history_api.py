@@ -0,0 +1,94 @@
+from uuid import uuid4
+
+from app.services.db_service import blob_hash, get_db_connection, log_predictions
+
+
+def test_predictions_keyset_pagination(client):
+    user_id = f"user_{uuid4().hex}"
+    rows = [
+        (f"prompt {i}", f"response {i}", f"2026-01-01 00:00:{i:02d}", user_id, "summarize", "mock", "", 1.0, None, None, None)
+        for i in range(5)
+    ]
+    log_predictions(rows)
+
+    first = client.get("/v1/predictions", params={"user_id": user_id, "limit": 2}).json()
+    assert [p["prompt"] for p in first["predictions"]] == ["prompt 4", "prompt 3"]
+
+    second = client.get(
+        "/v1/predictions", params={"user_id": user_id, "limit": 2, "before_id": first["next_cursor"]}
+    ).json()
+    assert [p["prompt"] for p in second["predictions"]] == ["prompt 2", "prompt 1"]
+
+    newer = client.get(
+        "/v1/predictions", params={"user_id": user_id, "after_ts": "2026-01-01T00:00:02"}
+    ).json()
+    assert [p["prompt"] for p in newer["predictions"]] == ["prompt 4", "prompt 3"]
+
+
+def test_predictions_cursor_survives_a_deleted_row(client):
+    user_id = f"user_{uuid4().hex}"
+    rows = [
+        (f"prompt {i}", f"response {i}", f"2026-01-03 00:00:{i:02d}", user_id, "summarize", "mock", "", 1.0, None, None, None)
+        for i in range(4)
+    ]
+    log_predictions(rows)
+
+    first = client.get("/v1/predictions", params={"user_id": user_id, "limit": 2}).json()
+    with get_db_connection() as conn:
+        conn.execute("DELETE FROM predictions WHERE id = ?", (first["next_cursor"],))
+        conn.commit()
+
+    second = client.get(
+        "/v1/predictions", params={"user_id": user_id, "limit": 2, "before_id": first["next_cursor"]}
+    ).json()
+    assert [p["prompt"] for p in second["predictions"]] == ["prompt 1", "prompt 0"]
+
+def test_prediction_texts_are_deduplicated_blobs(client):
+    user_id = f"user_{uuid4().hex}"
+    document = f"{uuid4().hex} " * 50  # long enough to be compressed
+    rows = [
+        (document, f"response {i}", f"2026-01-02 00:00:{i:02d}", user_id, "summarize", "mock", "", 1.0, None, None, 1)
+        for i in range(3)
+    ]
+    log_predictions(rows)
+
+    with get_db_connection() as conn:
+        stored = conn.execute("SELECT encoding, size FROM blobs WHERE hash = ?", (blob_hash(document),)).fetchall()
+        inline = conn.execute("SELECT prompt FROM predictions WHERE user_id = ?", (user_id,)).fetchall()
+    assert [tuple(r) for r in stored] == [("zlib", len(document))]
+    assert all(r["prompt"] == "" for r in inline)
+
+    history = client.get("/v1/predictions", params={"user_id": user_id}).json()["predictions"]
+    assert history[0]["prompt"] == document[:100] + "..."
+    detail = client.get(f"/v1/predictions/{history[0]['id']}").json()
+    assert (detail["prompt"], detail["response"]) == (document, "response 2")
+    assert client.get("/v1/predictions/0").status_code == 404
+
+
+def test_prediction_prompt_is_stored_as_document_plus_prompt_version(client):
+    headers = {"X-User-Id": f"user_{uuid4().hex}"}
+    template = "Summarize the following document carefully and in detail:\n{{ document }}"
+    created = client.post(
+        "/v1/prompts/", json={"purpose": "summarize", "name": "ref", "template": template}, headers=headers
+    ).json()
+    document = f"document {uuid4().hex}"
+    prompt = template.replace("{{ document }}", document)
+    response = f"response {uuid4().hex}"
+    log_predictions([
+        (prompt, response, "2026-01-04 00:00:00", headers["X-User-Id"], "summarize", "mock", created["id"],
+         1.0, None, None, 1, document),
+    ])
+
+    with get_db_connection() as conn:
+        row = conn.execute(
+            "SELECT id, document_hash FROM predictions WHERE user_id = ?", (headers["X-User-Id"],)
+        ).fetchone()
+        assert conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (blob_hash(prompt),)).fetchone() is None
+    assert row["document_hash"] == blob_hash(document)
+    assert client.get(f"/v1/predictions/{row['id']}").json()["prompt"] == prompt
+
+    # A lost blob reads as empty text, not a 500
+    with get_db_connection() as conn:
+        conn.execute("DELETE FROM blobs WHERE hash = ?", (blob_hash(response),))
+        conn.commit()
+    assert client.get(f"/v1/predictions/{row['id']}").json()["response"] == ""
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from app.services.limits import AdaptiveLimiter, CircuitBreaker, CircuitOpenError, ProviderGuard, RateLimiter
+
+
+class RateLimited(Exception):
+    status_code = 429
+    retry_after = 0.01
+
+
+def test_guard_retries_honours_retry_after_and_backs_off_concurrency():
+    guard = ProviderGuard("test", limiter=AdaptiveLimiter(initial=8))
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RateLimited()
+        return "ok"
+
+    assert asyncio.run(guard.call_async(flaky, retries=3, backoff=0.001)) == "ok"
+    assert guard.retries == 2
+    assert guard.limiter.limit < 8  # halved on each 429, then nudged back up
+    assert guard.limiter.in_flight == 0
+
+
+def test_breaker_opens_and_fails_fast():
+    guard = ProviderGuard("test", breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+    def down():
+        raise ConnectionError("provider down")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            guard.call_sync(down, retries=0)
+
+    with pytest.raises(CircuitOpenError):
+        guard.call_sync(lambda: "never called", retries=0)
+    assert guard.stats()["breaker_state"] == "open"
+    assert guard.stats()["breaker_rejected"] == 1
+
+
+def test_client_errors_are_not_retried():
+    guard = ProviderGuard("test")
+
+    class BadRequest(Exception):
+        status_code = 400
+
+    def bad():
+        raise BadRequest()
+
+    with pytest.raises(BadRequest):
+        guard.call_sync(bad, retries=3)
+    assert guard.retries == 0
+    assert guard.breaker.failures == 0
+
+
+
+def _half_open_guard() -> ProviderGuard:
+    guard = ProviderGuard("test", breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+
+    def down():
+        raise ConnectionError("provider down")
+
+    with pytest.raises(ConnectionError):
+        guard.call_sync(down, retries=0)
+    assert guard.breaker.state == "open"
+    return guard
+
+
+def test_non_retryable_probe_releases_the_breaker():
+    guard = _half_open_guard()
+
+    class BadRequest(Exception):
+        status_code = 400
+
+    def bad():
+        raise BadRequest()
+
+    with pytest.raises(BadRequest):
+        guard.call_sync(bad, retries=0)  # the half-open probe
+    assert guard.call_sync(lambda: "ok", retries=0) == "ok"
+    assert guard.breaker.state == "closed"
+
+
+def test_cancelled_probe_releases_the_breaker():
+    guard = _half_open_guard()
+
+    async def scenario():
+        probe = asyncio.create_task(guard.call_async(lambda: asyncio.sleep(10), retries=0))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        async def ok():
+            return "ok"
+        return await guard.call_async(ok, retries=0)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert guard.breaker.state == "closed"
+    assert guard.limiter.in_flight == 0
+
+
+def test_probe_cancelled_while_queued_releases_the_breaker_and_quota():
+    guard = _half_open_guard()
+    guard.limiter = AdaptiveLimiter(initial=1, max_limit=1)
+    guard.tokens = RateLimiter(rate=100, burst=100)
+
+    async def scenario():
+        await guard.limiter.acquire()  # every slot busy: the probe has to queue
+        probe = asyncio.create_task(guard.call_async(lambda: asyncio.sleep(0), retries=0, tokens=40))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        guard.limiter.release()
+
+        async def ok():
+            return "ok"
+        return await guard.call_async(ok, retries=0)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert guard.breaker.state == "closed"
+    assert guard.tokens.reserve(100) == 0.0  # the cancelled probe's 40 tokens came back
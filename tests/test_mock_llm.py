@@ -0,0 +1,94 @@
+import asyncio
+import random
+import time
+
+import pytest
+
+from app.services import limits
+from app.services.limits import ProviderGuard
+from app.services.llm_client import MockLLM, ProviderRegistry, client_config
+from app.services.simulation import LatencyModel, MockSimulation, SimulatedProviderError
+
+
+class ScriptedRandom(random.Random):
+    """random() returns the scripted values in order, then 0.99"""
+
+    def __init__(self, values: list[float]) -> None:
+        super().__init__(0)
+        self.values = list(values)
+
+    def random(self) -> float:
+        return self.values.pop(0) if self.values else 0.99
+
+
+def test_latency_is_simulated_on_sync_and_async_paths():
+    sim = MockSimulation(latency=LatencyModel("fixed", mean_ms=30), output_tokens=50)
+    llm = MockLLM(simulation=sim)
+
+    output, duration = llm.generate("hello")
+    assert duration >= 0.03
+    assert output["latency"] == 30
+    assert output["model_info"]["usage"]["completion_tokens"] >= 50
+
+    output, duration = asyncio.run(llm.generate_async(prompt="hello"))
+    assert duration >= 0.03
+
+    replay = LatencyModel("replay", samples=[120.0, 480.0])
+    assert {replay.sample_ms() for _ in range(50)} <= {120.0, 480.0}
+
+
+@pytest.fixture
+def mock_guard(monkeypatch):
+    """A fresh guard for the mock provider, so breaker and retry counts don't leak between tests"""
+    guard = ProviderGuard("mock")
+    monkeypatch.setitem(limits._guards, "mock", guard)
+    return guard
+
+
+def test_rate_limit_is_retried_after_retry_after(mock_guard):
+    sim = MockSimulation(rate_limit_rate=0.5, retry_after=0.05, retries=2, backoff=0.01, rng=ScriptedRandom([0.1]))
+    start = time.perf_counter()
+    output, _ = asyncio.run(MockLLM(simulation=sim).generate_async(prompt="hello"))
+    assert time.perf_counter() - start >= sim.retry_after
+    assert output["text"].startswith("[MOCK OUTPUT]")
+    assert mock_guard.retries == 1
+
+    no_retry = MockSimulation(rate_limit_rate=1.0, retry_after=3)
+    with pytest.raises(SimulatedProviderError) as exc:
+        MockLLM(simulation=no_retry).generate("hello")
+    assert exc.value.status_code == 429
+    assert exc.value.retry_after == 3
+
+
+def test_stream_is_chunked():
+    sim = MockSimulation(stream_chunk_chars=4, stream_chunk_delay_ms=1)
+
+    async def collect():
+        return [chunk async for chunk in MockLLM(simulation=sim).generate_stream_async("abcdefgh")]
+
+    chunks = asyncio.run(collect())
+    assert "".join(chunks) == sim.completion("abcdefgh")
+    assert all(len(chunk) <= 4 for chunk in chunks)
+
+
+
+def test_client_config_is_normalised_and_evicted_clients_are_closed():
+    assert client_config("openai", {"temperature": 0.73, "max_tokens": 300, "top_p": 1}) == {
+        "temperature": 0.7, "max_tokens": 512,
+    }
+    assert client_config("openai", {"max_tokens": 10 ** 9})["max_tokens"] == 8192
+    with pytest.raises(ValueError):
+        client_config("openai", {"model": "made-up-model"})
+
+    closed = []
+
+    class Recorded(MockLLM):
+        def close(self) -> None:
+            closed.append(self)
+
+    registry = ProviderRegistry({"mock": Recorded}, max_clients=1, close_grace=0)
+    first = registry.get("mock", temperature=0.1)
+    registry.get("mock", temperature=0.2)
+    time.sleep(0.05)
+    assert closed == [first]
+    assert registry.stats()["evicted"] == 1
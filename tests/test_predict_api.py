@@ -1,2 +1,101 @@
-def test_predict_uses_active_prompt(client):
-    ...
+import json
+from uuid import uuid4
+from app.services.prediction_recorder import recorder
+
+
+def test_predict_uses_active_prompt(client, active_prompt):
+    headers, created = active_prompt
+
+    resp = client.post("/v1/predict/", json={"purpose": "summarize", "document_text": "hello"}, headers=headers)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["prompt_id"] == created["id"]
+    assert body["prompt_version"] == 1
+    assert "Summarize: hello" in body["output_text"]
+
+
+def test_predict_without_active_prompt_is_400(client):
+    headers = {"X-User-Id": f"user_{uuid4().hex}"}
+    resp = client.post("/v1/predict/", json={"purpose": "summarize", "document_text": "hello"}, headers=headers)
+    assert resp.status_code == 400
+
+
+def test_predict_batch_reports_per_item_results(client, active_prompt):
+    headers, _ = active_prompt
+
+    body = '{"id": "a", "document_text": "first"}\nnot json\n{"id": "c", "document_text": "third"}\n'
+    resp = client.post("/v1/predict/batch/jsonl", params={"purpose": "summarize"}, content=body, headers=headers)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert (data["succeeded"], data["failed"]) == (2, 1)
+    assert [r["id"] for r in data["results"]] == ["a", None, "c"]
+    assert "Summarize: third" in data["results"][2]["output_text"]
+
+
+def test_predict_cache_hit_and_bypass(client, active_prompt):
+    headers, created = active_prompt
+
+    def predict(**extra):
+        body = {"purpose": "summarize", "document_text": "same doc", **extra}
+        return client.post("/v1/predict/", json=body, headers=headers).json()["model_info"]["cache"]
+
+    assert predict() == "miss"
+    assert predict() == "hit"
+    assert predict(use_cache=False) == "bypass"
+
+    client.patch(f"/v1/prompts/{created['id']}", json={"template": "Summarize: {document}"}, headers=headers)
+    assert predict() == "miss"
+
+
+def test_predict_stream_emits_chunks_then_done(client, active_prompt):
+    headers, _ = active_prompt
+    resp = client.post("/v1/predict/stream", json={"purpose": "summarize", "document_text": "a long document"}, headers=headers)
+    events = [json.loads(line) for line in resp.text.splitlines()]
+    assert events[-1]["type"] == "done"
+    assert events[-1]["ttft_ms"] is not None
+    text = "".join(e["text"] for e in events if e["type"] == "chunk")
+    assert "Summarize: a long document" in text
+
+
+def test_predict_stream_rejects_bad_provider_before_streaming(client, active_prompt):
+    headers, _ = active_prompt
+
+    resp = client.post(
+        "/v1/predict/stream",
+        json={"purpose": "summarize", "document_text": "doc", "provider": "nope"},
+        headers=headers,
+    )
+    assert resp.status_code == 400
+    assert "Unsupported provider" in resp.json()["detail"]
+
+
+def test_metrics_endpoint_reports_llm_latency(client, active_prompt):
+    headers, _ = active_prompt
+    client.post("/v1/predict/", json={"purpose": "summarize", "document_text": "metrics doc", "use_cache": False}, headers=headers)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'llm_request_seconds_count{provider="mock",model="1.0-mock"}' in response.text
+    assert "# TYPE prompt_store_lookup_seconds histogram" in response.text
+
+
+def test_predict_reports_stage_timings(client, active_prompt):
+    headers, _ = active_prompt
+    user_id = headers["X-User-Id"]
+
+    response = client.post(
+        "/v1/predict/",
+        json={"purpose": "summarize", "document_text": "timed doc", "use_cache": False, "include_timings": True},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    timings = response.json()["timings"]
+    assert {"store", "render", "cache", "llm", "total"} <= set(timings)
+    server_timing = response.headers["Server-Timing"]
+    assert "llm;dur=" in server_timing and "record;dur=" in server_timing
+
+    recorder.flush()
+    history = client.get("/v1/predictions", params={"user_id": user_id}).json()
+    assert set(history["predictions"][0]["timings"]) == set(timings) - {"record"}
+    assert history["predictions"][0]["prompt_version"] == 1
@@ -0,0 +1,140 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.prompt_store import AsyncDatabaseStore, CachedPromptStore, DatabaseStore, FileSnapshotStore, InMemoryStore
+
+
+def test_cached_store_serves_hits_and_invalidates_on_patch():
+    store = CachedPromptStore(InMemoryStore())
+    prompt = store.create("summarize", "base", "v1 {document}", "alice")
+    store.set_active("alice", "summarize", prompt.id)
+
+    assert store.get_active("alice", "summarize").template == "v1 {document}"
+    assert store.stats()["hits"] == 1
+
+    store.patch(prompt.id, "v2 {document}", "alice")
+    active = store.get_active("alice", "summarize")
+    assert (active.template, active.version) == ("v2 {document}", 2)
+
+    store.delete(prompt.id, "alice")
+    assert store.get_active("alice", "summarize") is None
+    assert store.get(prompt.id) is None
+
+
+
+def test_cached_store_is_bounded_and_skips_misses():
+    store = CachedPromptStore(InMemoryStore(), max_entries=2)
+    for i in range(5):
+        assert store.get(f"missing-{i}") is None
+        assert store.get_active(f"user-{i}", "summarize") is None
+    assert store.stats()["prompts_cached"] == store.stats()["active_cached"] == 0
+
+    prompts = [store.create("summarize", f"p{i}", "{document}", f"user-{i}") for i in range(3)]
+    for p in prompts:
+        store.set_active(p.user_id, "summarize", p.id)
+        store.get(p.id)
+    assert store.stats()["prompts_cached"] == store.stats()["active_cached"] == 2
+
+    store.delete(prompts[2].id, prompts[2].user_id)
+    assert store.get_active(prompts[2].user_id, "summarize") is None
+    assert store.stats()["active_cached"] == 1
+
+def test_journal_replays_after_reopen(tmp_path):
+    path = str(tmp_path / "data.json")
+    store = FileSnapshotStore(path, journal=True, compact_every=100)
+    kept = store.create("summarize", "kept", "v1 {document}", "alice")
+    dropped = store.create("summarize", "dropped", "x {document}", "alice")
+    store.set_active("alice", "summarize", kept.id)
+    store.patch(kept.id, "v2 {document}", "alice")
+    store.delete(dropped.id, "alice")
+    store.close()
+
+    # Simulate a crash mid-append: the torn last line is ignored on replay
+    with open(store.journal_path, "a") as f:
+        f.write('{"op": "put", "pro')
+
+    reopened = FileSnapshotStore(path, journal=True)
+    active = reopened.get_active("alice", "summarize")
+    assert (active.id, active.template, active.version) == (kept.id, "v2 {document}", 2)
+    assert reopened.get(dropped.id) is None
+    # Replay folds the journal into the snapshot
+    assert open(reopened.journal_path).read() == ""
+    reopened.close()
+
+
+def test_in_memory_indexes_track_activation_and_delete():
+    store = InMemoryStore()
+    a = store.create("summarize", "a", "a {document}", "alice")
+    b = store.create("summarize", "b", "b {document}", "alice")
+    c = store.create("classify", "c", "c {document}", "alice")
+    store.set_active("alice", "summarize", a.id)
+    store.set_active("alice", "summarize", b.id)
+    store.set_active("alice", "classify", c.id)
+    store.set_active("bob", "summarize", b.id)
+
+    assert [p.id for p in store.list("summarize")] == [a.id, b.id]
+    assert store.get_active_map("alice") == {"summarize": b.id, "classify": c.id}
+
+    store.delete(b.id, "alice")
+    assert [p.id for p in store.list("summarize")] == [a.id]
+    assert store.get_active_map("alice") == {"classify": c.id}
+    assert store.get_active_map("bob") == {}
+    assert store.active_prompts == {("alice", "classify"): c.id}
+
+
+def test_cached_store_sees_writes_from_other_workers(tmp_path):
+    path = str(tmp_path / "shared.db")
+    # Two workers: separate caches over the same database file
+    worker_a = CachedPromptStore(DatabaseStore(path), poll_interval=0)
+    worker_b = CachedPromptStore(DatabaseStore(path), poll_interval=0)
+    first = worker_a.create("summarize", "first", "v1 {document}", "alice")
+    second = worker_a.create("summarize", "second", "v2 {document}", "alice")
+    worker_a.set_active("alice", "summarize", first.id)
+
+    assert worker_b.get_active("alice", "summarize").id == first.id
+    worker_a.set_active("alice", "summarize", second.id)
+    assert worker_b.get_active("alice", "summarize").id == second.id
+
+    worker_b.patch(second.id, "v3 {document}", "alice")
+    assert worker_a.get_active("alice", "summarize").template == "v3 {document}"
+    assert worker_b.stats()["remote_changes"] >= 1
+
+
+def test_async_database_store_serializes_concurrent_writes(tmp_path):
+    store = AsyncDatabaseStore(str(tmp_path / "async.db"), readers=4)
+
+    async def run():
+        prompts = await asyncio.gather(*(
+            store.create_async("summarize", f"p{i}", "{document}", f"user{i % 5}") for i in range(50)
+        ))
+        activated = await asyncio.gather(*(
+            store.set_active_async(p.user_id, "summarize", p.id) for p in prompts
+        ))
+        active = await asyncio.gather(*(
+            store.get_active_async(f"user{i}", "summarize") for i in range(5)
+        ))
+        return prompts, activated, active
+
+    prompts, activated, active = asyncio.run(run())
+    assert all(activated)
+    assert all(p is not None for p in active)
+    # Sync writes from other threads take the same writer
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        deleted = list(pool.map(lambda p: store.delete(p.id, p.user_id), prompts[:20]))
+    assert all(deleted)
+    assert len(store.list()) == 30
+    assert store.stats()["writes"] == 120
+    store.close()
+
+
+def test_file_store_keeps_version_history_across_restarts(tmp_path):
+    path = str(tmp_path / "data.json")
+    store = FileSnapshotStore(path)
+    prompt = store.create("summarize", "p", "one {document}", "alice")
+    store.patch(prompt.id, "two {document}", "alice")
+
+    reopened = FileSnapshotStore(path)
+    assert [v.version for v in reopened.list_versions(prompt.id, "alice")] == [1, 2]
+    assert reopened.get_version_template(prompt.id, 1, "alice") == "one {document}"
+    assert reopened.get_version_template(prompt.id, 2, "alice") == "two {document}"
+    assert reopened.list_versions(prompt.id, "mallory") == []
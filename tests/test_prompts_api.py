@@ -1,2 +1,95 @@
+import json
+from uuid import uuid4
+
+
 def test_create_and_list_prompts(client):
     ...
+
+
+def test_list_prompts_pages_filters_and_streams(client):
+    owner = f"owner_{uuid4()}"
+    headers = {"X-User-Id": owner}
+    for i in range(5):
+        client.post("/v1/prompts/", json={"purpose": "summarize", "name": f"p{i}", "template": "{document}"}, headers=headers)
+
+    first = client.get("/v1/prompts/", params={"user_id": owner, "limit": 3, "fields": "id,name"}, headers=headers)
+    assert first.status_code == 200
+    assert all(set(row) == {"id", "name"} for row in first.json())
+    cursor = first.headers["X-Next-Cursor"]
+
+    second = client.get("/v1/prompts/", params={"user_id": owner, "limit": 3, "cursor": cursor}, headers=headers)
+    assert len(second.json()) == 2
+    assert "X-Next-Cursor" not in second.headers
+    ids = [r["id"] for r in first.json()] + [r["id"] for r in second.json()]
+    assert ids == sorted(ids)
+
+    streamed = client.get("/v1/prompts/", params={"user_id": owner, "format": "ndjson", "fields": "id"}, headers=headers)
+    assert [json.loads(line)["id"] for line in streamed.text.splitlines()] == ids
+
+    assert client.get("/v1/prompts/", params={"fields": "secret"}).status_code == 400
+
+
+def test_bulk_import_and_export_round_trip(client):
+    source, target = {"X-User-Id": f"src_{uuid4()}"}, {"X-User-Id": f"dst_{uuid4()}"}
+    body = "\n".join([
+        json.dumps({"purpose": "summarize", "name": "a", "template": "A {document}", "active": True}),
+        json.dumps({"purpose": "summarize", "name": "b", "template": "B {document}", "active": True}),
+        "{not json",
+        json.dumps({"purpose": "classify", "name": "c"}),
+    ])
+    imported = client.post("/v1/prompts:bulk", content=body, headers=source).json()
+    assert (imported["imported"], imported["activated"]) == (2, 1)  # "b" replaced "a" as the active summarize prompt
+    assert [e["line"] for e in imported["errors"]] == [3, 4]
+    active = client.post("/v1/predict/", json={"purpose": "summarize", "document_text": "x"}, headers=source).json()
+    assert active["prompt_id"] == imported["ids"][1]
+
+    rejected = client.post("/v1/prompts:bulk", params={"all_or_nothing": True}, content=body, headers=target)
+    assert rejected.status_code == 422 and rejected.json()["imported"] == 0
+
+    exported = client.get("/v1/prompts:export", headers=source).text
+    rows = [json.loads(line) for line in exported.splitlines()]
+    assert sorted(r["id"] for r in rows) == sorted(imported["ids"])
+    assert [r["name"] for r in rows if r["active"]] == ["b"]
+
+    # Export lines import unchanged into another tenant
+    copied = client.post("/v1/prompts:bulk", content=exported, headers=target).json()
+    assert copied["imported"] == 2 and not copied["errors"]
+
+
+def test_prompt_versions_keep_diffs_and_rebuild_templates(client):
+    headers = {"X-User-Id": f"owner_{uuid4()}"}
+    created = client.post(
+        "/v1/prompts/", json={"purpose": "summarize", "name": "v", "template": "Summarize:\n{document}\n"}, headers=headers
+    ).json()
+    client.patch(f"/v1/prompts/{created['id']}", json={"template": "Summarize briefly:\n{document}\n"}, headers=headers)
+
+    versions = client.get(f"/v1/prompts/{created['id']}/versions", headers=headers).json()
+    assert [v["version"] for v in versions] == [1, 2]
+    assert "-Summarize:\n+Summarize briefly:" in versions[1]["diff"]
+
+    first = client.get(f"/v1/prompts/{created['id']}/versions/1", headers=headers).json()
+    assert first["template"] == "Summarize:\n{document}\n"
+    assert first["content_hash"] == versions[0]["content_hash"]
+    assert client.get(f"/v1/prompts/{created['id']}/versions/3", headers=headers).status_code == 404
+
+    # History outlives the prompt
+    client.delete(f"/v1/prompts/{created['id']}", headers=headers)
+    assert len(client.get(f"/v1/prompts/{created['id']}/versions", headers=headers).json()) == 2
+
+
+
+def test_prompt_versions_are_private_to_the_owner(client):
+    owner = {"X-User-Id": f"owner_{uuid4()}"}
+    other = {"X-User-Id": f"other_{uuid4()}"}
+    created = client.post(
+        "/v1/prompts/", json={"purpose": "summarize", "name": "secret", "template": "Secret: {document}"}, headers=owner
+    ).json()
+
+    assert client.get(f"/v1/prompts/{created['id']}/versions", headers=other).status_code == 404
+    assert client.get(f"/v1/prompts/{created['id']}/versions/1", headers=other).status_code == 404
+    assert client.get(f"/v1/prompts/{created['id']}/versions").status_code == 404  # anonymous is not the owner
+
+    # Still private once the prompt row is gone
+    client.delete(f"/v1/prompts/{created['id']}", headers=owner)
+    assert client.get(f"/v1/prompts/{created['id']}/versions", headers=other).status_code == 404
+    assert client.get(f"/v1/prompts/{created['id']}/versions/1", headers=owner).json()["template"] == "Secret: {document}"
\ No newline at end of file
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_client import LLMClient
+from app.services.routing import Router, RoutingPolicy, Target
+
+
+class FakeClient(LLMClient):
+    def __init__(self, text: str, delay: float = 0.0, error: Exception | None = None) -> None:
+        self.text = text
+        self.delay = delay
+        self.error = error
+        self.cancelled = False
+
+    def generate(self, prompt: str, **params):
+        if self.error is not None:
+            raise self.error
+        return {"text": self.text, "model_info": {}}, self.delay
+
+    async def generate_async(self, prompt: str, id: str = "", **params):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return {"text": self.text, "model_info": {}}, self.delay
+
+
+def test_hedge_wins_and_cancels_slow_primary():
+    slow, fast = FakeClient("slow", delay=1.0), FakeClient("fast")
+    targets = [Target("slow", "mock", slow), Target("fast", "mock", fast)]
+    policy = RoutingPolicy(hedge=True, hedge_min_ms=10)
+    router = Router(min_samples=5)
+    for _ in range(5):
+        router.tracker("slow").record(5.0)  # history says the primary is usually quick
+
+    async def run():
+        result = await router.generate(targets, policy, "doc")
+        assert slow.cancelled  # the loser has unwound before generate returns
+        return result
+
+    output, _, winner = asyncio.run(run())
+    assert output["text"] == "fast"
+    assert output["model_info"]["route"] == {"target": "fast", "path": "hedge", "hedged": True}
+    assert winner.name == "fast"
+    assert router.stats()["hedge_wins"] == 1
+
+
+def test_failover_walks_the_chain():
+    targets = [
+        Target("a", "mock", FakeClient("a", error=RuntimeError("a down"))),
+        Target("b", "mock", FakeClient("b", error=RuntimeError("b down"))),
+        Target("c", "mock", FakeClient("c")),
+    ]
+    router = Router()
+    output, _, winner = asyncio.run(router.generate(targets, RoutingPolicy(), "doc"))
+    assert (winner.name, output["model_info"]["route"]["path"]) == ("c", "fallback")
+    assert router.failovers == 2
+
+    with pytest.raises(RuntimeError, match="b down"):
+        asyncio.run(router.generate(targets[:2], RoutingPolicy(), "doc"))
@@ -0,0 +1,14 @@
+from app.services.template_renderer import render_template, template_cache, warm_template
+
+
+def test_render_supports_legacy_and_jinja2():
+    assert render_template("Summarize: {document}", "Hello") == "Summarize: Hello"
+    assert render_template("{{ document | upper }}", "hello") == "HELLO"
+
+
+def test_compiled_templates_are_cached():
+    template = "Cached {{ document }} test"
+    warm_template(template)
+    hits = template_cache.hits
+    assert render_template(template, "x") == "Cached x test"
+    assert template_cache.hits == hits + 1